@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+import yaml
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+import utils.text as text
+from utils.io import read_csvs, write_csv
+from utils.brands import compile_brand_matcher, compile_brand_regexes, count_mentions
+from utils.tables import dashboard_tables
+from utils.metrics import peak_rss_mb, reset_peak_rss, start_run
+import analyze
+from synth import generate, load_profile
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+STAGES = ["csv_write", "csv_read", "brands_compile", "mentions_regex", "mentions_matcher",
+          "sentiment", "aggregate", "end_to_end"]
+
+# ----------------- Measurement -----------------
+def measure(fn: Callable[[], None], rows: int) -> dict:
+    """Wall time, rows/sec and peak RSS of one call (the peak is process-wide where it cannot be reset)."""
+    metrics = start_run("bench")
+    per_stage = reset_peak_rss()
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    # analyze() stages reset the peak themselves; the call's peak is the largest seen.
+    peak = max([peak_rss_mb()] + [s["peak_rss_mb"] for s in metrics.stages.values()])
+    return {"seconds": round(seconds, 4),
+            "rows_per_sec": round(rows / seconds, 1) if seconds > 0 and rows else None,
+            "peak_rss_mb": round(peak, 1),
+            "peak_is_per_stage": per_stage}
+
+def stub_inference(texts: List[str], batch_size: int, num_threads: Optional[int]) -> List[float]:
+    """Deterministic stand-in for the model: a score in [-1, 1] from a hash of the text."""
+    return [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=4).digest(), "little")
+            / 2**31 - 1.0 for t in texts]
+
+# ----------------- Stages -----------------
+def run_size(n: int, cfg: dict, data_dir: str, stages: List[str], seed: int) -> Dict[str, dict]:
+    path = os.path.join(data_dir, f"synth_{n}_s{seed}.csv")
+    if not os.path.exists(path):
+        logging.info(f"Generating {n} synthetic rows → {path}")
+        write_csv(generate(n, load_profile(cfg), seed=seed), path)
+    df = read_csvs([path])
+    frame = analyze.prepare_frame(df.copy())
+    texts = frame["scan_text"]
+    brands = cfg["brands"]
+    matcher = compile_brand_matcher(brands["primary"], brands["competitors"],
+                                    longest_only=brands.get("longest_match_only", False))
+    regexes = compile_brand_regexes(brands["primary"], brands["competitors"])
+    sent_cfg = cfg.get("sentiment", {})
+    state = {}
+
+    def sentiment():
+        state["sentiment"] = text.sentiment_scores(texts, batch_size=sent_cfg.get("batch_size", 32),
+                                                   num_threads=sent_cfg.get("num_threads") or None)
+
+    def aggregate():
+        M = state.get("M")
+        if M is None:
+            M = analyze.mention_matrix(texts, matcher)
+        sent = state.get("sentiment") or stub_inference(list(texts), 0, None)
+        out = analyze.derive_columns(frame.copy(), M, sent, matcher.brands)
+        acc = analyze.aggregate_mentions(M, out["wsov_item"], out["sentiment_label"])
+        analyze.build_summary(acc, matcher.brands, cfg, len(out), analyze.publisher_counts(out))
+        dashboard_tables(out)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        e2e_cfg = {**cfg, "sentiment": {**sent_cfg, "cache_path": ""},
+                   "output": {**cfg["output"], "format": "csv"}}
+        jobs = {
+            "csv_write": (lambda: write_csv(df, os.path.join(tmp, "items.csv"))),
+            "csv_read": (lambda: read_csvs([path])),
+            "brands_compile": (lambda: (compile_brand_regexes(brands["primary"], brands["competitors"]),
+                                        compile_brand_matcher(brands["primary"], brands["competitors"]))),
+            "mentions_regex": (lambda: [count_mentions(t, regexes) for t in texts]),
+            "mentions_matcher": (lambda: state.__setitem__("M", analyze.mention_matrix(texts, matcher))),
+            "sentiment": sentiment,
+            "aggregate": aggregate,
+            "end_to_end": (lambda: analyze.analyze([path], e2e_cfg, os.path.join(tmp, "out"))),
+        }
+        results = {}
+        for stage in stages:
+            rows = 0 if stage == "brands_compile" else n
+            results[stage] = measure(jobs[stage], rows)
+            r = results[stage]
+            rate = f"{r['rows_per_sec']:>12,.0f} rows/s" if r["rows_per_sec"] else " " * 19
+            logging.info(f"{n:>9,} {stage:<17} {r['seconds']:>9.3f}s {rate} {r['peak_rss_mb']:>8.1f} MB")
+    return results
+
+# ----------------- History -----------------
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=HERE, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def load_history(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def compare(run: dict, history: list, threshold: float) -> List[str]:
+    """Stages slower than the last comparable run (same size and sentiment mode) by more than threshold."""
+    regressions = []
+    for size, stages in run["results"].items():
+        for stage, r in stages.items():
+            prev = next((h["results"][size][stage] for h in reversed(history)
+                         if h.get("sentiment") == run["sentiment"]
+                         and stage in h.get("results", {}).get(size, {})), None)
+            if prev and prev["seconds"] > 0 and r["seconds"] > prev["seconds"] * (1 + threshold):
+                regressions.append(f"{size} {stage}: {prev['seconds']:.3f}s → {r['seconds']:.3f}s "
+                                   f"({r['seconds'] / prev['seconds']:.2f}×)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SoV pipeline on synthetic corpora")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--sizes", default="1k,100k", help=f"comma-separated, from {sorted(SIZES)}")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--sentiment", choices=["stub", "model"], default="stub",
+                        help="stub: hash-based scores instead of the model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data_dir", default=os.path.join(HERE, "data"), help="generated corpora are kept here")
+    parser.add_argument("--history", default=os.path.join(HERE, "history.json"))
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown flagged as a regression")
+    parser.add_argument("--label", default="", help="note stored with this run")
+    args = parser.parse_args()
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES] + [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown size/stage: {', '.join(unknown)}")
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    os.makedirs(args.data_dir, exist_ok=True)
+    text.set_cache(None)  # time the scoring itself, not cache hits
+    if args.sentiment == "stub":
+        text._batched_inference = stub_inference
+    else:
+        sent_cfg = cfg.get("sentiment", {})
+        text.set_backend(sent_cfg.get("backend", "torch"), sent_cfg.get("model_dir") or None)
+        text.warm_up()
+
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "label": args.label,
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "sentiment": args.sentiment if args.sentiment == "stub" else text.model_key(),
+        "seed": args.seed,
+        "results": {size: run_size(SIZES[size], cfg, args.data_dir, stages, args.seed) for size in sizes},
+    }
+    history = load_history(args.history)
+    regressions = compare(run, history, args.threshold)
+    history.append(run)
+    with open(args.history, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    logging.info(f"Appended run to {args.history} ({len(history)} runs)")
+    for line in regressions:
+        logging.warning(f"Regression: {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import os
+import re
+import sys
+import glob
+import argparse
+import logging
+from collections import Counter
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from utils.io import UNIFIED_COLUMNS, ensure_dirs, read_csvs, write_csv
+from utils.brands import compile_brand_matcher
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Fitted on data/*.csv (300 rows: 200 YouTube, 100 Google CSE); used when data/ is empty.
+DEFAULT_PROFILE = {
+    "platform_share": {"youtube": 0.667, "google": 0.333},
+    "queries": ["smart fan"],
+    "brand_rate": {"Atomberg": 0.187, "Atomberg Renesa": 0.107, "Atomberg Studio": 0.01,
+                   "Orient": 0.02, "Havells": 0.013, "Crompton": 0.023, "Bajaj": 0.003,
+                   "Polycab": 0.01, "V-Guard": 0.003},
+    "brand_extra": {},  # mean extra mentions of a brand in a row that has one
+    "vocab": ["fan", "smart", "the", "ceiling", "and", "to", "with", "bldc", "control", "fans",
+              "in", "for", "of", "is", "this", "remote", "your", "best", "review", "home", "on",
+              "light", "speed", "you", "shorts", "how", "or", "from", "can", "led", "it", "app",
+              "air", "switch", "video", "alexa", "controller", "by", "new", "installation",
+              "unboxing", "install", "google", "low", "modern", "plus", "features", "india",
+              "tower", "energy", "voice", "power", "cooling", "comfort", "motor", "mode", "quiet"],
+    "vocab_weights": None,  # uniform
+    "words": {"youtube": {"title": [11.1, 3.6], "snippet": [19.2, 5.2]},
+              "google": {"title": [9.2, 3.4], "snippet": [26.3, 4.9]}},
+    "empty_snippet": {"youtube": 0.17, "google": 0.0},
+    "log1p": {"views": [10.54, 2.17], "likes": [5.7, 2.22], "comments": [2.82, 1.74]},
+    "likes_missing": 0.03,
+    "published": ["2017-05-05", "2025-08-31"],
+    "publisher_ratio": 0.83,  # distinct publishers per row
+}
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9']+")
+
+def profile_corpus(paths: List[str], brands: List[str], vocab_size: int = 2000) -> dict:
+    """
+    Fit the generator's parameters on collected CSVs: platform mix, per-brand
+    mention rates, vocabulary (brand words excluded), text lengths, engagement
+    distributions and publish dates.
+    """
+    df = read_csvs(paths)
+    if df.empty:
+        return DEFAULT_PROFILE
+    # Longest-match counts: "Atomberg Renesa" is not also an "Atomberg" insertion,
+    # so the generated rows reproduce the overlapping counts analyze() sees.
+    matcher = compile_brand_matcher(brands, [], longest_only=True)
+    text = df["title"].fillna("") + " " + df["snippet"].fillna("")
+    M = np.array([matcher.count_vector(t) for t in text]).reshape(len(df), len(brands))
+    present = M > 0
+    brand_words = {w.lower() for b in brands for w in re.split(r"[\s\-]+", b)}
+    vocab = Counter(w.lower() for t in text for w in _WORD.findall(t) if w.lower() not in brand_words)
+    top = vocab.most_common(vocab_size)
+
+    def moments(s):
+        s = s.dropna()
+        return [round(float(s.mean()), 2), round(float(s.std()), 2)] if len(s) > 1 else [0.0, 0.0]
+
+    words, empty = {}, {}
+    for platform, g in df.groupby("platform"):
+        words[platform] = {col: moments(g[col].dropna().str.split().str.len()) for col in ("title", "snippet")}
+        empty[platform] = round(float(g["snippet"].isna().mean()), 3)
+    yt = df[df["views"].notna()]
+    published = pd.to_datetime(df["published_at"], errors="coerce", utc=True).dropna()
+    return {
+        "platform_share": df["platform"].value_counts(normalize=True).round(3).to_dict(),
+        "queries": sorted(df["query"].dropna().unique().tolist()),
+        "brand_rate": {b: round(float(present[:, i].mean()), 4) for i, b in enumerate(brands)},
+        "brand_extra": {b: round(float(M[present[:, i], i].mean() - 1), 3)
+                        for i, b in enumerate(brands) if present[:, i].any()},
+        "vocab": [w for w, _ in top],
+        "vocab_weights": [c for _, c in top],
+        "words": words,
+        "empty_snippet": empty,
+        "log1p": {c: moments(np.log1p(yt[c])) for c in ("views", "likes", "comments")},
+        "likes_missing": round(float(yt["likes"].isna().mean()), 3) if len(yt) else 0.0,
+        "published": ([published.min().strftime("%Y-%m-%d"), published.max().strftime("%Y-%m-%d")]
+                      if len(published) else DEFAULT_PROFILE["published"]),
+        "publisher_ratio": round(df["publisher"].nunique() / len(df), 3),
+    }
+
+def _surface_forms(brand: str) -> List[str]:
+    # Spellings the matcher treats as the brand: case and separator variants.
+    tokens = brand.split()
+    forms = [brand, brand.lower(), brand.upper()]
+    if len(tokens) > 1:
+        forms += ["-".join(tokens), "".join(tokens).lower()]
+    return forms
+
+def generate(n: int, profile: dict, seed: int = 0) -> pd.DataFrame:
+    """
+    n synthetic rows in UNIFIED_COLUMNS.
+    - Words are drawn from the profile vocabulary by frequency; each brand is
+      inserted into a row with its observed rate (plus Poisson extra mentions).
+    - URLs are unique; YouTube rows get log-normal engagement and a publish
+      date, Google rows neither (as from the CSE collector).
+    """
+    rng = np.random.default_rng(seed)
+    platforms = list(profile["platform_share"])
+    p = np.array([profile["platform_share"][k] for k in platforms], dtype=float)
+    platform = np.array(platforms, dtype=object)[rng.choice(len(platforms), size=n, p=p / p.sum())]
+    vocab = np.array(profile["vocab"], dtype=object)
+    w = profile.get("vocab_weights")
+    w = np.asarray(w, dtype=float) / np.sum(w) if w else None
+
+    def lengths(part):
+        out = np.empty(n, dtype=int)
+        for k in platforms:
+            mean, std = profile["words"].get(k, {}).get(part, [10.0, 3.0])
+            mask = platform == k
+            out[mask] = np.clip(np.rint(rng.normal(mean, std, mask.sum())), 1, None)
+        return out
+
+    def sentences(lens):
+        words = vocab[rng.choice(len(vocab), size=int(lens.sum()), p=w)]
+        return [list(chunk) for chunk in np.split(words, np.cumsum(lens)[:-1])]
+
+    title, snippet = sentences(lengths("title")), sentences(lengths("snippet"))
+    empty = rng.random(n) < np.array([profile["empty_snippet"].get(k, 0.0) for k in platform])
+    for brand, rate in profile["brand_rate"].items():
+        forms = _surface_forms(brand)
+        rows = np.flatnonzero(rng.random(n) < rate)
+        extra = rng.poisson(profile["brand_extra"].get(brand, 0.0), len(rows))
+        for r, k in zip(rows.tolist(), extra.tolist()):
+            for _ in range(1 + k):
+                target = title[r] if empty[r] or rng.random() < 0.5 else snippet[r]
+                target.insert(int(rng.integers(0, len(target) + 1)), forms[int(rng.integers(len(forms)))])
+    title = [" ".join(t).capitalize() for t in title]
+    snippet = [None if e else " ".join(s) for s, e in zip(snippet, empty)]
+
+    df = pd.DataFrame({"platform": platform})
+    df["query"] = np.array(profile["queries"], dtype=object)[rng.integers(0, len(profile["queries"]), n)]
+    df["rank"] = df.groupby(["platform", "query"]).cumcount() + 1
+    df["url"] = [f"https://synthetic.example/{k}/{i}" for i, k in enumerate(platform)]
+    df["title"], df["snippet"] = title, snippet
+    pool = max(1, int(n * profile["publisher_ratio"]))
+    df["publisher"] = [f"publisher-{i}" for i in rng.integers(0, pool, n)]
+    yt = (platform == "youtube")
+    for col in ("views", "likes", "comments"):
+        mean, std = profile["log1p"][col]
+        vals = np.floor(np.expm1(rng.normal(mean, std, n).clip(0, None)))
+        df[col] = np.where(yt, vals, np.nan)
+    df.loc[yt & (rng.random(n) < profile["likes_missing"]), "likes"] = np.nan
+    lo, hi = (pd.Timestamp(d).value // 10**9 for d in profile["published"])
+    secs = rng.integers(lo, hi, n)
+    df["published_at"] = [pd.Timestamp(s, unit="s").strftime("%Y-%m-%dT%H:%M:%SZ") if y else None
+                          for s, y in zip(secs.tolist(), yt)]
+    df["raw_text"] = [f"{t or ''} {s or ''}" for t, s in zip(df["title"], df["snippet"])]
+    return df[UNIFIED_COLUMNS]
+
+def load_profile(cfg: dict, data_dir: Optional[str] = None) -> dict:
+    brands = cfg["brands"]["primary"] + cfg["brands"]["competitors"]
+    paths = sorted(glob.glob(os.path.join(data_dir or cfg["output"]["data_dir"], "*.csv")))
+    return profile_corpus(paths, brands) if paths else DEFAULT_PROFILE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic corpus in the unified schema")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="default: bench/data/synth_<rows>.csv")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    out = args.out or os.path.join("bench", "data", f"synth_{args.rows}.csv")
+    ensure_dirs(os.path.dirname(out) or ".")
+    df = generate(args.rows, load_profile(cfg), seed=args.seed)
+    write_csv(df, out)
+    logging.info(f"Saved {len(df)} synthetic rows → {out}")
+
+
+if __name__ == "__main__":
+    main()
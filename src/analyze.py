@@ -1,12 +1,26 @@
 from __future__ import annotations
-import os, math, json, argparse, logging, glob, yaml
+import os, math, json, uuid, argparse, logging, yaml
 from typing import Dict, List
-import pandas as pd
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-from utils.io import ensure_dirs, read_csvs, write_csv, write_json
-from utils.brands import compile_brand_regexes, count_mentions
-from utils.text import sentiment_score
+from utils.lazy import lazy_import
+from utils.io import UNIFIED_COLUMNS, SeenSet, ensure_dirs, write_csv, write_json
+from utils.storage import CsvStorage, discover_inputs, get_storage, iter_items, load_table, read_items, table_path
+from utils.brands import BrandMatcher, compile_brand_matcher
+from utils.text import model_key, sentiment_scores, set_backend, set_cache, warm_up
+from utils.cache import SentimentCache
+from utils.state import StateStore, content_hashes
+from utils.tables import dashboard_tables, merge_tables
+from utils.rollup import RollupStore, bucket_days, merge_buckets, rollup_buckets
+from utils.metrics import get_metrics, profiled, start_run
+from utils.compact import MENTION_DTYPE, compact_frame, compact_mentions, memory_mb, memory_report
+from utils.dedupe import canonical_urls, near_duplicate_clusters
+from utils.shares import SENTIMENT_LABELS, compute_shares
+
+# numpy/pandas load on first use, so --help and argument errors return at once.
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
@@ -30,106 +44,645 @@ def sentiment_label(score: float, threshold: float = 0.25) -> str:
     if score < -threshold: return "negative"
     return "neutral"
 
-def compute_shares(totals: Dict[str, float]) -> Dict[str, float]:
-    s = sum(totals.values()) or 1.0
-    return {k: v/s for k, v in totals.items()}
+# ----------------- Mention matrix & aggregates -----------------
+def mention_matrix(texts, matcher: BrandMatcher) -> np.ndarray:
+    """Dense rows × brands int16 mention counts (columns follow matcher.brands)."""
+    rows = [matcher.count_vector(t) for t in texts]
+    return compact_mentions(np.array(rows, dtype=np.int32).reshape(len(rows), len(matcher.brands)))
 
-# ----------------- Analyzer -----------------
-def analyze(inputs: List[str], cfg: dict, out_dir: str):
-    brands_all = list(dict.fromkeys(cfg["brands"]["primary"] + cfg["brands"]["competitors"]))
-    brand_patterns = compile_brand_regexes(cfg["brands"]["primary"], cfg["brands"]["competitors"])
+def dominant_brands(M: np.ndarray, brands: List[str]) -> np.ndarray:
+    # argmax returns the first maximum, matching max(m, key=m.get) over brand order.
+    names = np.asarray(brands, dtype=object)[M.argmax(axis=1)] if M.size else np.array([], dtype=object)
+    return np.where(M.sum(axis=1) > 0, names, "")
 
-    df = read_csvs(inputs).drop_duplicates(subset=["url"]).reset_index(drop=True)
-    if df.empty:
-        logging.error("No data rows found. Run collectors first.")
-        return
+def aggregate_mentions(M: np.ndarray, wsov_item, labels) -> Dict[str, np.ndarray]:
+    """
+    Per-brand accumulators for one set of rows.
+    - rms: raw mentions; wsov/sopv: wsov_item split by mention share
+      (rows with no mentions or a non-positive/NaN weight contribute nothing).
+    - positive/neutral/negative: rows mentioning the brand, by sentiment label.
+    Accumulators of disjoint row sets combine by plain addition.
+    """
+    total = M.sum(axis=1)
+    w = np.asarray(wsov_item, dtype=float)
+    labels = np.asarray(labels, dtype=object)
+    ok = (total > 0) & (w > 0)
+    share = np.zeros(M.shape, dtype=float)
+    share[ok] = M[ok] / total[ok, None] * w[ok, None]
+    present = M > 0
+    acc = {
+        "rms": M.sum(axis=0, dtype=np.int64),
+        "wsov": share.sum(axis=0),
+        "sopv": share[labels == "positive"].sum(axis=0),
+    }
+    for lab in SENTIMENT_LABELS:
+        acc[lab] = present[labels == lab].sum(axis=0, dtype=np.int64)
+    return acc
+
+def mentions_json(M: np.ndarray, brands: List[str]) -> List[str]:
+    return [json.dumps(dict(zip(brands, row))) for row in M.tolist()]
 
+# ----------------- Stages -----------------
+def scan_text(df: pd.DataFrame) -> pd.Series:
+    return df["title"].fillna("") + " " + df["snippet"].fillna("") + " " + df["raw_text"].fillna("")
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
     # Fill missing columns
     for col in ["title","snippet","raw_text","publisher","views","likes","comments","published_at"]:
         if col not in df.columns: df[col] = None
-    df["scan_text"] = (df["title"].fillna("") + " " + df["snippet"].fillna("") + " " + df["raw_text"].fillna(""))
-
-    # Mentions
-    mentions, dom = [], []
-    for txt in df["scan_text"]:
-        m = count_mentions(txt, brand_patterns)
-        mentions.append(json.dumps(m))
-        dom.append(max(m, key=m.get) if sum(m.values())>0 else "")
-    df["brand_mentions_json"], df["dominant_brand"] = mentions, dom
-
-    # Sentiment & Engagement
-    logging.info("Running sentiment (may download model on first run)…")
-    df["sentiment"] = df["scan_text"].map(sentiment_score)
-    df["sentiment_label"] = df["sentiment"].map(sentiment_label)
-    df["engagement"] = [engagement_score(v,l,c) for v,l,c in zip(df["views"],df["likes"],df["comments"])]
-    df["wsov_item"] = [wsov_weight(e,s) for e,s in zip(df["engagement"],df["sentiment"])]
-
-    # Parse date
-    def parse_date(x):
-        try: return datetime.fromisoformat(str(x).replace("Z",""))
-        except: return None
-    df["published_at"] = df["published_at"].map(parse_date)
-
-    # Aggregates
-    rms, wsov, sopv = {b:0 for b in brands_all}, {b:0 for b in brands_all}, {b:0 for b in brands_all}
-    sentiment_counts = {b:{"positive":0,"neutral":0,"negative":0} for b in brands_all}
-
-    for _, row in df.iterrows():
-        m = json.loads(row["brand_mentions_json"])
-        total = sum(m.values())
-        w, sent_lab = row["wsov_item"], row["sentiment_label"]
-
-        for b in brands_all: rms[b] += int(m.get(b,0))
-        if total>0 and w>0:
-            for b,c in m.items():
-                if c>0:
-                    share=(c/total)*w
-                    wsov[b]+=share
-                    if sent_lab=="positive": sopv[b]+=share
-        for b in brands_all:
-            if m.get(b,0)>0: sentiment_counts[b][sent_lab]+=1
-
-    summary = {
+    df["scan_text"] = scan_text(df)
+    return df
+
+def parse_date(x):
+    try: return datetime.fromisoformat(str(x).replace("Z",""))
+    except: return None
+
+def url_keys(df: pd.DataFrame, cfg: dict) -> pd.Series:
+    """Dedupe key per row: the canonical URL with dedupe.canonical_urls, else the URL as collected."""
+    return canonical_urls(df["url"]) if cfg.get("dedupe", {}).get("canonical_urls", False) else df["url"]
+
+def near_dedupe(df: pd.DataFrame, cfg: dict):
+    """
+    MinHash/LSH clusters of near-identical scan_text (re-uploads, syndicated
+    copies) when dedupe.near_duplicates is on. Returns (df, clusters), where
+    clusters[i] is the position of row i's cluster head (None if off).
+    - count_duplicates (default): duplicates stay, marked by a duplicate_of
+      column (the head's URL) and given the head's sentiment.
+    - count_duplicates: false: only cluster heads are kept, so a re-upload
+      adds nothing to RMS or the weighted shares.
+    """
+    dd = cfg.get("dedupe", {})
+    if not dd.get("near_duplicates", False) or df.empty:
+        return df, None
+    metrics = get_metrics()
+    with metrics.stage("near_dupes", rows_in=len(df)) as st:
+        clusters = near_duplicate_clusters(df["scan_text"], threshold=dd.get("threshold", 0.8),
+                                           num_perm=dd.get("num_perm", 64), bands=dd.get("bands", 16),
+                                           shingle=dd.get("shingle", 3))
+        dup = clusters != np.arange(len(df))
+        n_dup, n_clusters = int(dup.sum()), len(np.unique(clusters[dup]))
+        counted = dd.get("count_duplicates", True)
+        if counted:
+            df.insert(df.columns.get_loc("scan_text"), "duplicate_of",
+                      np.where(dup, df["url"].to_numpy(dtype=object)[clusters], ""))
+        else:
+            df, clusters = df[~dup].reset_index(drop=True), None
+        st.rows_out = len(df)
+    logging.info(f"Near-duplicates: {n_dup} items of {n_clusters} clusters "
+                 + ("share their head's sentiment" if counted else "dropped"))
+    metrics.info["near_duplicates"] = {"duplicates": n_dup, "clusters": n_clusters, "counted": counted}
+    return df, clusters
+
+def score_texts(texts, matcher: BrandMatcher, cfg: dict, clusters=None):
+    """
+    The expensive per-row work: mention matrix + sentiment scores.
+    With clusters (near_dedupe), sentiment is scored for the first row of each
+    cluster among these texts and copied to the rest.
+    """
+    metrics = get_metrics()
+    with metrics.stage("mentions", rows_in=len(texts)) as st:
+        M = mention_matrix(texts, matcher)
+        st.rows_out = len(M)
+    sent_cfg = cfg.get("sentiment", {})
+    if not sent_cfg.get("enabled", True):
+        return M, np.zeros(len(M))  # mention-only run: every item counts as neutral
+    heads, inverse = (None, None) if clusters is None else \
+        np.unique(np.asarray(clusters), return_index=True, return_inverse=True)[1:]
+    with metrics.stage("sentiment", rows_in=len(texts) if heads is None else len(heads)) as st:
+        sentiment = sentiment_scores(texts if heads is None else pd.Series(texts).iloc[heads],
+                                     batch_size=sent_cfg.get("batch_size", 32),
+                                     num_threads=sent_cfg.get("num_threads") or None,
+                                     daemon=sent_cfg.get("daemon_socket") or None)
+        if heads is not None:
+            sentiment = np.asarray(sentiment, dtype=float)[inverse]
+        st.rows_out = len(sentiment)
+    return M, sentiment
+
+def derive_columns(df: pd.DataFrame, M: np.ndarray, sentiment, brands: List[str]) -> pd.DataFrame:
+    """Cheap per-row columns computed from the mention matrix and sentiment."""
+    with get_metrics().stage("engagement", rows_in=len(df)) as st:
+        df["dominant_brand"] = dominant_brands(M, brands)
+        df["sentiment"] = sentiment
+        df["sentiment_label"] = df["sentiment"].map(sentiment_label)
+        df["engagement"] = [engagement_score(v,l,c) for v,l,c in zip(df["views"],df["likes"],df["comments"])]
+        df["wsov_item"] = [wsov_weight(e,s) for e,s in zip(df["engagement"],df["sentiment"])]
+        df["published_at"] = df["published_at"].map(parse_date)
+        st.rows_out = len(df)
+    return df
+
+def compact_scored(df: pd.DataFrame, M: np.ndarray) -> pd.DataFrame:
+    """
+    Shrink the scored frame before the aggregate/write stages: categorical
+    low-cardinality columns, float32 sentiment, scan_text dropped (write_scored
+    rebuilds it per slice). The before/after sizes go to the run manifest.
+    """
+    metrics = get_metrics()
+    with metrics.stage("compact", rows_in=len(df)) as st:
+        before = memory_mb(df)
+        df = compact_frame(df)
+        report = memory_report(before, df, M)
+        st.rows_out = len(df)
+    metrics.info["memory"] = report
+    logging.info(f"Frame {before:.1f} MB as read → {report['frame_mb_after']:.1f} MB compact; "
+                 f"mentions matrix {report['mentions_mb']:.1f} MB ({M.dtype})")
+    return df
+
+def open_sentiment(cfg: dict):
+    """Select the configured sentiment backend and open its score cache (None if disabled)."""
+    sent_cfg = cfg.get("sentiment", {})
+    set_backend(sent_cfg.get("backend", "torch"), sent_cfg.get("model_dir") or None)
+    if not sent_cfg.get("cache_path") or not sent_cfg.get("enabled", True):
+        return None
+    cache = SentimentCache(sent_cfg["cache_path"], sent_cfg.get("cache_max_entries", 500_000))
+    set_cache(cache)
+    return cache
+
+def publisher_counts(df: pd.DataFrame) -> pd.Series:
+    return df.groupby("publisher")["url"].count()
+
+def top_publishers(counts: pd.Series, n: int = 10) -> List[dict]:
+    return (counts.sort_values(ascending=False).head(n)
+                  .reset_index().rename(columns={"url":"count"})
+                  .to_dict(orient="records"))
+
+def build_summary(acc: Dict[str, np.ndarray], brands_all: List[str], cfg: dict,
+                  total_items: int, publishers: pd.Series) -> dict:
+    rms = dict(zip(brands_all, acc["rms"].tolist()))
+    wsov = dict(zip(brands_all, acc["wsov"].tolist()))
+    sopv = dict(zip(brands_all, acc["sopv"].tolist()))
+    sentiment_counts = {b: {lab: int(acc[lab][i]) for lab in SENTIMENT_LABELS}
+                        for i, b in enumerate(brands_all)}
+
+    return {
         "project": cfg.get("project_name","SoV"),
         "query": cfg["keywords"]["seeds"][0],
-        "total_items": len(df),
+        "total_items": total_items,
         "brands": brands_all,
         "rms": {"totals": rms, "share": compute_shares(rms)},
         "wsov": {"totals": wsov, "share": compute_shares(wsov)},
         "sopv": {"totals": sopv, "share": compute_shares(sopv)},
         "sentiment_breakdown": sentiment_counts,
-        "top_publishers": (df.groupby("publisher")["url"].count()
-                             .sort_values(ascending=False).head(10)
-                             .reset_index().rename(columns={"url":"count"})
-                             .to_dict(orient="records"))
+        "top_publishers": top_publishers(publishers)
     }
 
-    ensure_dirs(out_dir)
-    df.to_csv(os.path.join(out_dir,"scored.csv"),index=False,encoding="utf-8")
+def scored_sinks(cfg: dict, out_dir: str) -> list:
+    """(storage, path) pairs the scored table goes to: output.format, plus CSV if export_csv."""
+    fmt = cfg["output"].get("format", "csv")
+    sinks = [(get_storage(fmt), table_path(out_dir, "scored", fmt))]
+    if fmt != "csv" and cfg["output"].get("export_csv", False):
+        sinks.append((CsvStorage(), table_path(out_dir, "scored", "csv")))
+    return sinks
+
+SCORED_SLICE = 100_000
+
+def write_scored(df: pd.DataFrame, M: np.ndarray, brands_all: List[str], sinks: list,
+                 append: bool = False) -> None:
+    """
+    Write the scored rows SCORED_SLICE at a time, so the per-row text columns
+    (scan_text if it was dropped, brand_mentions_json) exist for one slice only.
+    """
+    for start in range(0, max(len(df), 1), SCORED_SLICE):
+        scored = df.iloc[start:start + SCORED_SLICE].copy(deep=False)
+        if "scan_text" not in scored.columns:
+            scored.insert(scored.columns.get_loc("dominant_brand"), "scan_text", scan_text(scored))
+        scored.insert(scored.columns.get_loc("dominant_brand"), "brand_mentions_json",
+                      mentions_json(M[start:start + SCORED_SLICE], brands_all))
+        scored["sentiment"] = scored["sentiment"].astype("float64")
+        for storage, path in sinks:
+            storage.write_table(scored, path, append=append or start > 0)
+
+def close_sinks(sinks: list) -> str:
+    for storage, _ in sinks:
+        storage.close()
+    return ", ".join(os.path.basename(path) for _, path in sinks)
+
+def write_summary(summary: dict, out_dir: str) -> None:
     write_json(summary, os.path.join(out_dir,"summary.json"))
 
     brand_rows=[]
-    for b in brands_all:
+    for b in summary["brands"]:
         brand_rows.append({
             "brand":b,
-            "mentions":rms[b],
-            "wsov":wsov[b],
-            "sopv":sopv[b],
-            **sentiment_counts[b]
+            "mentions":summary["rms"]["totals"][b],
+            "wsov":summary["wsov"]["totals"][b],
+            "sopv":summary["sopv"]["totals"][b],
+            **summary["sentiment_breakdown"][b]
         })
     write_csv(brand_rows, os.path.join(out_dir,"brand_summary.csv"))
-    logging.info(f"Saved {len(df)} rows → scored.csv, summary.json, brand_summary.csv")
+
+def write_tables(tables: Dict[str, pd.DataFrame], cfg: dict, out_dir: str) -> None:
+    fmt = cfg["output"].get("format", "csv")
+    storage = get_storage(fmt)
+    for name, table in tables.items():
+        storage.write_table(table, table_path(out_dir, name, fmt))
+    storage.close()
+
+def write_outputs(df: pd.DataFrame, M: np.ndarray, acc: Dict[str, np.ndarray],
+                  brands_all: List[str], cfg: dict, out_dir: str) -> dict:
+    metrics = get_metrics()
+    with metrics.stage("aggregate", rows_in=len(df)) as st:
+        summary = build_summary(acc, brands_all, cfg, len(df), publisher_counts(df))
+        tables = dashboard_tables(df)
+        st.rows_out = len(brands_all)
+    with metrics.stage("write", rows_in=len(df)) as st:
+        ensure_dirs(out_dir)
+        sinks = scored_sinks(cfg, out_dir)
+        write_scored(df, M, brands_all, sinks)
+        names = close_sinks(sinks)
+        write_summary(summary, out_dir)
+        write_tables(tables, cfg, out_dir)
+        st.rows_out = len(df)
+    logging.info(f"Saved {len(df)} rows → {names}, summary.json, brand_summary.csv, agg_*")
+    return summary
+
+# ----------------- Rollups -----------------
+def rollup_path(cfg: dict, out_dir: str) -> str:
+    return cfg.get("output", {}).get("rollup_path") or os.path.join(out_dir, "rollup.sqlite")
+
+def frame_buckets(df: pd.DataFrame, M: np.ndarray, brands: List[str], days=None):
+    """Rollup (buckets, volume) of a scored frame; days defaults to its publish days."""
+    days = bucket_days(df["published_at"]) if days is None else days
+    return rollup_buckets(days, df["platform"], M, df["wsov_item"], df["sentiment_label"], brands)
+
+def write_rollup(buckets, brands: List[str], cfg: dict, out_dir: str, token=None) -> None:
+    store = RollupStore(rollup_path(cfg, out_dir))
+    store.rebuild(*buckets, brands, token)
+    store.close()
+
+def rebuild_rollup(df: pd.DataFrame, M: np.ndarray, brands: List[str], cfg: dict, out_dir: str) -> None:
+    """Full runs: replace the rollup store with the buckets of every scored row."""
+    with get_metrics().stage("rollup", rows_in=len(df)) as st:
+        buckets = frame_buckets(df, M, brands)
+        write_rollup(buckets, brands, cfg, out_dir)
+        st.rows_out = len(buckets[0])
+
+# ----------------- Incremental -----------------
+def state_signature(matcher: BrandMatcher, sentiment: bool = True) -> dict:
+    return {"brands": matcher.brands, "longest_only": matcher.longest_only,
+            "model": model_key() if sentiment else None}
+
+def incremental_update(df: pd.DataFrame, matcher: BrandMatcher, cfg: dict, store: StateStore,
+                       rollups: RollupStore, clusters=None):
+    """
+    Score only rows whose URL is new or whose collected fields changed, and
+    move the stored brand totals and rollup buckets by the deltas of
+    changed/removed rows (the buckets are rebuilt if they were not last moved
+    with this state). With near-duplicate clusters, a duplicate also counts as
+    changed when its head's text did. Returns the same (df, M, acc) a full run
+    would produce.
+    """
+    brands = matcher.brands
+    metrics = get_metrics()
+    with metrics.stage("state_load") as st:
+        hashes = content_hashes(df)
+        if clusters is not None:
+            # A near-duplicate's stored sentiment is its head's: it is only current while that head's text is.
+            dup = clusters != np.arange(len(df))
+            text = pd.util.hash_array(df["scan_text"].to_numpy(dtype=object)).view(np.int64)
+            hashes = np.where(dup, hashes ^ text[clusters], hashes)
+        old, old_M = store.load()
+        old_acc = store.totals() or aggregate_mentions(old_M, [], [])
+        st.rows_out = len(old)
+
+    pos = old.index.get_indexer(df["url"])
+    known = pos >= 0
+    same = known.copy()
+    same[known] = old["content_hash"].to_numpy()[pos[known]] == hashes[known]
+    todo = ~same
+
+    # Rows leaving the totals: stored versions of changed URLs and URLs no longer present.
+    gone = np.ones(len(old), dtype=bool)
+    gone[pos[same]] = False
+    removed = old.index[gone].difference(df["url"])
+    logging.info(f"Incremental: {int(todo.sum())} new/changed, {int(same.sum())} unchanged, "
+                 f"{len(removed)} removed")
+    metrics.info["incremental"] = {"changed": int(todo.sum()), "unchanged": int(same.sum()),
+                                   "removed": len(removed)}
+
+    M = np.zeros((len(df), len(brands)), dtype=MENTION_DTYPE)
+    sentiment = np.zeros(len(df), dtype=float)
+    M[same] = old_M[pos[same]]
+    sentiment[same] = old["sentiment"].to_numpy()[pos[same]]
+    if todo.any() and clusters is None:
+        M[todo], sentiment[todo] = score_texts(df.loc[todo, "scan_text"], matcher, cfg)
+    elif todo.any():
+        # Score new/changed cluster heads; every other changed row takes its head's
+        # sentiment, just scored or stored (an unchanged head is not scored again).
+        lead = todo & ~dup
+        M[lead], sentiment[lead] = score_texts(df.loc[lead, "scan_text"], matcher, cfg)
+        rest = todo & dup
+        with metrics.stage("mentions", rows_in=int(rest.sum())) as st:
+            M[rest] = mention_matrix(df.loc[rest, "scan_text"], matcher)
+            st.rows_out = int(rest.sum())
+        sentiment[rest] = sentiment[clusters[rest]]
+    df = derive_columns(df, M, sentiment, brands)
+    days = bucket_days(df["published_at"])
+
+    old_out = old.iloc[np.flatnonzero(gone)]
+    old_labels = old_out["sentiment"].map(sentiment_label)
+    minus = aggregate_mentions(old_M[gone], old_out["wsov_item"], old_labels)
+    plus = aggregate_mentions(M[todo], df.loc[todo, "wsov_item"], df.loc[todo, "sentiment_label"])
+    acc = {k: old_acc[k] - minus[k] + plus[k] for k in old_acc}
+
+    in_sync = rollups.token() is not None and rollups.token() == store.rollup_token() \
+        and rollups.brands() == brands
+    token = uuid.uuid4().hex
+    with metrics.stage("state_save", rows_in=int(todo.sum())) as st:
+        upserts = df.loc[todo, ["url", "sentiment", "engagement", "wsov_item", "platform"]].set_index("url")
+        upserts["content_hash"] = hashes[todo]
+        upserts["day"] = days[todo]
+        store.save(upserts, M[todo], removed, acc, rollup_token=token)
+        st.rows_out = len(upserts)
+    moved = int(todo.sum() + gone.sum()) if in_sync else len(df)
+    with metrics.stage("rollup", rows_in=moved) as st:
+        if in_sync:
+            rollups.apply(rollup_buckets(days[todo], df.loc[todo, "platform"], M[todo],
+                                         df.loc[todo, "wsov_item"], df.loc[todo, "sentiment_label"], brands),
+                          rollup_buckets(old_out["day"], old_out["platform"], old_M[gone],
+                                         old_out["wsov_item"], old_labels, brands),
+                          brands, token)
+        else:
+            logging.info("Rollup store is not in step with the incremental state; rebuilding it")
+            rollups.rebuild(*frame_buckets(df, M, brands, days), brands, token)
+        st.rows_out = moved
+    return df, M, acc
+
+# ----------------- Parallel -----------------
+_WORKER: dict = {}
+SHARD_INPUT_COLUMNS = ["scan_text", "views", "likes", "comments", "published_at"]
+DERIVED_COLUMNS = ["dominant_brand", "sentiment", "sentiment_label", "engagement", "wsov_item"]
+
+def _init_worker(cfg: dict, num_threads: int):
+    """Process-pool initializer: build the matcher and sentiment state once per worker."""
+    _WORKER["cfg"] = {**cfg, "sentiment": {**cfg.get("sentiment", {}), "num_threads": num_threads}}
+    _WORKER["matcher"] = compile_brand_matcher(cfg["brands"]["primary"], cfg["brands"]["competitors"],
+                                               longest_only=cfg["brands"].get("longest_match_only", False))
+    _WORKER["cache"] = open_sentiment(cfg)
+    sent_cfg = cfg.get("sentiment", {})
+    if _WORKER["cache"] is None and sent_cfg.get("enabled", True) and not sent_cfg.get("daemon_socket"):
+        # Without a cache every worker will need the model: load it up front.
+        # With one, it is loaded on the first miss (still at most once per worker).
+        warm_up()
+
+def _score_shard(shard: pd.DataFrame):
+    """
+    Score one shard; returns its derived columns, mention matrix, partial
+    accumulators, cache counts and stage metrics.
+    """
+    cfg, matcher, cache = _WORKER["cfg"], _WORKER["matcher"], _WORKER["cache"]
+    metrics = start_run("analyze-worker")
+    before = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    M, sentiment = score_texts(shard["scan_text"], matcher, cfg,
+                               shard["cluster"].to_numpy() if "cluster" in shard.columns else None)
+    shard = derive_columns(shard.drop(columns=["scan_text", "cluster"], errors="ignore"),
+                           M, sentiment, matcher.brands)
+    acc = aggregate_mentions(M, shard["wsov_item"], shard["sentiment_label"])
+    after = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    return (shard[["published_at"] + DERIVED_COLUMNS], M, acc,
+            (after[0] - before[0], after[1] - before[1]), metrics.stages)
+
+def score_parallel(df: pd.DataFrame, cfg: dict, brands: List[str], workers: int, clusters=None):
+    """
+    Shard the frame across a process pool and merge the results.
+    - Rows are sharded by a hash of scan_text (of the cluster head's, with
+      near-duplicate clusters), so identical texts and clusters land in the
+      same shard and are still scored once.
+    - Shards are merged in shard order, so results are deterministic; rms and
+      sentiment counts equal a serial run, wsov/sopv up to float summation order.
+    """
+    n_shards = workers * 4
+    shard_of = pd.util.hash_array(df["scan_text"].to_numpy(dtype=object)) % n_shards
+    inputs = df[SHARD_INPUT_COLUMNS]
+    if clusters is not None:
+        shard_of, inputs = shard_of[clusters], inputs.assign(cluster=clusters)
+    shards = [np.flatnonzero(shard_of == i) for i in range(n_shards)]
+    shards = [idx for idx in shards if len(idx)]
+    sent_cfg = cfg.get("sentiment", {})
+    num_threads = sent_cfg.get("num_threads") or max(1, (os.cpu_count() or 1) // workers)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cfg, num_threads)) as pool:
+        results = list(pool.map(_score_shard, [inputs.iloc[idx] for idx in shards]))
+
+    M = np.zeros((len(df), len(brands)), dtype=MENTION_DTYPE)
+    derived = pd.concat([r[0] for r in results]).sort_index()
+    acc = None
+    metrics = get_metrics()
+    for idx, (_, M_part, part, _, stages) in zip(shards, results):
+        M[idx] = M_part
+        acc = part if acc is None else {k: acc[k] + part[k] for k in acc}
+        metrics.merge_stages(stages, prefix="workers/")
+    hits, misses = (sum(r[3][i] for r in results) for i in (0, 1))
+    if hits or misses:
+        logging.info(f"Sentiment cache (workers): {hits} hits, {misses} misses")
+        metrics.info["sentiment_cache"] = {"hits": hits, "misses": misses}
+
+    df["published_at"] = derived["published_at"]
+    for col in DERIVED_COLUMNS:
+        df[col] = derived[col]
+    return df, M, acc
+
+# ----------------- Analyzer -----------------
+def analyze(inputs: List[str], cfg: dict, out_dir: str, incremental: bool = False, workers: int = 1):
+    brand_patterns = compile_brand_matcher(cfg["brands"]["primary"], cfg["brands"]["competitors"],
+                                           longest_only=cfg["brands"].get("longest_match_only", False))
+    brands_all = brand_patterns.brands
+    metrics = get_metrics()
+
+    with metrics.stage("read") as st:
+        df = read_items(inputs, columns=UNIFIED_COLUMNS)
+        st.rows_out = len(df)
+    with metrics.stage("dedupe", rows_in=len(df)) as st:
+        df = df[~url_keys(df, cfg).duplicated().to_numpy()].reset_index(drop=True)
+        st.rows_out = len(df)
+    if df.empty:
+        logging.error("No data rows found. Run collectors first.")
+        return
+    df, clusters = near_dedupe(prepare_frame(df), cfg)
+
+    if cfg.get("sentiment", {}).get("enabled", True):
+        logging.info("Running sentiment (may download model on first run)…")
+    if workers > 1 and not incremental:
+        with metrics.stage("score_workers", rows_in=len(df)) as st:
+            df, M, acc = score_parallel(df, cfg, brands_all, workers, clusters)
+            st.rows_out = len(df)
+        df = compact_scored(df, M)
+        write_outputs(df, M, acc, brands_all, cfg, out_dir)
+        rebuild_rollup(df, M, brands_all, cfg, out_dir)
+        return
+
+    cache = open_sentiment(cfg)
+    if incremental:
+        state_path = cfg["output"].get("state_path") or os.path.join(out_dir, ".state.sqlite")
+        store = StateStore(state_path, state_signature(brand_patterns,
+                                                        cfg.get("sentiment", {}).get("enabled", True)))
+        rollups = RollupStore(rollup_path(cfg, out_dir))
+        df, M, acc = incremental_update(df, brand_patterns, cfg, store, rollups, clusters)
+        rollups.close()
+        store.close()
+        df = compact_scored(df, M)
+    else:
+        M, sentiment = score_texts(df["scan_text"], brand_patterns, cfg, clusters)
+        df = compact_scored(derive_columns(df, M, sentiment, brands_all), M)
+        with metrics.stage("aggregate"):  # rows are counted by write_outputs' aggregate
+            acc = aggregate_mentions(M, df["wsov_item"], df["sentiment_label"])
+        rebuild_rollup(df, M, brands_all, cfg, out_dir)
+
+    write_outputs(df, M, acc, brands_all, cfg, out_dir)
+    if cache is not None:
+        logging.info(cache.stats())
+        metrics.info["sentiment_cache"] = {"hits": cache.hits, "misses": cache.misses}
+        set_cache(None)
+        cache.close()
+
+def analyze_streaming(inputs: List[str], cfg: dict, out_dir: str, chunksize: int = 50_000):
+    """
+    Bounded-memory variant of analyze(): inputs are read chunk by chunk with
+    explicit dtypes, URLs are deduplicated across chunks with a hashed seen-set
+    (near-duplicate texts only within a chunk), each chunk is scored and appended to the scored table, and only the per-brand
+    accumulators, rollup buckets and publisher counts are carried between chunks.
+    """
+    brand_patterns = compile_brand_matcher(cfg["brands"]["primary"], cfg["brands"]["competitors"],
+                                           longest_only=cfg["brands"].get("longest_match_only", False))
+    brands_all = brand_patterns.brands
+    ensure_dirs(out_dir)
+    sinks = scored_sinks(cfg, out_dir)
+
+    cache = open_sentiment(cfg)
+    metrics = get_metrics()
+    seen = SeenSet()
+    acc, buckets, publishers, tables, total = None, None, pd.Series(dtype="int64", name="url"), None, 0
+    chunks = iter_items(inputs, chunksize)
+    while True:
+        with metrics.stage("read") as st:
+            chunk = next(chunks, None)
+            st.rows_out = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            break
+        with metrics.stage("dedupe", rows_in=len(chunk)) as st:
+            chunk = chunk[seen.first_seen(url_keys(chunk, cfg))].reset_index(drop=True)
+            st.rows_out = len(chunk)
+        if chunk.empty:
+            continue
+        chunk, clusters = near_dedupe(prepare_frame(chunk), cfg)
+        M, sentiment = score_texts(chunk["scan_text"], brand_patterns, cfg, clusters)
+        chunk = derive_columns(chunk, M, sentiment, brands_all)
+        with metrics.stage("aggregate", rows_in=len(chunk)):
+            part = aggregate_mentions(M, chunk["wsov_item"], chunk["sentiment_label"])
+            acc = part if acc is None else {k: acc[k] + part[k] for k in acc}
+            part_buckets = frame_buckets(chunk, M, brands_all)
+            buckets = part_buckets if buckets is None else merge_buckets(buckets, part_buckets)
+            publishers = (pd.concat([publishers, publisher_counts(chunk)])
+                            .groupby(level=0).sum().rename_axis("publisher"))
+            part_tables = dashboard_tables(chunk)
+            tables = part_tables if tables is None else merge_tables(tables, part_tables)
+        with metrics.stage("write", rows_in=len(chunk)) as st:
+            write_scored(chunk, M, brands_all, sinks, append=total > 0)
+            st.rows_out = len(chunk)
+        total += len(chunk)
+        logging.info(f"Processed {total} unique rows…")
+
+    with metrics.stage("write") as st:
+        names = close_sinks(sinks)
+        if total:
+            write_summary(build_summary(acc, brands_all, cfg, total, publishers), out_dir)
+            write_tables(tables, cfg, out_dir)
+            write_rollup(buckets, brands_all, cfg, out_dir)
+    if total == 0:
+        logging.error("No data rows found. Run collectors first.")
+    else:
+        logging.info(f"Saved {total} rows → {names}, summary.json, brand_summary.csv, agg_*")
+    if cache is not None:
+        logging.info(cache.stats())
+        metrics.info["sentiment_cache"] = {"hits": cache.hits, "misses": cache.misses}
+        set_cache(None)
+        cache.close()
+
+def reaggregate(cfg: dict, out_dir: str):
+    """
+    Rebuild summary.json, brand_summary.csv and the agg_* tables from the
+    scored table already in out_dir, without reading inputs or scoring.
+    """
+    brands_all = compile_brand_matcher(cfg["brands"]["primary"], cfg["brands"]["competitors"]).brands
+    metrics = get_metrics()
+    with metrics.stage("read") as st:
+        df = load_table(out_dir, "scored", columns=["platform", "url", "publisher", "published_at",
+                                                    "brand_mentions_json"] + DERIVED_COLUMNS,
+                        fmt=cfg["output"].get("format", "csv"))
+        st.rows_out = len(df)
+    if df.empty:
+        logging.error(f"No scored table in {out_dir}. Run a full analysis first.")
+        return
+    with metrics.stage("aggregate", rows_in=len(df)) as st:
+        mentions = [json.loads(m) for m in df["brand_mentions_json"]]
+        M = compact_mentions(np.array([[m.get(b, 0) for b in brands_all] for m in mentions],
+                                      dtype=np.int32).reshape(len(df), len(brands_all)))
+        df["dominant_brand"] = df["dominant_brand"].fillna("")
+        df = compact_frame(df.drop(columns="brand_mentions_json"))
+        acc = aggregate_mentions(M, df["wsov_item"], df["sentiment_label"])
+        summary = build_summary(acc, brands_all, cfg, len(df), publisher_counts(df))
+        tables = dashboard_tables(df)
+        st.rows_out = len(brands_all)
+    with metrics.stage("write"):
+        write_summary(summary, out_dir)
+        write_tables(tables, cfg, out_dir)
+    rebuild_rollup(df, M, brands_all, cfg, out_dir)
+    logging.info(f"Re-aggregated {len(df)} scored rows → summary.json, brand_summary.csv, agg_*, rollup")
 
 def main():
     parser=argparse.ArgumentParser()
     parser.add_argument("--config",default="config.yaml")
     parser.add_argument("--inputs",nargs="*",default=None)
     parser.add_argument("--out_dir",default="out")
+    parser.add_argument("--incremental",action="store_true",
+                        help="score only new/changed URLs using the per-URL state store")
+    parser.add_argument("--stream",action="store_true",
+                        help="process inputs in chunks with bounded memory")
+    parser.add_argument("--chunksize",type=int,default=50_000)
+    parser.add_argument("--workers",type=int,default=1,
+                        help="shard analysis across N worker processes")
+    parser.add_argument("--skip-sentiment",action="store_true",
+                        help="count mentions only; items are treated as neutral and no model is loaded")
+    parser.add_argument("--aggregate-only",action="store_true",
+                        help="rebuild summary and agg_* tables from the existing scored table")
+    parser.add_argument("--profile",nargs="?",const=True,default=None,metavar="PATH",
+                        help="run under cProfile; stats go to PATH (default <out_dir>/analyze.prof)")
+    parser.add_argument("--prom",default=None,metavar="PATH",
+                        help="also write run metrics in Prometheus text format to PATH")
     args=parser.parse_args()
+    if args.stream and args.incremental:
+        parser.error("--stream and --incremental cannot be combined")
+    if args.workers > 1 and (args.stream or args.incremental):
+        parser.error("--workers applies to full runs only")
+
+    if args.aggregate_only and (args.stream or args.incremental or args.workers > 1 or args.inputs):
+        parser.error("--aggregate-only reads the scored table only")
 
     with open(args.config,"r",encoding="utf-8") as f: cfg=yaml.safe_load(f)
-    inputs=args.inputs or glob.glob(os.path.join(cfg["output"]["data_dir"],"*.csv"))
-    analyze(inputs,cfg,args.out_dir)
+    if args.skip_sentiment:
+        cfg["sentiment"] = {**cfg.get("sentiment", {}), "enabled": False}
+    inputs=[] if args.aggregate_only else (args.inputs or discover_inputs(cfg["output"]["data_dir"]))
+    mode=("aggregate-only" if args.aggregate_only else "stream" if args.stream
+          else "incremental" if args.incremental else f"workers={args.workers}" if args.workers > 1 else "full")
+
+    metrics=start_run("analyze")
+    metrics.info.update({"mode": mode, "config": args.config, "inputs": inputs, "out_dir": args.out_dir,
+                         "sentiment": {"enabled": cfg.get("sentiment", {}).get("enabled", True),
+                                       "backend": cfg.get("sentiment", {}).get("backend", "torch")}})
+    profile_path=os.path.join(args.out_dir,"analyze.prof") if args.profile is True else args.profile
+    with profiled(profile_path):
+        if args.aggregate_only:
+            reaggregate(cfg,args.out_dir)
+        elif args.stream:
+            analyze_streaming(inputs,cfg,args.out_dir,chunksize=args.chunksize)
+        else:
+            analyze(inputs,cfg,args.out_dir,incremental=args.incremental,workers=args.workers)
+
+    metrics.log_stages()
+    ensure_dirs(args.out_dir)
+    metrics.write_manifest(os.path.join(args.out_dir,"run_manifest.json"))
+    if args.prom:
+        metrics.write_prometheus(args.prom)
 
 if __name__=="__main__":
     main()
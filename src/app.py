@@ -1,32 +1,110 @@
 import os, json
+import yaml
 import pandas as pd
 import streamlit as st
 import altair as alt
+from utils.storage import head_table, load_table, table_path
+from utils.tables import DASHBOARD_TABLES, dashboard_tables
+from utils.query import FILTER_COLUMNS, SliceEngine
+from utils.rollup import RollupStore, period_over_period, window_table
+from utils.compact import compact_frame
+from analyze import rollup_path
 
 st.set_page_config(page_title="Smart Fan SoV Dashboard", layout="wide")
 
 st.title("Smart Fan Share-of-Voice (SoV) Dashboard")
 
 # ----------------- Load -----------------
-def load_json(path):
+OUT_DIR = "out"
+CONFIG_PATH = "config.yaml"
+
+def load_config(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+CFG = load_config(CONFIG_PATH)
+FMT = CFG.get("output", {}).get("format")  # which table wins when both .csv and .parquet exist
+
+def file_version(*paths):
+    """(mtime, size) fingerprint: cached loaders re-run only when a file changes."""
+    return tuple((os.path.getmtime(p), os.path.getsize(p)) if os.path.exists(p) else None
+                 for p in paths)
+
+def table_version(name):
+    return file_version(*(table_path(OUT_DIR, name, fmt) for fmt in ("parquet", "csv")))
+
+@st.cache_data(show_spinner=False)
+def load_json(path, version):
     return json.load(open(path)) if os.path.exists(path) else None
 
-def load_csv(path):
-    return pd.read_csv(path) if os.path.exists(path) else pd.DataFrame()
+@st.cache_data(show_spinner=False)
+def load_cached_table(name, version, columns=None):
+    return compact_frame(load_table(OUT_DIR, name, columns=list(columns) if columns else None, fmt=FMT))
+
+@st.cache_data(show_spinner=False)
+def load_preview(name, version, n=20):
+    return head_table(OUT_DIR, name, n, fmt=FMT)
+
+@st.cache_data(show_spinner=False)
+def load_dashboard_tables(versions):
+    # Outputs from before agg_* tables existed: derive them once from scored.
+    if any(not any(v) for v in versions.values()):
+        scored = load_cached_table("scored", table_version("scored"),
+                                   ("platform", "dominant_brand", "published_at", "engagement"))
+        return dashboard_tables(scored)  # items without a dominant brand are dropped there
+    return {name: load_table(OUT_DIR, name, fmt=FMT) for name in DASHBOARD_TABLES}
+
+ROLLUP_PATH = rollup_path(CFG, OUT_DIR)
+
+@st.cache_data(show_spinner=False)
+def load_rollup(version, freq, platforms, start=None, end=None):
+    """Per-period series plus 7/30/90-day and week-over-week shares, from the rollup buckets."""
+    store = RollupStore(ROLLUP_PATH)
+    platforms = list(platforms) or None
+    series = store.series(freq, start, end, platforms)
+    windows, _ = window_table(store, (7, 30, 90), end, platforms)
+    wow = period_over_period(store, 7, end, platforms)
+    store.close()
+    return series, windows, wow
 
-summary = load_json("out/summary.json")
-scored = load_csv("out/scored.csv")
-brand_summary = load_csv("out/brand_summary.csv")
+@st.cache_resource(show_spinner="Indexing scored items…")
+def get_engine(version, brands):
+    return SliceEngine(OUT_DIR, list(brands), FMT)
 
-if summary is None or scored.empty:
+summary_path = os.path.join(OUT_DIR, "summary.json")
+summary = load_json(summary_path, file_version(summary_path))
+preview = load_preview("scored", table_version("scored"))
+
+if summary is None or preview.empty:
     st.error(" No analysis results found. Run `python src/analyze.py` first.")
     st.stop()
 
+tables = load_dashboard_tables({name: table_version(name) for name in DASHBOARD_TABLES})
 brands = summary["brands"]
 
+# ----------------- Filters -----------------
+# Any active filter recomputes the metrics below for that slice (DuckDB);
+# with none, the precomputed summary and agg_* tables are used as-is.
+st.sidebar.header("Filters")
+engine = get_engine(table_version("scored"), tuple(brands))
+filters = {col: st.sidebar.multiselect(col.replace("_", " ").title(), engine.distinct(col))
+           for col in FILTER_COLUMNS}
+lo, hi = engine.date_range()
+if lo is not None:
+    dates = st.sidebar.date_input("Published between", (lo.date(), hi.date()),
+                                  min_value=lo.date(), max_value=hi.date())
+    if len(dates) == 2 and tuple(dates) != (lo.date(), hi.date()):
+        filters["start"], filters["end"] = dates
+if any(filters.values()):
+    summary = {**summary, **engine.summary(filters)}
+    tables = engine.tables(filters)
+    st.sidebar.caption(f"{summary['total_items']} items in slice")
+
 # ----------------- Raw Items -----------------
 st.subheader("Raw Data Preview")
-st.dataframe(scored.head(20))
+st.dataframe(preview)
 
 # ----------------- Mentions -----------------
 st.subheader("1️. Mentions (Raw Mention Share)")
@@ -54,8 +132,7 @@ with col2:
 # ----------------- Engagement -----------------
 st.subheader("2️. Engagement vs Weighted SoV")
 df_wsov = pd.DataFrame(summary["wsov"]["share"].items(), columns=["brand", "share"])
-df_eng = scored.groupby("dominant_brand")["engagement"].sum().reset_index()
-df_eng.columns = ["brand", "total_engagement"]
+df_eng = tables["agg_engagement"]
 
 col1, col2 = st.columns(2)
 with col1:
@@ -108,28 +185,52 @@ st.altair_chart(
 )
 
 # ----------------- Timeline -----------------
-if "published_at" in scored.columns:
+# Platform/date slices come straight from the rollup buckets; other filters
+# (and outputs from before the rollup store) use the per-item timeline.
+df_time = tables["agg_timeline"]
+rollup_ok = os.path.exists(ROLLUP_PATH) and not any(
+    v for k, v in filters.items() if k not in ("platform", "start", "end"))
+if rollup_ok:
+    st.subheader("5️. Timeline of Share of Voice")
+    col1, col2 = st.columns(2)
+    freq = col1.radio("Granularity", ["W", "M"], horizontal=True,
+                      format_func={"W": "Week", "M": "Month"}.get)
+    metric = col2.radio("Metric", ["mentions", "rms_share", "wsov_share", "sopv_share"], horizontal=True,
+                        format_func={"mentions": "Mentions", "rms_share": "RMS", "wsov_share": "wSoV",
+                                     "sopv_share": "SoPV"}.get)
+    df_series, df_windows, df_wow = load_rollup(
+        file_version(ROLLUP_PATH, ROLLUP_PATH + "-wal"), freq, tuple(filters.get("platform") or ()),
+        *(str(filters[k]) if filters.get(k) else None for k in ("start", "end")))
+    fmt = "d" if metric == "mentions" else "%"
+    st.altair_chart(
+        alt.Chart(df_series).mark_line(point=True).encode(
+            x=alt.X("period:T", title=None),
+            y=alt.Y(f"{metric}:Q", axis=alt.Axis(format=fmt)),
+            color="brand:N",
+            tooltip=["period", "brand", alt.Tooltip(f"{metric}:Q", format=".1%" if fmt == "%" else "d")]
+        ),
+        use_container_width=True
+    )
+    st.markdown("**Trailing 7/30/90-day shares** and week-over-week change (pp)")
+    col1, col2 = st.columns(2)
+    col1.dataframe(df_windows.style.format("{:.1%}"))
+    if not df_wow.empty:
+        col2.dataframe(df_wow.filter(like="_delta_pp").style.format("{:+.1f} pp"))
+elif not df_time.empty:
     st.subheader("5️. Timeline of Mentions")
-    scored["published_at"] = pd.to_datetime(scored["published_at"], errors="coerce")
-    df_time = (
-        scored.dropna(subset=["published_at"])
-        .groupby([pd.Grouper(key="published_at", freq="M"), "dominant_brand"])
-        .size().reset_index(name="count")
+    st.altair_chart(
+        alt.Chart(df_time).mark_line(point=True).encode(
+            x="month:T",
+            y="count:Q",
+            color="dominant_brand:N",
+            tooltip=["month", "dominant_brand", "count"]
+        ),
+        use_container_width=True
     )
-    if not df_time.empty:
-        st.altair_chart(
-            alt.Chart(df_time).mark_line(point=True).encode(
-                x="published_at:T",
-                y="count:Q",
-                color="dominant_brand:N",
-                tooltip=["published_at", "dominant_brand", "count"]
-            ),
-            use_container_width=True
-        )
 
 # ----------------- Heatmap -----------------
 st.subheader("6️. Brand × Platform Presence")
-df_heat = scored.groupby(["platform", "dominant_brand"]).size().reset_index(name="count")
+df_heat = tables["agg_brand_platform"]
 heat = alt.Chart(df_heat).mark_rect().encode(
     x="platform:N",
     y="dominant_brand:N",
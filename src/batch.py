@@ -0,0 +1,288 @@
+import os
+import logging
+import argparse
+from typing import Dict, List, Optional
+import yaml
+
+from utils.lazy import lazy_import
+from utils.io import UNIFIED_COLUMNS, ensure_dirs
+from utils.storage import discover_inputs, get_storage, read_items
+from utils.brands import compile_brand_matcher
+from utils.text import sentiment_scores, set_cache
+from utils.metrics import get_metrics, profiled, start_run
+from utils.snapshots import locale_key
+from analyze import (aggregate_mentions, compact_scored, derive_columns, mention_matrix, near_dedupe,
+                     open_sentiment, prepare_frame, rebuild_rollup, url_keys, write_outputs)
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# ----------------- Configs -----------------
+def load_configs(paths: List[str], out_root: Optional[str] = None) -> Dict[str, dict]:
+    """
+    {name: cfg} per config file, named after the file (smart_fan.yaml → smart_fan).
+    Each config writes to <out_root>/<name> if out_root is given, else to its
+    own output.out_dir, which must then differ between configs.
+    """
+    cfgs = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in cfgs:
+            raise SystemExit(f"Two configs are named {name!r}; rename one of the files.")
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f)
+        cfg["output"]["out_dir"] = os.path.join(out_root, name) if out_root else cfg["output"].get("out_dir", "out")
+        cfgs[name] = cfg
+    out_dirs = [os.path.abspath(c["output"]["out_dir"]) for c in cfgs.values()]
+    if len(set(out_dirs)) < len(out_dirs):
+        raise SystemExit("Configs share an output.out_dir; pass --out_root to give each its own directory.")
+    return cfgs
+
+def union_queries(cfgs: Dict[str, dict]) -> List[str]:
+    return list(dict.fromkeys(q for cfg in cfgs.values() for q in cfg["keywords"]["seeds"]))
+
+def union_jobs(cfgs: Dict[str, dict]) -> List[tuple]:
+    """Distinct CSE (query, locale) jobs over all configs; a config without locales searches {}."""
+    jobs = {}
+    for cfg in cfgs.values():
+        for q in cfg["keywords"]["seeds"]:
+            for loc in cfg["keywords"].get("locales") or [{}]:
+                jobs.setdefault((q, locale_key(loc)), (q, loc))
+    return list(jobs.values())
+
+def shared_sentiment(cfgs: Dict[str, dict]) -> Optional[dict]:
+    """
+    The config whose sentiment section loads the one model of the batch (the
+    first with sentiment enabled; None if none is). Configs asking for another
+    backend or model_dir are scored with this one and a warning.
+    """
+    enabled = [(n, c) for n, c in cfgs.items() if c.get("sentiment", {}).get("enabled", True)]
+    if not enabled:
+        return None
+    first, cfg = enabled[0]
+    key = lambda c: (c["sentiment"].get("backend", "torch"), c["sentiment"].get("model_dir"))
+    for name, other in enabled[1:]:
+        if key(other) != key(cfg):
+            logging.warning(f"{name}: sentiment backend {key(other)} differs; scoring with {first}'s {key(cfg)}")
+    return cfg
+
+# ----------------- Fetch -----------------
+def fetch_union(cfgs: Dict[str, dict], data_dir: str, fmt: str, base_url: Optional[str] = None) -> None:
+    """
+    Collect every query of every config once into data_dir (youtube.<ext>,
+    google.<ext>). API keys, quotas and concurrency come from the first config;
+    both platforms return up to the largest default_top_n of the configs
+    (config_frame trims each config back to its own).
+    """
+    # Collector modules import their API clients; load them only when fetching.
+    from fetch_youtube import collect_youtube, get_client
+    from fetch_google import CSE_URL, collect_google_jobs
+
+    first = next(iter(cfgs.values()))
+    storage = get_storage(fmt)
+    ensure_dirs(data_dir)
+    queries = union_queries(cfgs)
+    top_n = max(cfg["default_top_n"] for cfg in cfgs.values())
+    metrics = get_metrics()
+    metrics.info["queries"] = queries
+
+    yt_cfg = first["platforms"]["youtube"]
+    api_key = os.getenv(yt_cfg["api_key_env"])
+    if not api_key:
+        logging.error("Missing YOUTUBE_API_KEY env var; skipping YouTube.")
+    else:
+        logging.info(f"Fetching up to {min(top_n, 200)} YouTube results for {len(queries)} queries")
+        with metrics.stage("fetch_youtube") as st:
+            rows = collect_youtube(get_client(api_key), queries, min(top_n, 200),
+                                   quota_budget=yt_cfg.get("daily_quota"),
+                                   max_workers=yt_cfg.get("max_workers", 4))
+            storage.write_items(rows, os.path.join(data_dir, "youtube" + storage.ext))
+            st.rows_out = len(rows)
+        logging.info(f"Saved {len(rows)} YouTube rows → {data_dir}")
+
+    cse_cfg = first["platforms"]["google_cse"]
+    api_key, engine_id = os.getenv(cse_cfg["api_key_env"]), os.getenv(cse_cfg["engine_id_env"])
+    if not api_key or not engine_id:
+        logging.error("Missing GOOGLE_CSE_API_KEY or GOOGLE_CSE_ENGINE_ID env vars; skipping Google.")
+    else:
+        jobs = union_jobs(cfgs)
+        logging.info(f"Fetching up to {min(top_n, 100)} Google results for {len(jobs)} query × locale jobs")
+        with metrics.stage("fetch_google") as st:
+            rows = [row for part in collect_google_jobs(api_key, engine_id, jobs, min(top_n, 100),
+                                                        max_workers=cse_cfg.get("max_workers", 4),
+                                                        qps=cse_cfg.get("qps", 1.0),
+                                                        daily_quota=cse_cfg.get("daily_quota"),
+                                                        base_url=base_url or CSE_URL)
+                    for row in part]
+            storage.write_items(rows, os.path.join(data_dir, "google" + storage.ext))
+            st.rows_out = len(rows)
+        logging.info(f"Saved {len(rows)} Google rows → {data_dir}")
+    storage.close()
+
+# ----------------- Analyze -----------------
+RANK_CAPS = {"youtube": 200, "google": 100}  # each collector's limit on default_top_n
+
+def config_frame(corpus: pd.DataFrame, cfg: dict):
+    """
+    One config's rows of the shared corpus, as analyze() would see them: items
+    collected for its seeds within its default_top_n (the corpus is fetched at
+    the largest of the configs), deduplicated by URL, near-duplicates clustered.
+    Rows without a rank (refreshed by --delta) are kept.
+    Returns (df, text ids into the corpus' unique texts, clusters).
+    """
+    top_n = cfg["default_top_n"]
+    limit = corpus["platform"].map({p: min(top_n, cap) for p, cap in RANK_CAPS.items()}).fillna(top_n)
+    rank = pd.to_numeric(corpus["rank"], errors="coerce")
+    keep = corpus["query"].isin(cfg["keywords"]["seeds"]) & (rank.isna() | (rank <= limit))
+    df = corpus[keep.to_numpy()]
+    df = df[~url_keys(df, cfg).duplicated().to_numpy()].reset_index(drop=True)
+    df, clusters = near_dedupe(df, cfg)
+    return df, df.pop("text_id").to_numpy(), clusters
+
+def analyze_batch(inputs: List[str], cfgs: Dict[str, dict]) -> None:
+    """
+    analyze() for N configs over one corpus:
+    - inputs are read once; each config keeps the rows of its own seeds;
+    - brand mentions are counted once per distinct text with the union of all
+      brand lists (configs with longest_match_only get their own matcher, as
+      overlap resolution depends on the brand set);
+    - one sentiment model is loaded and each distinct text that heads a row
+      (or a near-duplicate cluster) in any config is scored once;
+    - summary.json, brand_summary.csv, agg_* tables, scored table and rollup
+      are written per config, as analyze.py would write them.
+    """
+    metrics = get_metrics()
+    with metrics.stage("read") as st:
+        corpus = read_items(inputs, columns=UNIFIED_COLUMNS)
+        st.rows_out = len(corpus)
+    if corpus.empty:
+        logging.error("No data rows found. Run collectors first.")
+        return
+    corpus = prepare_frame(corpus)
+    codes, uniques = pd.factorize(corpus["scan_text"])
+    corpus["text_id"] = codes
+    texts = pd.Series(uniques, dtype=object)
+    logging.info(f"Corpus: {len(corpus)} rows, {len(texts)} distinct texts")
+
+    frames, per_config = {}, {}
+    for name, cfg in cfgs.items():
+        frames[name] = config_frame(corpus, cfg)
+        per_config[name] = {"seeds": cfg["keywords"]["seeds"],
+                            **({"near_duplicates": metrics.info.pop("near_duplicates")}
+                               if "near_duplicates" in metrics.info else {})}
+        logging.info(f"{name}: {len(frames[name][0])} unique rows for seeds {cfg['keywords']['seeds']}")
+    del corpus
+
+    # Mentions: one pass per distinct text with the union of the brand lists.
+    shared = [n for n, c in cfgs.items() if not c["brands"].get("longest_match_only", False)]
+    union = compile_brand_matcher([b for n in shared for b in cfgs[n]["brands"]["primary"]],
+                                  [b for n in shared for b in cfgs[n]["brands"]["competitors"]])
+    needed = np.unique(np.concatenate([frames[n][1] for n in shared] or [np.empty(0, dtype=np.intp)]))
+    with metrics.stage("mentions", rows_in=len(needed)) as st:
+        M_union = np.zeros((len(texts), len(union.brands)), dtype=np.int16)
+        M_union[needed] = mention_matrix(texts.iloc[needed], union)
+        st.rows_out = len(needed)
+
+    # Sentiment: one model, each distinct head text once.
+    sent_cfg = shared_sentiment(cfgs)
+    scores, cache = np.zeros(len(texts)), None
+    if sent_cfg is not None:
+        scored = [n for n, c in cfgs.items() if c.get("sentiment", {}).get("enabled", True)]
+        heads = np.unique(np.concatenate(
+            [ids if clusters is None else ids[np.unique(clusters)]
+             for ids, clusters in (frames[n][1:] for n in scored)] or [np.empty(0, dtype=np.intp)]))
+        cache = open_sentiment(sent_cfg)
+        logging.info("Running sentiment (may download model on first run)…")
+        with metrics.stage("sentiment", rows_in=len(heads)) as st:
+            s = sent_cfg["sentiment"]
+            scores[heads] = sentiment_scores(texts.iloc[heads], batch_size=s.get("batch_size", 32),
+                                             num_threads=s.get("num_threads") or None,
+                                             daemon=s.get("daemon_socket") or None)
+            st.rows_out = len(heads)
+
+    for name, cfg in cfgs.items():
+        df, ids, clusters = frames.pop(name)
+        if df.empty:
+            logging.error(f"{name}: no rows for its seeds; nothing written.")
+            continue
+        matcher = compile_brand_matcher(cfg["brands"]["primary"], cfg["brands"]["competitors"],
+                                        longest_only=cfg["brands"].get("longest_match_only", False))
+        brands = matcher.brands
+        if name in shared:
+            M = M_union[ids][:, [union.brands.index(b) for b in brands]]
+        else:
+            with metrics.stage("mentions", rows_in=len(df)) as st:
+                M = mention_matrix(df["scan_text"], matcher)
+                st.rows_out = len(M)
+        if cfg.get("sentiment", {}).get("enabled", True):
+            sentiment = scores[ids if clusters is None else ids[clusters]]
+        else:
+            sentiment = np.zeros(len(df))
+        df = compact_scored(derive_columns(df, M, sentiment, brands), M)
+        with metrics.stage("aggregate"):
+            acc = aggregate_mentions(M, df["wsov_item"], df["sentiment_label"])
+        out_dir = cfg["output"]["out_dir"]
+        rebuild_rollup(df, M, brands, cfg, out_dir)
+        summary = write_outputs(df, M, acc, brands, cfg, out_dir)
+        per_config[name].update(out_dir=out_dir, rows=len(df), memory=metrics.info.pop("memory", None))
+        logging.info(f"{name}: {summary['total_items']} items → {out_dir}")
+    metrics.info["configs"] = per_config
+
+    if cache is not None:
+        logging.info(cache.stats())
+        metrics.info["sentiment_cache"] = {"hits": cache.hits, "misses": cache.misses}
+        set_cache(None)
+        cache.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several configs (categories) over one shared corpus")
+    parser.add_argument("--configs", nargs="+", required=True, metavar="YAML")
+    parser.add_argument("--out_root", default=None,
+                        help="write each config's outputs to OUT_ROOT/<config name> (default: its output.out_dir)")
+    parser.add_argument("--fetch", action="store_true",
+                        help="first collect the union of all configs' queries once into --data_dir")
+    parser.add_argument("--base-url", default=None, help="CSE endpoint for --fetch (e.g. a local stub server)")
+    parser.add_argument("--data_dir", default=None,
+                        help="shared collector outputs (default: the first config's output.data_dir)")
+    parser.add_argument("--inputs", nargs="*", default=None,
+                        help="default: the inputs in every config's data_dir (or --data_dir)")
+    parser.add_argument("--skip-sentiment", action="store_true",
+                        help="count mentions only; items are treated as neutral and no model is loaded")
+    parser.add_argument("--profile", nargs="?", const=True, default=None, metavar="PATH",
+                        help="run under cProfile; stats go to PATH (default <out_root or .>/batch.prof)")
+    parser.add_argument("--prom", default=None, metavar="PATH",
+                        help="also write run metrics in Prometheus text format to PATH")
+    args = parser.parse_args()
+    if args.fetch and args.inputs:
+        parser.error("--fetch writes the inputs; drop --inputs")
+
+    cfgs = load_configs(args.configs, args.out_root)
+    first = next(iter(cfgs.values()))
+    if args.skip_sentiment:
+        for cfg in cfgs.values():
+            cfg["sentiment"] = {**cfg.get("sentiment", {}), "enabled": False}
+    data_dirs = [args.data_dir] if args.data_dir or args.fetch else \
+        list(dict.fromkeys(cfg["output"]["data_dir"] for cfg in cfgs.values()))
+    data_dirs = [d or first["output"]["data_dir"] for d in data_dirs]
+
+    metrics = start_run("batch")
+    metrics.info.update({"mode": "batch", "config": args.configs})
+    profile_path = os.path.join(args.out_root or ".", "batch.prof") if args.profile is True else args.profile
+    with profiled(profile_path):
+        if args.fetch:
+            fetch_union(cfgs, data_dirs[0], first["output"].get("format", "csv"), args.base_url)
+        inputs = args.inputs or [p for d in data_dirs for p in discover_inputs(d)]
+        metrics.info["inputs"] = inputs
+        analyze_batch(inputs, cfgs)
+
+    metrics.log_stages()
+    for cfg in cfgs.values():
+        ensure_dirs(cfg["output"]["out_dir"])
+        metrics.write_manifest(os.path.join(cfg["output"]["out_dir"], "run_manifest.json"))
+    if args.prom:
+        metrics.write_prometheus(args.prom)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+import yaml
+from utils.storage import load_table
+from utils.text import BACKENDS, model_key, sentiment_scores, set_backend, set_cache, warm_up
+from analyze import sentiment_label
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+def agreement(backend: str, cfg: dict, out_dir: str = "out", limit: int = 0) -> dict:
+    """
+    Re-score the scored table's texts with backend and compare against its stored
+    sentiment (the reference, normally produced by the torch backend).
+    - The score cache is bypassed so every text really goes through the backend.
+    - Throughput excludes model loading (and the ONNX export on first use).
+    """
+    sent_cfg = cfg.get("sentiment", {})
+    set_backend(backend, sent_cfg.get("model_dir") or None)
+    set_cache(None)
+    df = load_table(out_dir, "scored", columns=["scan_text", "sentiment", "sentiment_label"],
+                    fmt=cfg.get("output", {}).get("format"))
+    if limit:
+        df = df.head(limit)
+    texts = df["scan_text"].fillna("").tolist()
+
+    warm_up()
+    start = time.perf_counter()
+    scores = np.array(sentiment_scores(texts, batch_size=sent_cfg.get("batch_size", 32),
+                                       num_threads=sent_cfg.get("num_threads") or None))
+    elapsed = time.perf_counter() - start
+    labels = pd.Series([sentiment_label(s) for s in scores], index=df.index)
+    diff = np.abs(scores - df["sentiment"].to_numpy(dtype=float))
+    return {
+        "backend": model_key(),
+        "rows": len(df),
+        "agreement": float((labels == df["sentiment_label"]).mean()) if len(df) else 1.0,
+        "mean_abs_diff": float(diff.mean()) if len(df) else 0.0,
+        "max_abs_diff": float(diff.max()) if len(df) else 0.0,
+        "rows_per_sec": len(df) / elapsed if elapsed > 0 else float("inf"),
+        "confusion": pd.crosstab(df["sentiment_label"].rename("reference"), labels.rename(backend)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a sentiment backend's labels against out/scored.*")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--out_dir", default="out")
+    parser.add_argument("--backend", choices=BACKENDS, default=None, help="default: sentiment.backend")
+    parser.add_argument("--limit", type=int, default=0, help="check only the first N rows")
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    backend = args.backend or cfg.get("sentiment", {}).get("backend", "torch")
+    res = agreement(backend, cfg, args.out_dir, args.limit)
+    logging.info(f"{res['backend']}: {res['agreement']:.2%} label agreement on {res['rows']} rows, "
+                 f"|Δscore| mean {res['mean_abs_diff']:.4f} max {res['max_abs_diff']:.4f}, "
+                 f"{res['rows_per_sec']:.1f} rows/s")
+    logging.info(f"Labels (reference × {backend}):\n{res['confusion']}")
+    if res["agreement"] < args.min_agreement:
+        raise SystemExit(f"Agreement {res['agreement']:.2%} is below {args.min_agreement:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,222 @@
 import os
+import math
+import time
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 import yaml
 import requests
-from utils.io import write_csv, ensure_dirs
+from requests.adapters import HTTPAdapter
+from utils.io import ensure_dirs
+from utils.storage import get_storage
+from utils.ratelimit import TokenBucket, QuotaMeter, QuotaExceeded, backoff_delay
+from utils.metrics import get_metrics, profiled, start_run
+from utils.snapshots import SnapshotStore, append_history, history_dir, snapshot_path
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
+CSE_URL = "https://www.googleapis.com/customsearch/v1"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_START = 91  # Google CSE cap ~100 results
+
+def make_session(pool_size: int = 8) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def fetch_page(session: requests.Session, params: Dict, limiter: Optional[TokenBucket] = None,
+               quota: Optional[QuotaMeter] = None, base_url: str = CSE_URL,
+               retries: int = 4) -> Dict:
+    """
+    Fetch one CSE page.
+    - Every attempt takes a limiter token and one quota unit.
+    - 429/5xx and connection errors are retried with jittered exponential
+      backoff (honouring Retry-After when present).
+    - Each attempt's latency goes to the api_request_seconds histogram.
+    - Any other error status, a retryable one after the last retry, or a
+      non-JSON body raises requests.RequestException (never read as "no items").
+    """
+    metrics = get_metrics()
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        if quota is not None:
+            quota.charge(1, "cse.list")
+        started = time.perf_counter()
+        try:
+            resp = session.get(base_url, params=params, timeout=30)
+        except requests.RequestException as e:
+            metrics.observe("api_request_seconds", time.perf_counter() - started, api="cse", status="error")
+            if attempt == retries:
+                raise
+            logging.warning(f"CSE request failed ({e}); retrying")
+            time.sleep(backoff_delay(attempt))
+            continue
+        metrics.observe("api_request_seconds", time.perf_counter() - started, api="cse",
+                        status=str(resp.status_code))
+        if resp.status_code in RETRY_STATUS and attempt < retries:
+            retry_after = resp.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else backoff_delay(attempt)
+            logging.warning(f"CSE returned {resp.status_code} for start={params.get('start')}; "
+                            f"retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        if not resp.ok:
+            logging.error(f"CSE returned {resp.status_code} for start={params.get('start')}: {resp.text[:200]}")
+            resp.raise_for_status()
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise requests.RequestException(f"CSE returned a non-JSON body for start={params.get('start')}") from e
+    # Not reached (the last attempt returns or raises); never read a failure as an empty page.
+    raise requests.RequestException(f"CSE gave up on start={params.get('start')} after {retries + 1} attempts")
+
+def _rows_from_items(items: List[Dict], query: str, first_rank: int) -> List[Dict]:
+    rows = []
+    for rank, item in enumerate(items, start=first_rank):
+        rows.append({
+            "platform": "google",
+            "query": query,
+            "rank": rank,
+            "url": item.get("link"),
+            "title": item.get("title"),
+            "snippet": item.get("snippet"),
+            "publisher": item.get("displayLink"),
+            "views": None,       # Not available from Google CSE
+            "likes": None,
+            "comments": None,
+            "published_at": None,
+            "raw_text": f"{item.get('title','')} {item.get('snippet','')}"
+        })
+    return rows
+
+def collect_google(api_key: str, engine_id: str, queries: List[str],
+                   locales: Optional[List[Dict]] = None, max_results: int = 100,
+                   max_workers: int = 4, qps: float = 1.0, daily_quota: Optional[int] = None,
+                   base_url: str = CSE_URL, session: Optional[requests.Session] = None) -> List[Dict]:
+    """
+    Fetch up to max_results CSE results for every query × locale variant.
+    - Phase 1 fetches every job's first page concurrently; totalResults then
+      bounds how many further pages (start=11, 21…) are worth requesting.
+    - Phase 2 fetches all remaining pages concurrently through one pooled session.
+    - A shared token bucket (qps) and quota meter (daily_quota) gate every call.
+    - Returns rows in a unified schema, ranked per query/locale.
+    """
+    jobs = [(q, loc) for q in queries for loc in (locales or [{}])]
+    per_job = collect_google_jobs(api_key, engine_id, jobs, max_results, max_workers, qps,
+                                  daily_quota, base_url, session)
+    return [row for rows in per_job for row in rows]
+
+def collect_google_jobs(api_key: str, engine_id: str, jobs: List[Tuple[str, Dict]],
+                        max_results: int = 100, max_workers: int = 4, qps: float = 1.0,
+                        daily_quota: Optional[int] = None, base_url: str = CSE_URL,
+                        session: Optional[requests.Session] = None, limiter: Optional[TokenBucket] = None,
+                        quota: Optional[QuotaMeter] = None) -> List[List[Dict]]:
+    """
+    collect_google for explicit (query, locale) jobs; one ranked row list per job.
+    A limiter and quota meter passed in are shared with the caller's other calls.
+    """
+    session = session or make_session(max_workers)
+    limiter = limiter or TokenBucket(qps, capacity=max(1.0, qps))
+    quota = quota or QuotaMeter(daily_quota)
+    pages: Dict[int, Dict[int, List[Dict]]] = {j: {} for j in range(len(jobs))}
+    wanted: Dict[int, List[int]] = {}
+
+    def params(j: int, start: int) -> Dict:
+        q, loc = jobs[j]
+        return {"key": api_key, "cx": engine_id, "q": q, "start": start, **loc}
+
+    def run(tasks, on_done):
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(fetch_page, session, params(j, s), limiter, quota, base_url): (j, s)
+                       for j, s in tasks}
+            for fut in as_completed(futures):
+                j, s = futures[fut]
+                try:
+                    resp = fut.result()
+                except QuotaExceeded as e:
+                    logging.error(f"{e}; skipping remaining pages")
+                    resp = {}
+                except requests.RequestException as e:
+                    logging.error(f"Giving up on '{jobs[j][0]}' start={s}: {e}")
+                    resp = {}
+                pages[j][s] = resp.get("items", [])
+                on_done(j, s, resp)
+
+    last_start = min(MAX_START, 1 + 10 * (math.ceil(max_results / 10) - 1))
+    done = [0]
+
+    def report(j: int) -> None:
+        done[0] += 1
+        q, loc = jobs[j]
+        n = sum(len(v) for v in pages[j].values())
+        suffix = f" {loc}" if loc else ""
+        logging.info(f"[{done[0]}/{len(jobs)}] '{q}'{suffix}: {n} results")
+
+    def first_done(j: int, s: int, resp: Dict) -> None:
+        total = resp.get("searchInformation", {}).get("totalResults")
+        total = int(total) if total is not None else max_results
+        if not pages[j][s] or total <= 10:
+            wanted[j] = []
+        else:
+            wanted[j] = list(range(11, min(last_start, 1 + 10 * (math.ceil(total / 10) - 1)) + 1, 10))
+        if not wanted[j]:
+            report(j)
+
+    remaining = {j: 0 for j in range(len(jobs))}
+
+    def page_done(j: int, s: int, resp: Dict) -> None:
+        remaining[j] -= 1
+        if remaining[j] == 0:
+            report(j)
+
+    logging.info(f"Fetching {len(jobs)} Google queries (≤{max_results} results each)")
+    run([(j, 1) for j in range(len(jobs))], first_done)
+    rest = [(j, s) for j in range(len(jobs)) for s in wanted.get(j, [])]
+    for j, s in rest:
+        remaining[j] += 1
+    run(rest, page_done)
+    logging.info(quota.report())
+    get_metrics().quota("google_cse", quota.used, quota.budget)
+
+    per_job = []
+    for j, (q, _) in enumerate(jobs):
+        items = []
+        for s in sorted(pages[j]):
+            if not pages[j][s]:
+                logging.warning(f"No more items returned at start={s} for '{q}'. Stopping pagination.")
+                break
+            items.extend(pages[j][s])
+        per_job.append(_rows_from_items(items[:max_results], q, 1))
+    return per_job
+
+def collect_google_delta(api_key: str, engine_id: str, queries: List[str], store: SnapshotStore,
+                         locales: Optional[List[Dict]] = None, ttl_hours: float = 24.0,
+                         **kwargs) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Delta collection against a SnapshotStore: only query × locale jobs whose
+    stored ranking is older than ttl_hours are searched, the rest reuse it.
+    Returns (current rows for every job, rows searched in this run).
+    """
+    jobs = [(q, loc) for q in queries for loc in (locales or [{}])]
+    stale = [j for j, (q, loc) in enumerate(jobs) if not store.is_fresh("google", q, loc, ttl_hours)]
+    logging.info(f"Delta: {len(stale)} of {len(jobs)} Google queries are stale (>{ttl_hours:g}h)")
+    fetched = dict(zip(stale, collect_google_jobs(api_key, engine_id, [jobs[j] for j in stale], **kwargs)))
+    current, searched = [], []
+    for j, (q, loc) in enumerate(jobs):
+        rows = fetched.get(j)
+        if rows:
+            store.save_ranking("google", q, loc, rows)
+            searched.extend(rows)
+        else:  # fresh, or the search came back empty (quota, errors): keep the last ranking
+            rows = store.ranking("google", q, loc)
+        current.extend(rows)
+    get_metrics().info["delta"] = {"searched": len(stale), "cached": len(jobs) - len(stale)}
+    return current, searched
+
 def fetch_google(api_key: str, engine_id: str, query: str, max_results: int = 100):
     """
     Fetch up to 100 Google Custom Search results for a query.
@@ -14,70 +224,74 @@ def fetch_google(api_key: str, engine_id: str, query: str, max_results: int = 10
     - Each API call returns up to 10 results.
     - Returns rows in a unified schema.
     """
-    rows = []
-    start, rank = 1, 1
-
-    while rank <= max_results and start <= 91:  # Google CSE cap ~100 results
-        url = (
-            "https://www.googleapis.com/customsearch/v1"
-            f"?key={api_key}&cx={engine_id}&q={query}&start={start}"
-        )
-        logging.info(f"Fetching Google results {start}–{start+9} for query '{query}'")
-        resp = requests.get(url).json()
-
-        items = resp.get("items", [])
-        if not items:
-            logging.warning(f"No more items returned at start={start}. Stopping pagination.")
-            break
-
-        for item in items:
-            rows.append({
-                "platform": "google",
-                "query": query,
-                "rank": rank,
-                "url": item.get("link"),
-                "title": item.get("title"),
-                "snippet": item.get("snippet"),
-                "publisher": item.get("displayLink"),
-                "views": None,       # Not available from Google CSE
-                "likes": None,
-                "comments": None,
-                "published_at": None,
-                "raw_text": f"{item.get('title','')} {item.get('snippet','')}"
-            })
-            rank += 1
-            if rank > max_results:
-                break
-
-        start += 10  # move to next page
-
-    return rows
+    return collect_google(api_key, engine_id, [query], max_results=max_results, max_workers=1)
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="config.yaml")
-    parser.add_argument("--out", default="data/google.csv")
+    parser.add_argument("--out", default=None, help="default: <data_dir>/google.csv|.parquet per output.format")
+    parser.add_argument("--base-url", default=CSE_URL, help="CSE endpoint (e.g. a local stub server)")
+    parser.add_argument("--delta", action="store_true",
+                        help="search only queries older than search_ttl_hours; append rank history")
+    parser.add_argument("--profile", nargs="?", const=True, default=None, metavar="PATH",
+                        help="run under cProfile; stats go to PATH (default <out_dir>/fetch_google.prof)")
+    parser.add_argument("--prom", default=None, metavar="PATH",
+                        help="also write run metrics in Prometheus text format to PATH")
     args = parser.parse_args()
 
     # Load config
     with open(args.config, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
 
-    api_key = os.getenv(cfg["platforms"]["google_cse"]["api_key_env"])
-    engine_id = os.getenv(cfg["platforms"]["google_cse"]["engine_id_env"])
+    cse_cfg = cfg["platforms"]["google_cse"]
+    api_key = os.getenv(cse_cfg["api_key_env"])
+    engine_id = os.getenv(cse_cfg["engine_id_env"])
     if not api_key or not engine_id:
         logging.error("Missing GOOGLE_CSE_API_KEY or GOOGLE_CSE_ENGINE_ID env vars.")
         return
 
-    ensure_dirs(os.path.dirname(args.out))
-    query = cfg["keywords"]["seeds"][0]  # default = "smart fan"
+    storage = get_storage(cfg["output"].get("format", "csv"))
+    out = args.out or os.path.join(cfg["output"]["data_dir"], "google" + storage.ext)
+    ensure_dirs(os.path.dirname(out))
+    queries = cfg["keywords"]["seeds"]
     max_results = min(cfg["default_top_n"], 100)  # Google CSE hard limit
-    logging.info(f"Fetching up to {max_results} Google results for query: '{query}'")
+    logging.info(f"Fetching up to {max_results} Google results for {len(queries)} queries")
 
-    rows = fetch_google(api_key, engine_id, query, max_results)
-    write_csv(rows, args.out)
-    logging.info(f"Saved {len(rows)} Google rows → {args.out}")
+    out_dir = cfg["output"].get("out_dir", "out")
+    metrics = start_run("fetch_google")
+    metrics.info.update({"config": args.config, "queries": queries, "out": out})
+    profile_path = os.path.join(out_dir, "fetch_google.prof") if args.profile is True else args.profile
+    fetch_kwargs = dict(max_results=max_results,
+                        max_workers=cse_cfg.get("max_workers", 4),
+                        qps=cse_cfg.get("qps", 1.0),
+                        daily_quota=cse_cfg.get("daily_quota"),
+                        base_url=args.base_url)
+    with profiled(profile_path):
+        with metrics.stage("fetch") as st:
+            if args.delta:
+                store = SnapshotStore(snapshot_path(cfg))
+                rows, searched = collect_google_delta(api_key, engine_id, queries, store,
+                                                      locales=cfg["keywords"].get("locales"),
+                                                      ttl_hours=cse_cfg.get("search_ttl_hours", 24),
+                                                      **fetch_kwargs)
+                store.close()
+            else:
+                rows = collect_google(api_key, engine_id, queries,
+                                      locales=cfg["keywords"].get("locales"), **fetch_kwargs)
+            st.rows_out = len(rows)
+        with metrics.stage("write", rows_in=len(rows)) as st:
+            storage.write_items(rows, out)
+            if args.delta:
+                path = append_history(searched, history_dir(cfg), "google", cfg["output"].get("format", "csv"))
+                if path:
+                    logging.info(f"Appended {len(searched)} ranked rows → {path}")
+            st.rows_out = len(rows)
+    logging.info(f"Saved {len(rows)} Google rows → {out}")
+    metrics.log_stages()
+    metrics.write_manifest(os.path.join(out_dir, "fetch_google_manifest.json"))
+    if args.prom:
+        metrics.write_prometheus(args.prom)
 
 
 if __name__ == "__main__":
@@ -1,97 +1,319 @@
 import os
+import time
 import argparse
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 import yaml
 from googleapiclient.discovery import build
-from utils.io import write_csv, ensure_dirs
+from googleapiclient.errors import HttpError
+from utils.io import ensure_dirs
+from utils.storage import get_storage
+from utils.ratelimit import QuotaMeter, QuotaExceeded
+from utils.metrics import get_metrics, profiled, start_run
+from utils.snapshots import SnapshotStore, append_history, history_dir, snapshot_path
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
-def fetch_youtube(api_key: str, query: str, max_results: int = 200):
+# YouTube Data API v3 quota costs (units per call)
+SEARCH_UNITS = 100
+VIDEOS_UNITS = 1
+VIDEOS_BATCH = 50  # max ids per videos().list
+
+_local = threading.local()
+
+def _execute(request):
     """
-    Fetch up to max_results YouTube videos for a query.
-    - Uses pagination (pageToken) to fetch beyond 50 results.
-    - Enriches rows with views, likes, comments, published date.
+    Execute with a per-thread httplib2.Http (the shared client's own http is not
+    thread-safe), recording the call's latency in api_request_seconds.
     """
-    youtube = build("youtube", "v3", developerKey=api_key)
+    if not hasattr(_local, "http"):
+        import httplib2
+        _local.http = httplib2.Http(timeout=60)
+    call = getattr(request, "methodId", "") or "request"
+    status = "200"
+    started = time.perf_counter()
+    try:
+        return request.execute(http=_local.http)
+    except HttpError as e:
+        status = str(e.resp.status)
+        raise
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        get_metrics().observe("api_request_seconds", time.perf_counter() - started,
+                              api="youtube", call=call, status=status)
 
-    rows = []
-    page_token = None
-    rank, fetched = 1, 0
+@lru_cache(maxsize=None)
+def get_client(api_key: str):
+    """One discovery client per API key for the whole process."""
+    return build("youtube", "v3", developerKey=api_key, cache_discovery=False)
+
+class _StatsBatcher:
+    """
+    Collects video ids from concurrent search pages and dispatches them as
+    full 50-id videos().list calls on a background pool, each id at most once.
+    """
 
-    while fetched < max_results:
-        batch_size = min(50, max_results - fetched)
-        search_request = youtube.search().list(
+    def __init__(self, youtube, pool: ThreadPoolExecutor, quota: QuotaMeter):
+        self.youtube, self.pool, self.quota = youtube, pool, quota
+        self._lock = threading.Lock()
+        self._seen = set()
+        self._pending: List[str] = []
+        self._futures = []
+
+    def add(self, video_ids: List[str]) -> None:
+        with self._lock:
+            for vid in video_ids:
+                if vid not in self._seen:
+                    self._seen.add(vid)
+                    self._pending.append(vid)
+            while len(self._pending) >= VIDEOS_BATCH:
+                self._submit(self._pending[:VIDEOS_BATCH])
+                del self._pending[:VIDEOS_BATCH]
+
+    def _submit(self, ids: List[str]) -> None:
+        self._futures.append(self.pool.submit(self._fetch, ids))
+
+    def _fetch(self, ids: List[str]) -> Dict[str, Dict]:
+        try:
+            self.quota.charge(VIDEOS_UNITS, "videos.list")
+        except QuotaExceeded as e:
+            logging.error(f"{e}; {len(ids)} videos left without statistics")
+            return {}
+        resp = _execute(self.youtube.videos().list(part="statistics", id=",".join(ids),
+                                                   maxResults=len(ids)))
+        return {item["id"]: item.get("statistics", {}) for item in resp.get("items", [])}
+
+    def results(self) -> Dict[str, Dict]:
+        with self._lock:
+            if self._pending:
+                self._submit(self._pending)
+                self._pending = []
+        stats: Dict[str, Dict] = {}
+        for fut in self._futures:
+            stats.update(fut.result())
+        return stats
+
+def _search_query(youtube, query: str, max_results: int, quota: QuotaMeter,
+                  batcher: _StatsBatcher) -> List[Dict]:
+    """Walk one query's search pages; ids are handed off for stats as soon as a page lands."""
+    items: List[Dict] = []
+    page_token = None
+    while len(items) < max_results:
+        try:
+            quota.charge(SEARCH_UNITS, "search.list")
+        except QuotaExceeded as e:
+            logging.error(f"{e}; stopping search for '{query}' at {len(items)} results")
+            break
+        search_response = _execute(youtube.search().list(
             q=query,
             part="id,snippet",
-            maxResults=batch_size,
+            maxResults=min(50, max_results - len(items)),
             type="video",
             pageToken=page_token
-        )
-        search_response = search_request.execute()
-
-        video_ids = [item["id"]["videoId"] for item in search_response.get("items", [])]
+        ))
+        page = search_response.get("items", [])
+        video_ids = [item["id"]["videoId"] for item in page]
         if not video_ids:
             break
-
-        # Fetch statistics for the batch
-        video_request = youtube.videos().list(
-            part="snippet,statistics",
-            id=",".join(video_ids)
-        )
-        video_response = video_request.execute()
-        video_map = {item["id"]: item for item in video_response.get("items", [])}
-
-        for item in search_response.get("items", []):
-            vid = item["id"]["videoId"]
-            snippet = item["snippet"]
-            stats = video_map.get(vid, {}).get("statistics", {})
-
-            rows.append({
-                "platform": "youtube",
-                "query": query,
-                "rank": rank,
-                "url": f"https://www.youtube.com/watch?v={vid}",
-                "title": snippet.get("title"),
-                "snippet": snippet.get("description"),
-                "publisher": snippet.get("channelTitle"),
-                "views": int(stats.get("viewCount", 0)) if "viewCount" in stats else None,
-                "likes": int(stats.get("likeCount", 0)) if "likeCount" in stats else None,
-                "comments": int(stats.get("commentCount", 0)) if "commentCount" in stats else None,
-                "published_at": snippet.get("publishedAt"),
-                "raw_text": f"{snippet.get('title','')} {snippet.get('description','')}"
-            })
-            rank += 1
-            fetched += 1
+        batcher.add(video_ids)
+        items.extend(page)
 
         page_token = search_response.get("nextPageToken")
         if not page_token:
             break
+    logging.info(f"'{query}': {len(items)} search results")
+    return items
+
+def _stat_fields(stats: Dict) -> Dict:
+    return {
+        "views": int(stats.get("viewCount", 0)) if "viewCount" in stats else None,
+        "likes": int(stats.get("likeCount", 0)) if "likeCount" in stats else None,
+        "comments": int(stats.get("commentCount", 0)) if "commentCount" in stats else None,
+    }
 
+def _video_id(url: str) -> str:
+    return url.rsplit("v=", 1)[-1]
+
+def _to_row(item: Dict, stats: Dict, query: str, rank: int) -> Dict:
+    vid = item["id"]["videoId"]
+    snippet = item["snippet"]
+    return {
+        "platform": "youtube",
+        "query": query,
+        "rank": rank,
+        "url": f"https://www.youtube.com/watch?v={vid}",
+        "title": snippet.get("title"),
+        "snippet": snippet.get("description"),
+        "publisher": snippet.get("channelTitle"),
+        **_stat_fields(stats),
+        "published_at": snippet.get("publishedAt"),
+        "raw_text": f"{snippet.get('title','')} {snippet.get('description','')}"
+    }
+
+def collect_youtube(youtube, queries: List[str], max_results: int = 200,
+                    quota_budget: Optional[int] = None, max_workers: int = 4,
+                    quota: Optional[QuotaMeter] = None) -> List[Dict]:
+    """
+    Pipelined multi-query fetch.
+    - Search pages of different queries run concurrently; within a query the
+      next page is requested while earlier pages' statistics are in flight.
+    - Video ids are merged across queries into full 50-id videos().list
+      batches, so every video's statistics are fetched once.
+    - Quota units (search=100, videos=1) are metered against quota_budget.
+    """
+    quota = quota or QuotaMeter(quota_budget)
+    results, stats = _search_and_stats(youtube, queries, max_results, quota, max_workers)
+    logging.info(quota.report())
+    get_metrics().quota("youtube", quota.used, quota.budget)
+
+    rows = []
+    for query, items in zip(queries, results):
+        rows.extend(_ranked_rows(items, stats, query))
     return rows
 
+def _search_and_stats(youtube, queries: List[str], max_results: int, quota: QuotaMeter,
+                      max_workers: int, refresh_ids: Iterable[str] = ()):
+    """Search results per query, plus statistics for their videos and refresh_ids (one batcher)."""
+    with ThreadPoolExecutor(max_workers=max_workers) as search_pool, \
+         ThreadPoolExecutor(max_workers=max_workers) as stats_pool:
+        batcher = _StatsBatcher(youtube, stats_pool, quota)
+        batcher.add(list(refresh_ids))
+        futures = [search_pool.submit(_search_query, youtube, q, max_results, quota, batcher)
+                   for q in queries]
+        results = [f.result() for f in futures]
+        stats = batcher.results()
+    return results, stats
+
+def _ranked_rows(items: List[Dict], stats: Dict[str, Dict], query: str) -> List[Dict]:
+    return [_to_row(item, stats.get(item["id"]["videoId"], {}), query, rank)
+            for rank, item in enumerate(items, start=1)]
+
+def collect_youtube_delta(youtube, queries: List[str], store: SnapshotStore, max_results: int = 200,
+                          ttl_hours: float = 24.0, track_days: float = 30.0,
+                          quota_budget: Optional[int] = None,
+                          max_workers: int = 4) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    Delta collection against a SnapshotStore.
+    - A query is searched (100 units a page) only when its stored ranking is
+      older than ttl_hours; otherwise that ranking is reused.
+    - Statistics of every tracked video (in a ranking within track_days,
+      including reused rankings) are refreshed in 50-id videos().list calls,
+      1 unit per 50 videos, so view growth is followed daily at little cost.
+    - Returns (current rows: every query's ranking with fresh statistics,
+      rows of searched queries, refreshed rows of the other tracked videos;
+      those no longer ranked anywhere have rank None).
+    """
+    quota = QuotaMeter(quota_budget)
+    stale = [q for q in queries if not store.is_fresh("youtube", q, None, ttl_hours)]
+    cached = {q: store.ranking("youtube", q) for q in queries if q not in stale}
+    tracked = store.tracked_videos(track_days)
+    for rows in cached.values():
+        tracked.update((_video_id(r["url"]), r) for r in rows)
+    logging.info(f"Delta: {len(stale)} of {len(queries)} YouTube queries are stale (>{ttl_hours:g}h), "
+                 f"refreshing statistics of {len(tracked)} tracked videos")
+    results, stats = _search_and_stats(youtube, stale, max_results, quota, max_workers, tracked)
+    logging.info(quota.report())
+    get_metrics().quota("youtube", quota.used, quota.budget)
+
+    searched_rows = dict(zip(stale, (_ranked_rows(items, stats, q) for q, items in zip(stale, results))))
+    current, searched, refreshed = [], [], []
+    for q in queries:
+        rows = searched_rows.get(q)
+        if rows:
+            store.save_ranking("youtube", q, None, rows)
+            searched.extend(rows)
+        else:  # fresh, or the search came back empty (quota, errors): keep the last ranking
+            rows = [{**r, **_stat_fields(stats[_video_id(r["url"])])} if _video_id(r["url"]) in stats else r
+                    for r in store.ranking("youtube", q)]
+            refreshed.extend(r for r in rows if _video_id(r["url"]) in stats)
+        current.extend(rows)
+    ranked = {_video_id(r["url"]) for r in current}
+    refreshed.extend({**r, "rank": None, **_stat_fields(stats[vid])}
+                     for vid, r in tracked.items() if vid not in ranked and vid in stats)
+
+    latest = {_video_id(r["url"]): r for r in refreshed}
+    latest.update((_video_id(r["url"]), r) for r in current)
+    store.save_videos(latest, ranked=ranked, refreshed=stats)
+    get_metrics().info["delta"] = {"searched": len(stale), "cached": len(queries) - len(stale),
+                                   "tracked": len(tracked), "refreshed": len(stats)}
+    return current, searched, refreshed
+
+def fetch_youtube(api_key: str, query: str, max_results: int = 200):
+    """
+    Fetch up to max_results YouTube videos for a query.
+    - Uses pagination (pageToken) to fetch beyond 50 results.
+    - Enriches rows with views, likes, comments, published date.
+    """
+    return collect_youtube(get_client(api_key), [query], max_results)
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="config.yaml")
-    parser.add_argument("--out", default="data/youtube.csv")
+    parser.add_argument("--out", default=None, help="default: <data_dir>/youtube.csv|.parquet per output.format")
+    parser.add_argument("--delta", action="store_true",
+                        help="search only queries older than search_ttl_hours, refresh tracked videos' "
+                             "statistics, append rank/stats history")
+    parser.add_argument("--profile", nargs="?", const=True, default=None, metavar="PATH",
+                        help="run under cProfile; stats go to PATH (default <out_dir>/fetch_youtube.prof)")
+    parser.add_argument("--prom", default=None, metavar="PATH",
+                        help="also write run metrics in Prometheus text format to PATH")
     args = parser.parse_args()
 
     with open(args.config, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
 
-    api_key = os.getenv(cfg["platforms"]["youtube"]["api_key_env"])
+    yt_cfg = cfg["platforms"]["youtube"]
+    api_key = os.getenv(yt_cfg["api_key_env"])
     if not api_key:
         logging.error("Missing YOUTUBE_API_KEY env var.")
         return
 
-    ensure_dirs(os.path.dirname(args.out))
-    query = cfg["keywords"]["seeds"][0]
+    storage = get_storage(cfg["output"].get("format", "csv"))
+    out = args.out or os.path.join(cfg["output"]["data_dir"], "youtube" + storage.ext)
+    ensure_dirs(os.path.dirname(out))
+    queries = cfg["keywords"]["seeds"]
     max_results = min(cfg["default_top_n"], 200)  # cap at 200
-    logging.info(f"Fetching up to {max_results} YouTube results for query: '{query}'")
-    rows = fetch_youtube(api_key, query, max_results)
-    write_csv(rows, args.out)
-    logging.info(f"Saved {len(rows)} YouTube rows → {args.out}")
+    logging.info(f"Fetching up to {max_results} YouTube results for {len(queries)} queries")
+    out_dir = cfg["output"].get("out_dir", "out")
+    metrics = start_run("fetch_youtube")
+    metrics.info.update({"config": args.config, "queries": queries, "out": out})
+    profile_path = os.path.join(out_dir, "fetch_youtube.prof") if args.profile is True else args.profile
+    with profiled(profile_path):
+        with metrics.stage("fetch") as st:
+            if args.delta:
+                store = SnapshotStore(snapshot_path(cfg))
+                rows, searched, refreshed = collect_youtube_delta(
+                    get_client(api_key), queries, store, max_results,
+                    ttl_hours=yt_cfg.get("search_ttl_hours", 24),
+                    track_days=yt_cfg.get("track_days", 30),
+                    quota_budget=yt_cfg.get("daily_quota"),
+                    max_workers=yt_cfg.get("max_workers", 4))
+                store.close()
+            else:
+                rows = collect_youtube(get_client(api_key), queries, max_results,
+                                       quota_budget=yt_cfg.get("daily_quota"),
+                                       max_workers=yt_cfg.get("max_workers", 4))
+            st.rows_out = len(rows)
+        with metrics.stage("write", rows_in=len(rows)) as st:
+            storage.write_items(rows, out)
+            if args.delta:
+                for part, source in ((searched, "search"), (refreshed, "refresh")):
+                    path = append_history(part, history_dir(cfg), "youtube",
+                                          cfg["output"].get("format", "csv"), source)
+                    if path:
+                        logging.info(f"Appended {len(part)} {source} rows → {path}")
+            st.rows_out = len(rows)
+    logging.info(f"Saved {len(rows)} YouTube rows → {out}")
+    metrics.log_stages()
+    metrics.write_manifest(os.path.join(out_dir, "fetch_youtube_manifest.json"))
+    if args.prom:
+        metrics.write_prometheus(args.prom)
 
 
 if __name__ == "__main__":
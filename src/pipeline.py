@@ -0,0 +1,328 @@
+import os
+import time
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+import yaml
+
+from utils.lazy import lazy_import
+from utils.io import UNIFIED_COLUMNS, ensure_dirs
+from utils.storage import discover_inputs, get_storage, read_items
+from utils.brands import BrandMatcher, compile_brand_matcher
+from utils.text import sentiment_scores, set_cache
+from utils.ratelimit import QuotaMeter, TokenBucket
+from utils.metrics import get_metrics, profiled, start_run
+from utils.checkpoint import PipelineCheckpoint, text_hashes
+from analyze import (aggregate_mentions, compact_scored, derive_columns, mention_matrix, near_dedupe,
+                     open_sentiment, prepare_frame, rebuild_rollup, scan_text, state_signature, url_keys,
+                     write_outputs)
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+Job = Tuple[str, Dict]                    # (query, locale)
+Fetch = Callable[[str, Dict], List[Dict]]  # one job's ranked rows
+DONE = None                               # end of stream on a queue
+
+# ----------------- Sources -----------------
+def youtube_source(cfg: dict) -> Optional[Tuple[List[Job], Fetch]]:
+    """One job per seed; jobs share the client and the daily quota meter."""
+    yt_cfg = cfg["platforms"]["youtube"]
+    api_key = os.getenv(yt_cfg["api_key_env"])
+    if not api_key:
+        logging.error("Missing YOUTUBE_API_KEY env var; skipping YouTube.")
+        return None
+    from fetch_youtube import collect_youtube, get_client
+    client, quota = get_client(api_key), QuotaMeter(yt_cfg.get("daily_quota"))
+    max_results = min(cfg["default_top_n"], 200)
+
+    def fetch(query: str, locale: Dict) -> List[Dict]:
+        return collect_youtube(client, [query], max_results, max_workers=yt_cfg.get("max_workers", 4), quota=quota)
+    return [(q, {}) for q in cfg["keywords"]["seeds"]], fetch
+
+def google_source(cfg: dict, base_url: Optional[str] = None) -> Optional[Tuple[List[Job], Fetch]]:
+    """One job per seed × locale; jobs share the session, the qps token bucket and the quota meter."""
+    cse_cfg = cfg["platforms"]["google_cse"]
+    api_key, engine_id = os.getenv(cse_cfg["api_key_env"]), os.getenv(cse_cfg["engine_id_env"])
+    if not api_key or not engine_id:
+        logging.error("Missing GOOGLE_CSE_API_KEY or GOOGLE_CSE_ENGINE_ID env vars; skipping Google.")
+        return None
+    from fetch_google import CSE_URL, collect_google_jobs, make_session
+    workers, qps = cse_cfg.get("max_workers", 4), cse_cfg.get("qps", 1.0)
+    session, limiter = make_session(workers), TokenBucket(qps, capacity=max(1.0, qps))
+    quota = QuotaMeter(cse_cfg.get("daily_quota"))
+    max_results = min(cfg["default_top_n"], 100)
+
+    def fetch(query: str, locale: Dict) -> List[Dict]:
+        return collect_google_jobs(api_key, engine_id, [(query, locale)], max_results, workers, qps,
+                                   base_url=base_url or CSE_URL, session=session,
+                                   limiter=limiter, quota=quota)[0]
+    jobs = [(q, loc) for q in cfg["keywords"]["seeds"] for loc in (cfg["keywords"].get("locales") or [{}])]
+    return jobs, fetch
+
+# ----------------- Stages -----------------
+async def _run_all(coros) -> None:
+    """Run coroutines as tasks; the first failure cancels the rest (nothing stays blocked on a queue)."""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    for t in pending:
+        t.cancel()
+    for t in done:
+        t.result()
+
+class Pipeline:
+    """
+    Fetch → mentions → sentiment over bounded asyncio queues.
+    - Each platform job runs its collector call in a thread (at most
+      pipeline.fetch_jobs per platform at once); its rows are checkpointed and
+      put on the rows queue. A full queue pauses the fetchers (backpressure).
+    - The matcher skips texts already matched (earlier in the run or in a
+      checkpoint), counts brand mentions of the rest in a thread and hands them
+      on in batches of pipeline.score_batch.
+    - The scorer runs sentiment on the model thread and checkpoints each batch,
+      so an interrupted run resumes with only the unfinished work.
+    """
+
+    def __init__(self, cfg: dict, sources: Dict[str, Tuple[List[Job], Fetch]], matcher: BrandMatcher,
+                 checkpoint: PipelineCheckpoint, model: ThreadPoolExecutor):
+        p = cfg.get("pipeline", {})
+        self.cfg, self.sources, self.matcher, self.checkpoint, self.model = cfg, sources, matcher, checkpoint, model
+        self.queue_size, self.score_queue_size = p.get("queue_size", 8), p.get("score_queue_size", 4)
+        self.score_batch, self.fetch_jobs = p.get("score_batch", 512), p.get("fetch_jobs", 2)
+        self.seen = set(checkpoint.known_hashes().tolist())
+        self.resumed, self.failed = 0, []
+
+    async def run(self) -> None:
+        self.rows_q = asyncio.Queue(self.queue_size)
+        self.texts_q = asyncio.Queue(self.score_queue_size)
+        await _run_all([self.produce(), self.match(), self.score()])
+
+    async def put(self, queue: asyncio.Queue, item, name: str) -> None:
+        started = time.perf_counter()
+        await queue.put(item)
+        get_metrics().observe("queue_wait_seconds", time.perf_counter() - started, queue=name)
+
+    async def produce(self) -> None:
+        await asyncio.gather(*(self.fetch_platform(platform, jobs, fetch)
+                               for platform, (jobs, fetch) in self.sources.items()))
+        await self.rows_q.put(DONE)
+
+    async def fetch_platform(self, platform: str, jobs: List[Job], fetch: Fetch) -> None:
+        slots, metrics = asyncio.Semaphore(self.fetch_jobs), get_metrics()
+
+        async def one(query: str, locale: Dict) -> None:
+            rows = self.checkpoint.job_rows(platform, query, locale)
+            if rows is not None:
+                self.resumed += 1
+                await self.put(self.rows_q, rows, "rows")
+                return
+            async with slots:
+                with metrics.stage(f"fetch_{platform}") as st:
+                    try:
+                        rows = await asyncio.to_thread(fetch, query, locale)
+                    except Exception as e:  # one failed job must not stop the others
+                        logging.error(f"{platform} '{query}' {locale or ''}: {e}; rerun to retry this job")
+                        self.failed.append((platform, query, locale))
+                        return
+                    st.rows_out = len(rows)
+                self.checkpoint.save_job(platform, query, locale, rows)
+                # Queue while still holding the slot: a full queue stops further fetches.
+                await self.put(self.rows_q, rows, "rows")
+        await asyncio.gather(*(one(q, loc) for q, loc in jobs))
+
+    async def match(self) -> None:
+        metrics, parts, buffered = get_metrics(), [], 0
+        while (rows := await self.rows_q.get()) is not DONE:
+            texts = scan_text(pd.DataFrame(rows, columns=UNIFIED_COLUMNS))
+            hashes = text_hashes(texts)
+            new = ~pd.Series(hashes).duplicated().to_numpy()
+            new &= np.array([h not in self.seen for h in hashes.tolist()], dtype=bool)
+            if not new.any():
+                continue
+            self.seen.update(hashes[new].tolist())
+            with metrics.stage("mentions", rows_in=int(new.sum())) as st:
+                M = await asyncio.to_thread(mention_matrix, texts[new], self.matcher)
+                st.rows_out = len(M)
+            parts.append((hashes[new], texts[new], M))
+            buffered += len(M)
+            if buffered >= self.score_batch:
+                await self.put(self.texts_q, parts, "texts")
+                parts, buffered = [], 0
+        if parts:
+            await self.put(self.texts_q, parts, "texts")
+        await self.texts_q.put(DONE)
+
+    async def score(self) -> None:
+        loop, metrics = asyncio.get_running_loop(), get_metrics()
+        sent_cfg = self.cfg.get("sentiment", {})
+        while (parts := await self.texts_q.get()) is not DONE:
+            hashes = np.concatenate([h for h, _, _ in parts])
+            texts = pd.concat([t for _, t, _ in parts], ignore_index=True)
+            M = np.concatenate([m for _, _, m in parts])
+            scores = None
+            if sent_cfg.get("enabled", True):
+                with metrics.stage("sentiment", rows_in=len(texts)) as st:
+                    scores = await loop.run_in_executor(self.model, partial(
+                        sentiment_scores, texts, batch_size=sent_cfg.get("batch_size", 32),
+                        num_threads=sent_cfg.get("num_threads") or None,
+                        daemon=sent_cfg.get("daemon_socket") or None))
+                    st.rows_out = len(scores)
+            self.checkpoint.save_texts(hashes, M, scores)
+
+# ----------------- Analysis -----------------
+def write_collected(cfg: dict, sources: Dict[str, tuple], checkpoint: PipelineCheckpoint) -> None:
+    """Write each platform's fetched rows to data_dir in job order, as fetch_<platform>.py would."""
+    storage = get_storage(cfg["output"].get("format", "csv"))
+    ensure_dirs(cfg["output"]["data_dir"])
+    with get_metrics().stage("write_inputs") as st:
+        total = 0
+        for platform, (jobs, _) in sources.items():
+            rows = [row for q, loc in jobs for row in (checkpoint.job_rows(platform, q, loc) or [])]
+            path = os.path.join(cfg["output"]["data_dir"], platform + storage.ext)
+            storage.write_items(rows, path)
+            total += len(rows)
+            logging.info(f"Saved {len(rows)} {platform} rows → {path}")
+        st.rows_out = total
+    storage.close()
+
+def analyze_collected(cfg: dict, out_dir: str, matcher: BrandMatcher, checkpoint: PipelineCheckpoint,
+                      model: ThreadPoolExecutor) -> None:
+    """
+    analyze() over the inputs in data_dir, with mentions and sentiment looked
+    up from the checkpoint; texts the stream did not see (e.g. inputs of a
+    platform skipped this run) are scored here.
+    """
+    metrics = get_metrics()
+    inputs = discover_inputs(cfg["output"]["data_dir"])
+    metrics.info["inputs"] = inputs
+    with metrics.stage("read") as st:
+        df = read_items(inputs, columns=UNIFIED_COLUMNS)
+        st.rows_out = len(df)
+    with metrics.stage("dedupe", rows_in=len(df)) as st:
+        df = df[~url_keys(df, cfg).duplicated().to_numpy()].reset_index(drop=True)
+        st.rows_out = len(df)
+    if df.empty:
+        logging.error("No data rows found. Check the collector settings.")
+        return
+    df, clusters = near_dedupe(prepare_frame(df), cfg)
+
+    hashes = text_hashes(df["scan_text"])
+    found, M, sentiment = checkpoint.lookup(hashes)
+    if not found.all():
+        codes, uniq = pd.factorize(pd.Series(hashes[~found]))
+        texts = df["scan_text"][~found].iloc[np.unique(codes, return_index=True)[1]].reset_index(drop=True)
+        logging.info(f"Scoring {len(texts)} texts not seen by the stream")
+        with metrics.stage("mentions", rows_in=len(texts)) as st:
+            M_new = mention_matrix(texts, matcher)
+            st.rows_out = len(M_new)
+        scores = None
+        sent_cfg = cfg.get("sentiment", {})
+        if sent_cfg.get("enabled", True):
+            with metrics.stage("sentiment", rows_in=len(texts)) as st:
+                scores = model.submit(sentiment_scores, texts, batch_size=sent_cfg.get("batch_size", 32),
+                                      num_threads=sent_cfg.get("num_threads") or None,
+                                      daemon=sent_cfg.get("daemon_socket") or None).result()
+                st.rows_out = len(scores)
+        checkpoint.save_texts(np.asarray(uniq), M_new, scores)
+        found, M, sentiment = checkpoint.lookup(hashes)
+    if clusters is not None:
+        sentiment = sentiment[clusters]  # near-duplicates take their cluster head's sentiment
+
+    brands = matcher.brands
+    df = compact_scored(derive_columns(df, M, sentiment, brands), M)
+    with metrics.stage("aggregate"):  # rows are counted by write_outputs' aggregate
+        acc = aggregate_mentions(M, df["wsov_item"], df["sentiment_label"])
+    rebuild_rollup(df, M, brands, cfg, out_dir)
+    write_outputs(df, M, acc, brands, cfg, out_dir)
+
+def _close_cache(cache) -> None:
+    if cache is not None:
+        logging.info(cache.stats())
+        get_metrics().info["sentiment_cache"] = {"hits": cache.hits, "misses": cache.misses}
+        set_cache(None)
+        cache.close()
+
+def run_pipeline(cfg: dict, out_dir: str, sources: Dict[str, Tuple[List[Job], Fetch]],
+                 fresh: bool = False) -> bool:
+    """
+    Collect, score and analyze in one overlapped run. `sources` maps a
+    platform to (jobs, fetch), fetch(query, locale) returning that job's rows;
+    youtube_source/google_source build them from the config, tests can pass
+    stubs. Inputs and outputs are written only once every job was fetched
+    (the checkpoint's jobs are then cleared) and True is returned; otherwise
+    they are left as they were and a rerun resumes with the missing jobs.
+    """
+    matcher = compile_brand_matcher(cfg["brands"]["primary"], cfg["brands"]["competitors"],
+                                    longest_only=cfg["brands"].get("longest_match_only", False))
+    sentiment = cfg.get("sentiment", {}).get("enabled", True)
+    metrics = get_metrics()
+    # The model and its score cache (SQLite, bound to its thread) live on one thread.
+    model = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment")
+    cache = model.submit(open_sentiment, cfg).result()
+    path = cfg.get("pipeline", {}).get("checkpoint_path") or os.path.join(out_dir, ".pipeline.sqlite")
+    checkpoint = PipelineCheckpoint(path, state_signature(matcher, sentiment))
+    if fresh:
+        checkpoint.clear_jobs()
+    try:
+        pipe = Pipeline(cfg, sources, matcher, checkpoint, model)
+        logging.info(f"Streaming {sum(len(j) for j, _ in sources.values())} jobs "
+                     f"({len(pipe.seen)} texts already scored in {path})")
+        asyncio.run(pipe.run())
+        metrics.info["jobs"] = {"total": sum(len(j) for j, _ in sources.values()), "resumed": pipe.resumed,
+                                "failed": [list(f) for f in pipe.failed]}
+        if pipe.failed:  # a partial run must not replace the last complete inputs and outputs
+            logging.error(f"{len(pipe.failed)} jobs failed; data_dir and {out_dir} are left untouched. "
+                          f"Rerun to fetch them (finished jobs are kept in {path})")
+            return False
+        write_collected(cfg, sources, checkpoint)
+        analyze_collected(cfg, out_dir, matcher, checkpoint, model)
+        checkpoint.clear_jobs()
+        return True
+    finally:
+        model.submit(_close_cache, cache).result()
+        model.shutdown()
+        checkpoint.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch, score and analyze in one streamed, resumable run")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--out_dir", default="out")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore fetched jobs of an interrupted run (scored texts are still reused)")
+    parser.add_argument("--base-url", default=None, help="CSE endpoint (e.g. a local stub server)")
+    parser.add_argument("--skip-sentiment", action="store_true",
+                        help="count mentions only; items are treated as neutral and no model is loaded")
+    parser.add_argument("--profile", nargs="?", const=True, default=None, metavar="PATH",
+                        help="run under cProfile; stats go to PATH (default <out_dir>/pipeline.prof)")
+    parser.add_argument("--prom", default=None, metavar="PATH",
+                        help="also write run metrics in Prometheus text format to PATH")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    if args.skip_sentiment:
+        cfg["sentiment"] = {**cfg.get("sentiment", {}), "enabled": False}
+
+    metrics = start_run("pipeline")
+    metrics.info.update({"mode": "pipeline", "config": args.config, "out_dir": args.out_dir,
+                         "sentiment": {"enabled": cfg.get("sentiment", {}).get("enabled", True),
+                                       "backend": cfg.get("sentiment", {}).get("backend", "torch")}})
+    sources = {platform: src for platform, src in (("google", google_source(cfg, args.base_url)),
+                                                   ("youtube", youtube_source(cfg))) if src is not None}
+    profile_path = os.path.join(args.out_dir, "pipeline.prof") if args.profile is True else args.profile
+    with profiled(profile_path):
+        run_pipeline(cfg, args.out_dir, sources, fresh=args.fresh)
+
+    metrics.log_stages()
+    ensure_dirs(args.out_dir)
+    metrics.write_manifest(os.path.join(args.out_dir, "run_manifest.json"))
+    if args.prom:
+        metrics.write_prometheus(args.prom)
+
+if __name__ == "__main__":
+    main()
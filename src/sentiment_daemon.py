@@ -0,0 +1,90 @@
+import os
+import signal
+import argparse
+import logging
+import threading
+from multiprocessing.connection import Client, Listener
+import yaml
+from utils.text import infer_batch, model_key, set_backend, warm_up
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+DEFAULT_SOCKET = "out/.sentiment.sock"
+
+def _in_use(address: str) -> bool:
+    try:
+        Client(address, family="AF_UNIX").close()
+        return True
+    except OSError:
+        return False
+
+def _handle(conn, lock: threading.Lock, num_threads) -> None:
+    """Serve one client connection: ("score", model, texts, batch_size) → ("ok", scores)."""
+    with conn:
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                return
+            kind, model, texts, batch_size = msg
+            if kind != "score":
+                conn.send(("error", f"unknown request '{kind}'"))
+            elif model != model_key():
+                conn.send(("error", f"daemon serves {model_key()}, not {model}"))
+            else:
+                try:
+                    with lock:  # one inference at a time; torch threads within it
+                        scores = infer_batch(texts, batch_size, num_threads)
+                    conn.send(("ok", scores))
+                except Exception as e:
+                    logging.exception("Scoring failed")
+                    conn.send(("error", repr(e)))
+
+def serve(address: str, num_threads=None) -> None:
+    """
+    Keep the sentiment model resident and score texts for analyze.py runs.
+    - Listens on a Unix socket created owner-only (0600): requests are
+      pickled, so only the same user's processes may connect.
+    - Each connection gets a thread; inference itself is serialized.
+    """
+    if os.path.exists(address):
+        if _in_use(address):
+            raise SystemExit(f"A sentiment daemon is already listening on {address}")
+        os.unlink(address)  # stale socket from a killed daemon
+    logging.info(f"Loading {model_key()}…")
+    warm_up()
+    lock = threading.Lock()
+    old_umask = os.umask(0o077)
+    try:
+        listener = Listener(address, family="AF_UNIX")
+    finally:
+        os.umask(old_umask)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # stop like Ctrl-C
+    logging.info(f"Sentiment daemon ready on {address}")
+    with listener:  # closing the listener removes the socket file
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=_handle, args=(conn, lock, num_threads), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+    logging.info("Sentiment daemon stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--socket", default=None, help=f"default: sentiment.daemon_socket or {DEFAULT_SOCKET}")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    sent_cfg = cfg.get("sentiment", {})
+    set_backend(sent_cfg.get("backend", "torch"), sent_cfg.get("model_dir") or None)
+    address = args.socket or sent_cfg.get("daemon_socket") or DEFAULT_SOCKET
+    os.makedirs(os.path.dirname(address) or ".", exist_ok=True)
+    serve(address, num_threads=sent_cfg.get("num_threads") or None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import json
+import argparse
+import logging
+import pandas as pd
+import yaml
+from utils.rollup import RollupStore, period_over_period, window_table
+from analyze import rollup_path
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-windowed SoV from the rollup store")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--out_dir", default="out")
+    parser.add_argument("--windows", default="7,30,90", help="comma-separated window lengths in days")
+    parser.add_argument("--as-of", default=None, help="window end date (default: latest publish date)")
+    parser.add_argument("--platform", action="append", default=None, help="repeat to combine platforms")
+    parser.add_argument("--compare", type=int, default=7, metavar="DAYS",
+                        help="period-over-period window (7 = week over week, 0 to skip)")
+    parser.add_argument("--series", default=None, metavar="FREQ",
+                        help="also print per-period shares (D, W or M)")
+    parser.add_argument("--json", default=None, metavar="PATH", help="write the report as JSON")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    path = rollup_path(cfg, args.out_dir)
+    if not os.path.exists(path):
+        raise SystemExit(f"No rollup store at {path}. Run `python src/analyze.py` first.")
+    store = RollupStore(path)
+    windows = [int(w) for w in args.windows.split(",") if w.strip()]
+    lo, hi = store.date_range()
+    logging.info(f"Rollup {path}: publish dates {lo} … {hi}")
+
+    pd.set_option("display.width", 200)
+    table, items = window_table(store, windows, args.as_of, args.platform)
+    for name, (n, start, end) in items.items():
+        logging.info(f"{name:>5}: {n} items" + (f" ({start} … {end})" if start else " (incl. undated)"))
+    print(table.map(lambda v: f"{v:.1%}").to_string())
+    report = {"as_of": str(args.as_of or hi), "platforms": args.platform,
+              "windows": {k: {"items": v[0], "start": v[1], "end": v[2]} for k, v in items.items()},
+              "shares": table.to_dict(orient="index")}
+
+    if args.compare:
+        pop = period_over_period(store, args.compare, args.as_of, args.platform)
+        if not pop.empty:
+            print(f"\n{args.compare}-day period over period:")
+            print(pop.round(4).to_string())
+            report["period_over_period"] = {"days": args.compare, **pop.to_dict(orient="index")}
+    if args.series:
+        series = store.series(args.series, platforms=args.platform)
+        print(f"\nPer-period shares ({args.series}):")
+        print(series.pivot(index="period", columns="brand", values="rms_share").fillna(0.0).round(3).to_string())
+        report["series"] = json.loads(series.to_json(orient="records", date_format="iso"))
+    store.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        logging.info(f"Saved report → {args.json}")
+
+
+if __name__ == "__main__":
+    main()
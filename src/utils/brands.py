@@ -1,5 +1,6 @@
 import re
-from typing import Dict, List, Pattern
+from itertools import product
+from typing import Dict, List, Pattern, Tuple, Union
 
 SPECIAL_HYPHEN = r"[\s\-]?"
 
@@ -15,6 +16,113 @@ def compile_brand_regexes(primary: List[str], competitors: List[str]) -> Dict[st
     all_brands = list(dict.fromkeys([_normalize_brand(b) for b in primary + competitors]))
     return {b: re.compile(_brand_to_pattern(b), re.IGNORECASE) for b in all_brands}
 
-def count_mentions(text: str, brand_patterns: Dict[str, Pattern]) -> Dict[str, int]:
+def count_mentions(text: str, brand_patterns: Union[Dict[str, Pattern], "BrandMatcher"]) -> Dict[str, int]:
     text = text or ""
+    if isinstance(brand_patterns, BrandMatcher):
+        return brand_patterns.count(text)
     return {brand: len(pat.findall(text)) for brand, pat in brand_patterns.items()}
+
+# ----------------- Single-pass matcher -----------------
+_ASCII_ALNUM = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789")
+_SEPARATORS = (" ", "-", "")  # concrete forms of SPECIAL_HYPHEN (" " stands for any \s)
+
+def _brand_variants(brand: str) -> List[str]:
+    tokens = [t.lower() for t in re.split(r"\s+", brand.strip())]
+    variants = []
+    for seps in product(_SEPARATORS, repeat=len(tokens) - 1):
+        v = tokens[0]
+        for sep, tok in zip(seps, tokens[1:]):
+            v += sep + tok
+        variants.append(v)
+    return variants
+
+def _trie_to_regex(node: dict) -> str:
+    alts = [(r"\s" if ch == " " else re.escape(ch)) + _trie_to_regex(child)
+            for ch, child in node.items() if ch != ""]
+    if not alts:
+        return ""
+    body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    return f"(?:{body})?" if "" in node else body
+
+class BrandMatcher:
+    """
+    Finds every brand in one left-to-right pass over the text.
+    - All brand variants are compiled into a single trie-shaped regex, so the
+      cost per position no longer grows with the number of brands.
+    - Default counts equal count_mentions() with compile_brand_regexes()
+      (nested brands such as "Atomberg" inside "Atomberg Renesa" both count).
+    - longest_only=True attributes each span to the longest brand only
+      (leftmost-longest, non-overlapping).
+    """
+
+    def __init__(self, brands: List[str], longest_only: bool = False):
+        self.brands = list(dict.fromkeys(_normalize_brand(b) for b in brands))
+        self.longest_only = longest_only
+        self._fallback = [re.compile(_brand_to_pattern(b), re.IGNORECASE) for b in self.brands]
+
+        owners: Dict[str, List[int]] = {}
+        for i, b in enumerate(self.brands):
+            for v in _brand_variants(b):
+                owners.setdefault(v, []).append(i)
+
+        trie: dict = {}
+        for v in owners:
+            node = trie
+            for ch in v:
+                node = node.setdefault(ch, {})
+            node[""] = True
+
+        # For each variant: every (brand, length) that also matches at the same
+        # start, i.e. itself plus shorter variants ending on a word boundary.
+        self._hits: Dict[str, List[Tuple[int, int]]] = {}
+        for v in owners:
+            hits = []
+            for n in range(1, len(v) + 1):
+                p = v[:n]
+                if p in owners and (n == len(v) or v[n] not in _ASCII_ALNUM):
+                    hits.extend((i, n) for i in owners[p])
+            self._hits[v] = hits
+
+        self._regex = re.compile(
+            rf"(?<![A-Za-z0-9])(?=({_trie_to_regex(trie)})(?![A-Za-z0-9]))", re.IGNORECASE
+        ) if owners else None
+
+    def _resolve(self, matched: str) -> List[Tuple[int, int]]:
+        key = re.sub(r"\s", " ", matched.lower())
+        if key in self._hits:
+            return self._hits[key]
+        # Rare Unicode case-folding mismatches (e.g. U+212A KELVIN SIGN): resolve directly.
+        return [(i, m.end()) for i, pat in enumerate(self._fallback)
+                for m in [pat.match(matched)] if m]
+
+    def count_vector(self, text: str) -> List[int]:
+        counts = [0] * len(self.brands)
+        if not text or self._regex is None:
+            return counts
+        last_end = [0] * len(self.brands)
+        span_end = 0
+        for m in self._regex.finditer(text):
+            start = m.start(1)
+            hits = self._resolve(m.group(1))
+            if self.longest_only:
+                if start < span_end:
+                    continue
+                longest = max(n for _, n in hits)
+                for i, n in hits:
+                    if n == longest:
+                        counts[i] += 1
+                span_end = start + longest
+                continue
+            # Per-brand non-overlapping matches, exactly like re.findall.
+            for i, n in hits:
+                if start >= last_end[i]:
+                    counts[i] += 1
+                    last_end[i] = start + n
+        return counts
+
+    def count(self, text: str) -> Dict[str, int]:
+        return dict(zip(self.brands, self.count_vector(text)))
+
+def compile_brand_matcher(primary: List[str], competitors: List[str],
+                          longest_only: bool = False) -> BrandMatcher:
+    return BrandMatcher(primary + competitors, longest_only=longest_only)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import os
+import time
+import sqlite3
+import hashlib
+from typing import Dict, Iterable
+
+_SQL_CHUNK = 500  # stay well under SQLite's bound-parameter limit
+
+class SentimentCache:
+    """
+    On-disk, content-addressed cache of sentiment scores (SQLite).
+    - Keys are a hash of the model name plus the (already truncated) text.
+    - Size-bounded: once above max_entries, least recently used rows are evicted.
+    - Counts hits/misses for the end-of-run report.
+    """
+
+    def __init__(self, path: str, max_entries: int = 500_000):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, timeout=60)  # shared by analysis worker processes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sentiment ("
+            "key BLOB PRIMARY KEY, score REAL NOT NULL, used INTEGER NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sentiment_used ON sentiment(used)")
+
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        return hashlib.blake2b(f"{model}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, model: str, texts: Iterable[str]) -> Dict[str, float]:
+        keyed = {self.key(model, t): t for t in texts}
+        found: Dict[str, float] = {}
+        keys = list(keyed)
+        for i in range(0, len(keys), _SQL_CHUNK):
+            chunk = keys[i:i + _SQL_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            for k, score in self.conn.execute(
+                f"SELECT key, score FROM sentiment WHERE key IN ({marks})", chunk
+            ):
+                found[keyed[k]] = score
+            self.conn.execute(
+                f"UPDATE sentiment SET used=? WHERE key IN ({marks})", [int(time.time()), *chunk]
+            )
+        self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(keyed) - len(found)
+        return found
+
+    def get(self, model: str, text: str):
+        return self.get_many(model, [text]).get(text)
+
+    def put_many(self, model: str, scores: Dict[str, float]) -> None:
+        if not scores:
+            return
+        now = int(time.time())
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO sentiment (key, score, used) VALUES (?, ?, ?)",
+            [(self.key(model, t), float(s), now) for t, s in scores.items()]
+        )
+        self.conn.commit()
+        self._evict()
+
+    def put(self, model: str, text: str, score: float) -> None:
+        self.put_many(model, {text: score})
+
+    def _evict(self) -> None:
+        (n,) = self.conn.execute("SELECT COUNT(*) FROM sentiment").fetchone()
+        if n > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM sentiment WHERE key IN "
+                "(SELECT key FROM sentiment ORDER BY used LIMIT ?)", (n - self.max_entries,)
+            )
+            self.conn.commit()
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"Sentiment cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)"
+
+    def close(self) -> None:
+        self.conn.close()
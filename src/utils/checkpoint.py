@@ -0,0 +1,105 @@
+from __future__ import annotations
+import os
+import json
+import time
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+from utils.lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+from utils.compact import MENTION_DTYPE
+from utils.snapshots import locale_key
+
+_SQL_CHUNK = 500  # stay well under SQLite's bound-parameter limit
+
+def text_hashes(texts) -> np.ndarray:
+    """Stable int64 hash of each text (the key scored texts are stored under)."""
+    return pd.util.hash_array(np.asarray(texts, dtype=object)).view(np.int64)
+
+class PipelineCheckpoint:
+    """
+    What an interrupted pipeline run has already done (SQLite).
+    - jobs: the rows each platform × query × locale fetch returned; a resumed
+      run replays them instead of calling the API again. Cleared once a run
+      finishes with every job fetched.
+    - texts: mention counts and sentiment per distinct scan_text hash, so no
+      text is matched or scored twice. Kept across runs; a signature change
+      (brands, matcher mode, model) resets it.
+    """
+
+    def __init__(self, path: str, signature: dict):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "platform TEXT NOT NULL, query TEXT NOT NULL, locale TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, rows TEXT NOT NULL, PRIMARY KEY (platform, query, locale))"
+        )
+        sig = json.dumps(signature, sort_keys=True)
+        row = self.conn.execute("SELECT value FROM meta WHERE key='signature'").fetchone()
+        if not row or row[0] != sig:
+            self.conn.execute("DROP TABLE IF EXISTS texts")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (sig,))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS texts ("
+            "hash INTEGER PRIMARY KEY, mentions BLOB NOT NULL, sentiment REAL)"
+        )
+        self.conn.commit()
+        self.n_brands = len(signature["brands"])
+
+    # ----------------- Jobs -----------------
+    def job_rows(self, platform: str, query: str, locale: Optional[Dict] = None) -> Optional[List[Dict]]:
+        """The rows a job returned in this run, or None if it has not been fetched yet."""
+        row = self.conn.execute(
+            "SELECT rows FROM jobs WHERE platform=? AND query=? AND locale=?",
+            (platform, query, locale_key(locale))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_job(self, platform: str, query: str, locale: Optional[Dict], rows: List[Dict]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)",
+            (platform, query, locale_key(locale), time.time(), json.dumps(rows, ensure_ascii=False)))
+        self.conn.commit()
+
+    def clear_jobs(self) -> None:
+        """Mark the run complete: the next run fetches afresh (scored texts are kept)."""
+        self.conn.execute("DELETE FROM jobs")
+        self.conn.commit()
+
+    # ----------------- Texts -----------------
+    def known_hashes(self) -> np.ndarray:
+        return np.fromiter((h for (h,) in self.conn.execute("SELECT hash FROM texts")), dtype=np.int64)
+
+    def save_texts(self, hashes: np.ndarray, M: np.ndarray, sentiment=None) -> None:
+        M = np.ascontiguousarray(M, dtype=MENTION_DTYPE)
+        sentiment = [None] * len(hashes) if sentiment is None else [float(s) for s in sentiment]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO texts VALUES (?, ?, ?)",
+            [(int(h), M[i].tobytes(), sentiment[i]) for i, h in enumerate(hashes.tolist())])
+        self.conn.commit()
+
+    def lookup(self, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(found mask, mentions rows × brands, sentiment) for each hash; missing rows are zero."""
+        uniq = np.unique(hashes)
+        rows = []
+        for i in range(0, len(uniq), _SQL_CHUNK):
+            part = uniq[i:i + _SQL_CHUNK].tolist()
+            rows += self.conn.execute(
+                f"SELECT hash, mentions, sentiment FROM texts WHERE hash IN ({','.join('?' * len(part))})",
+                part).fetchall()
+        found = pd.Index(np.array([r[0] for r in rows], dtype=np.int64))
+        pos = found.get_indexer(hashes)
+        M = np.frombuffer(b"".join(r[1] for r in rows), dtype=MENTION_DTYPE).reshape(len(rows), self.n_brands)
+        sent = np.array([r[2] if r[2] is not None else 0.0 for r in rows], dtype=float)
+        ok = pos >= 0
+        out_M = np.zeros((len(hashes), self.n_brands), dtype=MENTION_DTYPE)
+        out_s = np.zeros(len(hashes))
+        out_M[ok], out_s[ok] = M[pos[ok]], sent[pos[ok]]
+        return ok, out_M, out_s
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Optional
+from utils.lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Low-cardinality text columns, held dictionary-encoded (categorical).
+CATEGORY_COLUMNS = ("platform", "query", "publisher", "sentiment_label", "dominant_brand")
+FLOAT32_COLUMNS = ("sentiment",)  # model probabilities are float32 to begin with
+MENTION_DTYPE = "int16"           # per-row brand mention counts
+MENTION_MAX = 32767
+
+def compact_frame(df: pd.DataFrame, drop: Iterable[str] = ("scan_text",),
+                  max_ratio: float = 0.5) -> pd.DataFrame:
+    """
+    Shrink a scored (or input) frame in place of holding Python strings per cell.
+    - CATEGORY_COLUMNS become categoricals when at most max_ratio of their
+      values are distinct (a mostly-unique column is cheaper as plain strings).
+    - FLOAT32_COLUMNS are downcast when that is lossless (scores from a model
+      are; synthetic or hand-edited ones may not be), so written tables keep
+      their exact values.
+    - `drop` columns (scan_text: only needed for scoring, rebuilt when the
+      scored table is written) are removed.
+    """
+    df = df.drop(columns=[c for c in drop if c in df.columns])
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype) \
+                and df[col].nunique(dropna=True) <= max_ratio * max(len(df), 1):
+            df[col] = df[col].astype("category")
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns and df[col].dtype == "float64":
+            narrow = df[col].astype("float32")
+            if narrow.astype("float64").equals(df[col]):
+                df[col] = narrow
+    return df
+
+def compact_mentions(M: np.ndarray) -> np.ndarray:
+    """int16 mention counts (a count that would overflow is clipped)."""
+    return np.minimum(M, MENTION_MAX).astype(MENTION_DTYPE, copy=False)
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Deep memory of a frame, Python string objects included."""
+    return float(df.memory_usage(deep=True).sum()) / 2**20
+
+def memory_report(before_mb: float, df: pd.DataFrame, M: Optional[np.ndarray] = None) -> Dict[str, float]:
+    after = memory_mb(df)
+    report = {"rows": len(df), "frame_mb_before": round(before_mb, 2), "frame_mb_after": round(after, 2),
+              "saved_pct": round(100 * (1 - after / before_mb), 1) if before_mb else 0.0,
+              "bytes_per_row": round(after * 2**20 / len(df), 1) if len(df) else 0.0}
+    if M is not None:
+        report["mentions_mb"] = round(M.nbytes / 2**20, 2)
+    return report
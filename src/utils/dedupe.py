@@ -0,0 +1,186 @@
+from __future__ import annotations
+import re
+from typing import Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from utils.lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# ----------------- URL canonicalization -----------------
+# Parameters that only track the click; anything else (?id=, ?p=) can select the page and is kept.
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|dclid|gbraid|wbraid|msclkid|mc_cid|mc_eid|igshid|"
+                             r"si|feature|ref|ref_src|ref_url|spm|pp|ab_channel|t)$", re.I)
+YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com"}
+DEFAULT_PORTS = {("http", 80), ("https", 443)}  # implied by the scheme, so not part of the page's identity
+_YT_ID = re.compile(r"^[\w-]{11}$")
+
+def canonical_url(url):
+    """
+    One spelling per page: https, lower-case host without www., no fragment,
+    no trailing slash, tracking parameters dropped and the rest sorted.
+    An explicit non-default port and any user info are kept.
+    YouTube watch/shorts/embed/youtu.be links become watch?v=<id>, the form
+    the collector writes. Non-strings are returned unchanged.
+    """
+    if not isinstance(url, str) or not url:
+        return url
+    try:
+        parts = urlsplit(url.strip())
+        host, port = (parts.hostname or "").lower(), parts.port
+    except ValueError:  # e.g. a non-numeric port
+        return url
+    if not parts.netloc:
+        return url
+    host = host[4:] if host.startswith("www.") else host
+    vid = None
+    if host == "youtu.be":
+        vid = parts.path.strip("/").split("/")[0]
+    elif host in YOUTUBE_HOSTS:
+        if parts.path == "/watch":
+            vid = dict(parse_qsl(parts.query)).get("v")
+        elif parts.path.startswith(("/shorts/", "/embed/", "/live/", "/v/")):
+            vid = parts.path.split("/")[2]
+    if vid and _YT_ID.match(vid):
+        return f"https://www.youtube.com/watch?v={vid}"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not TRACKING_PARAMS.match(k)))
+    netloc = host
+    if port and (parts.scheme.lower(), port) not in DEFAULT_PORTS:
+        netloc = f"{netloc}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username + (f":{parts.password}" if parts.password is not None else "")
+        netloc = f"{userinfo}@{netloc}"
+    return urlunsplit(("https", netloc, parts.path.rstrip("/") or "/", query, ""))
+
+# https, lower-case host without www., a path without trailing slash, no query or fragment:
+# already canonical unless it is a YouTube link, so canonical_urls skips parsing it.
+_PLAIN = r"^https://[a-z0-9.-]+/[^?#]*[^/?#]$"
+
+def canonical_urls(urls) -> pd.Series:
+    urls = pd.Series(urls)
+    plain = (urls.str.match(_PLAIN, na=False) & ~urls.str.startswith("https://www.", na=False)
+             & ~urls.str.match(r"^https://[^/]*youtu", na=False)).to_numpy()
+    out = urls.astype(object)
+    out[~plain] = urls[~plain].map(canonical_url).astype(object)
+    return out
+
+# ----------------- MinHash / LSH -----------------
+_MIX = 0x9E3779B97F4A7C15
+BITS_MATCH = 1 / 256  # chance two unrelated 8-bit signature values agree
+
+def _pc():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError as e:  # pragma: no cover - optional dependency
+        raise ImportError("Near-duplicate detection needs pyarrow: pip install pyarrow") from e
+    return pa, pc
+
+def _combine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a * np.uint64(_MIX)) ^ b  # uint64 arithmetic wraps
+
+def _word_hashes(texts: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """64-bit hash of every lower-cased word, flattened, and the word count of each text."""
+    pa, pc = _pc()
+    arr = pc.utf8_lower(pa.array(texts, type=pa.large_string()))
+    words = pc.utf8_split_whitespace(pc.replace_substring_regex(arr, r"[^\w\s]+", " "))
+    lens = pc.list_value_length(words).fill_null(0).to_numpy().astype(np.int64)
+    flat = pc.list_flatten(words)
+    # Leading/trailing whitespace splits off empty strings: drop them from the words and counts.
+    word = pc.binary_length(flat).to_numpy() > 0
+    lens = np.bincount(np.repeat(np.arange(len(lens)), lens)[word], minlength=len(lens))
+    flat = flat.filter(pa.array(word)).dictionary_encode()
+    vocab = pd.util.hash_array(flat.dictionary.to_numpy(zero_copy_only=False).astype(object))
+    return vocab[flat.indices.to_numpy()], lens
+
+def _signatures(texts: pd.Series, num_perm: int, bands: int, shingle: int,
+                seed: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    MinHash of each text's word shingles, for one block of texts.
+    Returns (band keys n × bands uint32, low 8 bits of each of the num_perm
+    minima n × num_perm uint8, mask of texts that have any words).
+    """
+    rng = np.random.default_rng(seed)
+    # a·x + b mod 2^32 with odd a: one random permutation of the 32-bit shingle hashes each.
+    a = rng.integers(0, 2**32, num_perm, dtype=np.uint32) | np.uint32(1)
+    b = rng.integers(0, 2**32, num_perm, dtype=np.uint32)
+    h, lens = _word_hashes(texts)
+    has = lens > 0
+    n_sh = np.where(has, np.maximum(lens - shingle + 1, 1), 0)  # short texts: one shingle of all words
+    starts = np.cumsum(lens) - lens
+    row = np.repeat(np.arange(len(lens)), n_sh)
+    pos = np.arange(n_sh.sum()) - np.repeat(np.cumsum(n_sh) - n_sh, n_sh) + starts[row]
+    end = (starts + lens)[row] - 1
+    sh = h[pos]
+    for j in range(1, shingle):
+        sh = _combine(sh, h[np.minimum(pos + j, end)])
+    sh = (sh >> np.uint64(32)).astype(np.uint32)
+    heads = (np.cumsum(n_sh) - n_sh)[has]
+    mins = np.full((len(lens), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    if len(heads):
+        found = np.empty((num_perm, len(heads)), dtype=np.uint32)
+        for p in range(num_perm):
+            hp = sh * a[p]
+            hp += b[p]
+            found[p] = np.minimum.reduceat(hp, heads)
+        mins[has] = found.T
+    r = num_perm // bands
+    keys = np.empty((len(lens), bands), dtype=np.uint32)
+    for i in range(bands):
+        k = mins[:, i * r].astype(np.uint64)
+        for j in range(1, r):
+            k = _combine(k, mins[:, i * r + j].astype(np.uint64))
+        keys[:, i] = k >> np.uint64(32)  # a rare collision only adds a candidate pair to verify
+    return keys, (mins & 0xFF).astype(np.uint8), has
+
+def _components(n: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Connected components of an edge list: each node labelled with its component's smallest node."""
+    labels = np.arange(n)
+    while True:
+        m = np.minimum(labels[u], labels[v])
+        new = labels.copy()
+        np.minimum.at(new, u, m)
+        np.minimum.at(new, v, m)
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+def near_duplicate_clusters(texts, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                            shingle: int = 3, seed: int = 0, block: int = 50_000) -> np.ndarray:
+    """
+    Cluster texts whose word-shingle Jaccard similarity is about `threshold`
+    or more; returns, per text, the position of the first text of its cluster
+    (its own position if it has no near-duplicate).
+    - Signatures are built block by block; texts without words stay alone.
+    - LSH: texts agreeing on all num_perm/bands minima of any band are
+      candidates; a candidate pair is kept when its estimated similarity (from
+      8-bit signatures) reaches the threshold, and clusters are the connected
+      components of kept pairs. Cost is linear in rows and text length.
+    """
+    if num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+    texts = pd.Series(texts)
+    parts = [_signatures(texts.iloc[i:i + block], num_perm, bands, shingle, seed)
+             for i in range(0, len(texts), block)]
+    if parts:
+        keys, bits, has = (np.concatenate(p) for p in zip(*parts))
+    else:
+        keys, bits, has = np.empty((0, bands), np.uint32), np.empty((0, num_perm), np.uint8), np.empty(0, bool)
+
+    # Candidate edges: each text to the first text sharing one of its band keys.
+    us, vs = [], []
+    idx = np.flatnonzero(has)
+    for i in range(bands):
+        k = keys[idx, i]
+        order = np.argsort(k, kind="stable")
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = k[order][1:] != k[order][:-1]
+        head = idx[order][np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))]
+        us.append(idx[order][~first])
+        vs.append(head[~first])
+    u = np.concatenate(us) if us else np.empty(0, dtype=np.int64)
+    v = np.concatenate(vs) if vs else np.empty(0, dtype=np.int64)
+    agree = (bits[u] == bits[v]).mean(axis=1) if len(u) else np.empty(0)
+    keep = (agree - BITS_MATCH) / (1 - BITS_MATCH) >= threshold
+    return _components(len(texts), u[keep], v[keep])
@@ -1,14 +1,24 @@
 from __future__ import annotations
 import os
 import json
-from typing import List, Dict, Any
-import pandas as pd
+from typing import Iterator, List, Dict, Any, Optional
+from utils.lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
 
 UNIFIED_COLUMNS = [
     "platform", "query", "rank", "url", "title", "snippet", "publisher",
     "views", "likes", "comments", "published_at", "raw_text"
 ]
 
+# Explicit dtypes for chunked reads, so every chunk parses the same way.
+UNIFIED_DTYPES = {
+    "platform": "object", "query": "object", "rank": "Int64", "url": "object",
+    "title": "object", "snippet": "object", "publisher": "object",
+    "views": "float64", "likes": "float64", "comments": "float64",
+    "published_at": "object", "raw_text": "object",
+}
+
 def ensure_dirs(*paths: str) -> None:
     for p in paths:
         os.makedirs(p, exist_ok=True)
@@ -21,11 +31,14 @@ def write_csv(rows: List[Dict[str, Any]], path: str) -> None:
     df = df[UNIFIED_COLUMNS]
     df.to_csv(path, index=False, encoding="utf-8")
 
-def read_csvs(paths: List[str]) -> pd.DataFrame:
+def read_csvs(paths: List[str], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Concatenate CSV files; with columns, only those (of the ones present) are parsed."""
+    wanted = set(columns or ())
+    usecols = (lambda c: c in wanted) if columns else None
     frames = []
     for p in paths:
         if os.path.exists(p):
-            frames.append(pd.read_csv(p))
+            frames.append(pd.read_csv(p, usecols=usecols))
     if not frames:
         return pd.DataFrame(columns=UNIFIED_COLUMNS)
     return pd.concat(frames, ignore_index=True)
@@ -33,3 +46,36 @@ def read_csvs(paths: List[str]) -> pd.DataFrame:
 def write_json(obj: Any, path: str) -> None:
     with open(path, "w", encoding="utf-8") as f:
         json.dump(obj, f, ensure_ascii=False, indent=2)
+
+def iter_csv_chunks(paths: List[str], chunksize: int = 50_000) -> Iterator[pd.DataFrame]:
+    """Yield inputs chunk by chunk with UNIFIED_DTYPES, in the same order as read_csvs."""
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        for chunk in pd.read_csv(p, dtype=UNIFIED_DTYPES, chunksize=chunksize):
+            for col in UNIFIED_COLUMNS:
+                if col not in chunk.columns:
+                    chunk[col] = None
+            yield chunk
+
+class SeenSet:
+    """
+    Compact cross-chunk seen-set: a sorted array of 64-bit value hashes
+    (8 bytes per URL instead of a Python string per URL).
+    """
+
+    def __init__(self):
+        self._hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def first_seen(self, values) -> np.ndarray:
+        """Mask of values not seen before (first occurrence within the batch wins); records them."""
+        h = pd.util.hash_array(np.asarray(values, dtype=object))
+        new = ~pd.Series(h).duplicated().to_numpy()
+        if len(self._hashes):
+            pos = np.searchsorted(self._hashes, h).clip(max=len(self._hashes) - 1)
+            new &= self._hashes[pos] != h
+        self._hashes = np.union1d(self._hashes, h[new])
+        return new
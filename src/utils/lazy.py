@@ -0,0 +1,23 @@
+from __future__ import annotations
+import sys
+import importlib.util
+from types import ModuleType
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Module object whose real import runs on first attribute access.
+    - Lets CLI entry points (--help, argument errors) start without paying
+      for numpy/pandas; a module that is already imported is returned as-is.
+    - Import errors for a missing package still surface here, not later.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
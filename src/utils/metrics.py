@@ -0,0 +1,254 @@
+from __future__ import annotations
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import platform
+import resource
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Prometheus-style upper bounds (seconds) for API latency histograms.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def reset_peak_rss() -> bool:
+    # Linux: writing 5 to clear_refs resets VmHWM, so each stage gets its own peak.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+class Stage:
+    """Handle yielded by RunMetrics.stage(); set rows_out before the block ends."""
+
+    def __init__(self, rows_in: Optional[int]):
+        self.rows_in = rows_in
+        self.rows_out: Optional[int] = None
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = next((i for i, b in enumerate(self.buckets) if value <= b), len(self.buckets))
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket bound holding the q-quantile (None if empty or beyond the last bucket)."""
+        if not self.count:
+            return None
+        seen = 0
+        for b, c in zip(self.buckets, self.counts):
+            seen += c
+            if seen >= q * self.count:
+                return b
+        return None
+
+    def to_dict(self) -> dict:
+        return {"buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+                "count": self.count, "sum": round(self.sum, 6),
+                "p50_le": self.quantile(0.5), "p95_le": self.quantile(0.95)}
+
+class RunMetrics:
+    """
+    Structured instrumentation for one CLI run.
+    - stage(): wall time, CPU time, rows in/out and peak RSS of a block; a stage
+      entered repeatedly (per chunk, per query) accumulates under one name.
+    - observe()/count(): latency histograms and counters, labelled like
+      Prometheus series; safe to call from worker threads.
+    - quota(): API units used, per call type.
+    """
+
+    def __init__(self, run: str):
+        self.run = run
+        self.started = datetime.now(timezone.utc)
+        self.stages: Dict[str, dict] = {}
+        self.histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.quotas: Dict[str, Dict[str, int]] = {}
+        self.info: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[Stage]:
+        handle = Stage(rows_in)
+        per_stage = reset_peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield handle
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            peak = peak_rss_mb()
+            with self._lock:
+                s = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                  "rows_in": None, "rows_out": None,
+                                                  "peak_rss_mb": 0.0, "peak_is_per_stage": per_stage})
+                s["calls"] += 1
+                s["wall_s"] += wall
+                s["cpu_s"] += cpu
+                for key in ("rows_in", "rows_out"):
+                    v = getattr(handle, key)
+                    if v is not None:
+                        s[key] = (s[key] or 0) + int(v)
+                s["peak_rss_mb"] = max(s["peak_rss_mb"], round(peak, 1))
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.histograms.setdefault(key, Histogram()).observe(value)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def quota(self, api: str, used: Dict[str, int], budget: Optional[int] = None) -> None:
+        with self._lock:
+            self.quotas[api] = {**used, "total": sum(used.values()),
+                                **({"budget": budget} if budget is not None else {})}
+
+    def merge_stages(self, stages: Dict[str, dict], prefix: str = "") -> None:
+        """Fold another RunMetrics' stages in (e.g. from worker processes), summing times and rows."""
+        with self._lock:
+            for name, other in stages.items():
+                s = self.stages.setdefault(prefix + name, {**other, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                           "rows_in": None, "rows_out": None,
+                                                           "peak_rss_mb": 0.0})
+                for key in ("calls", "wall_s", "cpu_s"):
+                    s[key] += other[key]
+                for key in ("rows_in", "rows_out"):
+                    if other[key] is not None:
+                        s[key] = (s[key] or 0) + other[key]
+                s["peak_rss_mb"] = max(s["peak_rss_mb"], other["peak_rss_mb"])
+
+    def log_stages(self) -> None:
+        for name, s in self.stages.items():
+            rows = f", {s['rows_in']}→{s['rows_out']} rows" if s["rows_in"] is not None else ""
+            logging.info(f"[{name}] {s['wall_s']:.3f}s wall, {s['cpu_s']:.3f}s CPU{rows}, "
+                         f"peak {s['peak_rss_mb']:.0f} MB")
+
+    def manifest(self) -> dict:
+        def series(items):
+            return [{"name": n, "labels": dict(l), **v} for (n, l), v in items]
+        finished = datetime.now(timezone.utc)
+        return {
+            "run": self.run,
+            "started": self.started.isoformat(timespec="seconds"),
+            "finished": finished.isoformat(timespec="seconds"),
+            "wall_s": round((finished - self.started).total_seconds(), 3),
+            "argv": sys.argv,
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+            **self.info,
+            "stages": [{"stage": n, **{k: round(v, 4) if isinstance(v, float) else v for k, v in s.items()}}
+                       for n, s in self.stages.items()],
+            "histograms": series((k, h.to_dict()) for k, h in self.histograms.items()),
+            "counters": series((k, {"value": v}) for k, v in self.counters.items()),
+            "quota": self.quotas,
+        }
+
+    def write_manifest(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest(), f, ensure_ascii=False, indent=2, default=str)
+
+    def prometheus(self) -> str:
+        """Text exposition format (e.g. for node_exporter's textfile collector)."""
+        def fmt(labels):
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in labels) + "}"
+
+        run = ("run", self.run)
+        lines: List[str] = []
+        for metric, key, help_ in (("sov_stage_wall_seconds", "wall_s", "Wall time per stage"),
+                                   ("sov_stage_cpu_seconds", "cpu_s", "CPU time per stage"),
+                                   ("sov_stage_rows_out", "rows_out", "Rows produced per stage"),
+                                   ("sov_stage_peak_rss_megabytes", "peak_rss_mb", "Peak RSS per stage")):
+            lines += [f"# HELP {metric} {help_}", f"# TYPE {metric} gauge"]
+            lines += [f"{metric}{fmt([run, ('stage', n)])} {s[key]}"
+                      for n, s in self.stages.items() if s[key] is not None]
+        for name in sorted({n for n, _ in self.histograms}):
+            lines.append(f"# TYPE sov_{name} histogram")
+            for (n, labels), h in self.histograms.items():
+                if n != name:
+                    continue
+                cum = 0
+                for b, c in zip([str(b) for b in h.buckets] + ["+Inf"], h.counts):
+                    cum += c
+                    lines.append(f"sov_{name}_bucket{fmt([run, *labels, ('le', b)])} {cum}")
+                lines.append(f"sov_{name}_sum{fmt([run, *labels])} {h.sum}")
+                lines.append(f"sov_{name}_count{fmt([run, *labels])} {h.count}")
+        for name in sorted({n for n, _ in self.counters}):
+            lines.append(f"# TYPE sov_{name} counter")
+            lines += [f"sov_{name}{fmt([run, *labels])} {v}"
+                      for (n, labels), v in self.counters.items() if n == name]
+        if self.quotas:
+            lines.append("# TYPE sov_quota_units gauge")
+            for api, used in self.quotas.items():
+                lines += [f"sov_quota_units{fmt([run, ('api', api), ('call', k)])} {v}"
+                          for k, v in used.items() if k != "budget"]
+            lines.append("# TYPE sov_quota_budget_units gauge")
+            lines += [f"sov_quota_budget_units{fmt([run, ('api', api)])} {used['budget']}"
+                      for api, used in self.quotas.items() if "budget" in used]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)  # scrapers never see a half-written file
+
+_METRICS: Optional[RunMetrics] = None
+
+def start_run(run: str) -> RunMetrics:
+    """Begin a fresh process-wide RunMetrics (what get_metrics() returns from now on)."""
+    global _METRICS
+    _METRICS = RunMetrics(run)
+    return _METRICS
+
+def get_metrics() -> RunMetrics:
+    global _METRICS
+    if _METRICS is None:
+        _METRICS = RunMetrics(os.path.basename(sys.argv[0]) or "python")
+    return _METRICS
+
+@contextmanager
+def profiled(path: Optional[str], top: int = 25) -> Iterator[None]:
+    """cProfile the block when path is set: stats dumped to path, top functions logged."""
+    if not path:
+        yield
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        prof.dump_stats(path)
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(top)
+        logging.info(f"Profile saved → {path} (view: python -m pstats {path})\n{buf.getvalue()}")
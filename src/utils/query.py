@@ -0,0 +1,157 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+
+from utils.storage import table_file
+from utils.compact import MENTION_MAX
+from utils.shares import SENTIMENT_LABELS, compute_shares
+
+FILTER_COLUMNS = ("platform", "query", "publisher", "sentiment_label")
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as e:  # pragma: no cover - optional dependency
+        raise ImportError("Slice queries need duckdb: pip install duckdb") from e
+    return duckdb
+
+def _sql_str(s: str) -> str:
+    return "'" + s.replace("'", "''") + "'"
+
+class SliceEngine:
+    """
+    Embedded DuckDB copy of the scored table for interactive slicing.
+    - Mentions are unpacked once into SMALLINT columns m0..mN (brand order),
+      and the table is sorted by platform/date so zone maps prune scans.
+    - summary(filters) recomputes RMS/wSoV/SoPV and sentiment counts for a
+      slice in one aggregate query; tables(filters) does the dashboard charts.
+    """
+
+    def __init__(self, out_dir: str, brands: List[str], fmt: Optional[str] = None):
+        duckdb = _duckdb()
+        self.brands = list(brands)
+        found = table_file(out_dir, "scored", fmt)  # the same file load_table(..., fmt=fmt) reads
+        if found is None:
+            raise FileNotFoundError(f"No scored table in {out_dir}")
+        self.con = duckdb.connect(":memory:")
+        if found[0] == "parquet":
+            src = f"read_parquet({_sql_str(found[1])})"
+        else:
+            src = f"read_csv({_sql_str(found[1])}, header=true, all_varchar=true)"
+        mentions = ",\n".join(
+            f"CAST(LEAST(COALESCE(TRY_CAST(json_extract(brand_mentions_json, {_sql_str('$.' + _json_key(b))}) "
+            f"AS INTEGER), 0), {MENTION_MAX}) AS SMALLINT) AS m{i}"
+            for i, b in enumerate(self.brands)
+        )
+        # Widened before adding, so the row total cannot overflow SMALLINT.
+        total = " + ".join(f"CAST(m{i} AS INTEGER)" for i in range(len(self.brands))) or "0"
+        # w{i}: the item's wSoV weight split across brands by mention count
+        shares = "".join(
+            f", CASE WHEN mention_total > 0 AND wsov_item > 0 THEN m{i} * wsov_item / mention_total"
+            f" ELSE 0 END AS w{i}" for i in range(len(self.brands)))
+        self.con.execute(f"""
+            CREATE TABLE items AS
+            SELECT *{shares} FROM (
+            SELECT *, {total} AS mention_total FROM (
+                SELECT CAST(platform AS VARCHAR) AS platform,
+                       CAST("query" AS VARCHAR) AS "query",
+                       CAST(publisher AS VARCHAR) AS publisher,
+                       CAST(sentiment_label AS VARCHAR) AS sentiment_label,
+                       NULLIF(CAST(dominant_brand AS VARCHAR), '') AS dominant_brand,
+                       TRY_CAST(published_at AS TIMESTAMP) AS published_at,
+                       TRY_CAST(engagement AS DOUBLE) AS engagement,
+                       TRY_CAST(wsov_item AS DOUBLE) AS wsov_item,
+                       {mentions}
+                FROM {src}
+            ))
+            ORDER BY platform, published_at
+        """)
+
+    def distinct(self, column: str) -> List[Any]:
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Not a filter column: {column}")
+        rows = self.con.execute(
+            f'SELECT DISTINCT "{column}" FROM items WHERE "{column}" IS NOT NULL ORDER BY 1'
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def date_range(self) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        return self.con.execute("SELECT min(published_at), max(published_at) FROM items").fetchone()
+
+    def _where(self, filters: Optional[Dict[str, Any]]) -> Tuple[str, list]:
+        """filters: {column: [values]} for FILTER_COLUMNS, plus 'start'/'end' dates."""
+        conds, params = [], []
+        for col, val in (filters or {}).items():
+            if val is None or (isinstance(val, (list, tuple, set)) and not val):
+                continue
+            if col in FILTER_COLUMNS:
+                conds.append(f'list_contains(?, "{col}")')
+                params.append([str(v) for v in val])
+            elif col == "start":
+                conds.append("published_at >= ?")
+                params.append(pd.Timestamp(val).to_pydatetime())
+            elif col == "end":
+                # end date is inclusive
+                conds.append("published_at < ?")
+                params.append((pd.Timestamp(val) + pd.Timedelta(days=1)).to_pydatetime())
+            else:
+                raise ValueError(f"Unknown filter: {col}")
+        return ("WHERE " + " AND ".join(conds)) if conds else "", params
+
+    def summary(self, filters: Optional[Dict[str, Any]] = None) -> dict:
+        """Summary-shaped RMS/wSoV/SoPV/sentiment results for the slice."""
+        where, params = self._where(filters)
+        exprs = []
+        for i in range(len(self.brands)):
+            exprs += [f"sum(m{i})", f"sum(w{i})", f"count(*) FILTER (WHERE m{i} > 0)"]
+        # One pass grouped by sentiment label; totals are summed over the groups.
+        rows = self.con.execute(
+            f"SELECT sentiment_label, count(*), {', '.join(exprs)} FROM items {where} GROUP BY 1",
+            params).fetchall()
+
+        rms = {b: 0 for b in self.brands}
+        wsov = {b: 0.0 for b in self.brands}
+        sopv = {b: 0.0 for b in self.brands}
+        sent = {b: {lab: 0 for lab in SENTIMENT_LABELS} for b in self.brands}
+        total_items = 0
+        for row in rows:
+            label, total_items = row[0], total_items + int(row[1])
+            for i, b in enumerate(self.brands):
+                m, w, n = row[2 + i * 3: 5 + i * 3]
+                rms[b] += int(m or 0)
+                wsov[b] += float(w or 0.0)
+                if label == "positive":
+                    sopv[b] += float(w or 0.0)
+                if label in sent[b]:
+                    sent[b][label] += int(n or 0)
+
+        return {
+            "total_items": total_items,
+            "brands": self.brands,
+            "rms": {"totals": rms, "share": compute_shares(rms)},
+            "wsov": {"totals": wsov, "share": compute_shares(wsov)},
+            "sopv": {"totals": sopv, "share": compute_shares(sopv)},
+            "sentiment_breakdown": sent,
+        }
+
+    def tables(self, filters: Optional[Dict[str, Any]] = None) -> Dict[str, pd.DataFrame]:
+        """The dashboard's agg_* tables for the slice."""
+        where, params = self._where(filters)
+        dom = ("AND" if where else "WHERE") + " dominant_brand IS NOT NULL"
+        q = lambda sql: self.con.execute(sql, params).fetchdf()
+        return {
+            "agg_timeline": q(f"""
+                SELECT date_trunc('month', published_at) AS month, dominant_brand, count(*) AS count
+                FROM items {where} {dom} AND published_at IS NOT NULL
+                GROUP BY 1, 2 ORDER BY 1, 2"""),
+            "agg_brand_platform": q(f"""
+                SELECT platform, dominant_brand, count(*) AS count
+                FROM items {where} {dom} GROUP BY 1, 2 ORDER BY 1, 2"""),
+            "agg_engagement": q(f"""
+                SELECT dominant_brand AS brand, sum(engagement) AS total_engagement
+                FROM items {where} {dom} GROUP BY 1 ORDER BY 1"""),
+        }
+
+def _json_key(brand: str) -> str:
+    # JSON path member, quoted so spaces, dashes and dots in brand names are safe.
+    return '"' + brand.replace("\\", "\\\\").replace('"', '\\"') + '"'
@@ -0,0 +1,69 @@
+from __future__ import annotations
+import time
+import random
+import threading
+from typing import Dict, Optional
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+    acquire() blocks until enough tokens are available.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+            time.sleep(wait)
+
+class QuotaMeter:
+    """
+    Thread-safe API quota accounting.
+    - charge() records units per label and raises QuotaExceeded past the budget.
+    - budget=None only counts.
+    - Usage lives in this object only: each run starts from zero, so a
+      "daily" budget is enforced per run, not per day.
+    """
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget
+        self.used: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return sum(self.used.values())
+
+    def remaining(self) -> Optional[int]:
+        return None if self.budget is None else self.budget - self.total
+
+    def charge(self, units: int, label: str = "request") -> None:
+        with self._lock:
+            if self.budget is not None and self.total + units > self.budget:
+                raise QuotaExceeded(f"quota budget {self.budget} exhausted ({label} needs {units})")
+            self.used[label] = self.used.get(label, 0) + units
+
+    def report(self) -> str:
+        parts = ", ".join(f"{k}={v}" for k, v in sorted(self.used.items()))
+        budget = f"/{self.budget}" if self.budget is not None else ""
+        return f"Quota used: {self.total}{budget} units ({parts or 'none'})"
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
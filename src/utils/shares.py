@@ -0,0 +1,8 @@
+from typing import Dict
+
+SENTIMENT_LABELS = ("positive", "neutral", "negative")
+
+def compute_shares(totals: Dict[str, float]) -> Dict[str, float]:
+    """Each brand's fraction of the total (all zeros when the total is zero)."""
+    s = sum(totals.values()) or 1.0
+    return {k: v / s for k, v in totals.items()}
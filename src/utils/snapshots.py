@@ -0,0 +1,135 @@
+from __future__ import annotations
+import os
+import glob
+import json
+import time
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from utils.lazy import lazy_import
+pd = lazy_import("pandas")
+
+from utils.io import UNIFIED_COLUMNS
+from utils.storage import get_storage, storage_for
+
+HISTORY_COLUMNS = ["collected_at", "source"] + UNIFIED_COLUMNS
+
+def snapshot_path(cfg: dict) -> str:
+    return cfg["output"].get("snapshot_path") or os.path.join(cfg["output"]["data_dir"], ".snapshots.sqlite")
+
+def history_dir(cfg: dict) -> str:
+    # Under data_dir but one level down, so discover_inputs never reads it as an input.
+    return cfg["output"].get("history_dir") or os.path.join(cfg["output"]["data_dir"], "history")
+
+def locale_key(locale: Optional[Dict]) -> str:
+    return json.dumps(locale or {}, sort_keys=True)
+
+class SnapshotStore:
+    """
+    Collector state for delta runs (SQLite).
+    - rankings: the latest result list per platform × query × locale, with
+      when it was searched; a search is repeated only once it is older than
+      the TTL, otherwise the stored ranking is reused.
+    - videos: every YouTube video seen in a ranking (its last row), so its
+      statistics can be refreshed by cheap videos().list batches.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            "platform TEXT NOT NULL, query TEXT NOT NULL, locale TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, rows TEXT NOT NULL, PRIMARY KEY (platform, query, locale))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            "video_id TEXT PRIMARY KEY, row TEXT NOT NULL, last_ranked REAL NOT NULL, "
+            "stats_at REAL)"
+        )
+
+    def age_hours(self, platform: str, query: str, locale: Optional[Dict] = None) -> Optional[float]:
+        row = self.conn.execute(
+            "SELECT fetched_at FROM searches WHERE platform=? AND query=? AND locale=?",
+            (platform, query, locale_key(locale))).fetchone()
+        return (time.time() - row[0]) / 3600 if row else None
+
+    def is_fresh(self, platform: str, query: str, locale: Optional[Dict] = None,
+                 ttl_hours: float = 24.0) -> bool:
+        age = self.age_hours(platform, query, locale)
+        return age is not None and age < ttl_hours
+
+    def ranking(self, platform: str, query: str, locale: Optional[Dict] = None) -> List[Dict]:
+        row = self.conn.execute(
+            "SELECT rows FROM searches WHERE platform=? AND query=? AND locale=?",
+            (platform, query, locale_key(locale))).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def save_ranking(self, platform: str, query: str, locale: Optional[Dict], rows: List[Dict]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+            (platform, query, locale_key(locale), time.time(), json.dumps(rows, ensure_ascii=False)))
+        self.conn.commit()
+
+    def tracked_videos(self, days: float) -> Dict[str, Dict]:
+        """Videos that were in some ranking within the last `days` days: {video_id: last row}."""
+        since = time.time() - days * 86400
+        return {vid: json.loads(row) for vid, row in self.conn.execute(
+            "SELECT video_id, row FROM videos WHERE last_ranked >= ?", (since,))}
+
+    def save_videos(self, rows: Dict[str, Dict], ranked: Iterable[str] = (),
+                    refreshed: Iterable[str] = ()) -> None:
+        """Store the latest row per video; ranked ids were in a ranking now, refreshed got new stats."""
+        now = time.time()
+        ranked, refreshed = set(ranked), set(refreshed)
+        self.conn.executemany(
+            "INSERT INTO videos VALUES (?, ?, ?, ?) ON CONFLICT (video_id) DO UPDATE SET "
+            "row=excluded.row, last_ranked=MAX(last_ranked, excluded.last_ranked), "
+            "stats_at=COALESCE(excluded.stats_at, stats_at)",
+            [(vid, json.dumps(row, ensure_ascii=False), now if vid in ranked else 0.0,
+              now if vid in refreshed else None) for vid, row in rows.items()])
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+# ----------------- History -----------------
+def append_history(rows: List[Dict], root: str, platform: str, fmt: str = "csv",
+                   source: str = "search", collected_at: Optional[datetime] = None) -> Optional[str]:
+    """
+    Append one run's rows as a new partition file,
+    <root>/<platform>/date=YYYY-MM-DD/<HHMMSSffffff>-<source>.<ext>;
+    existing files are never rewritten. Returns the path (None if no rows).
+    """
+    if not rows:
+        return None
+    ts = collected_at or datetime.now(timezone.utc)
+    storage = get_storage(fmt)
+    part = os.path.join(root, platform, f"date={ts:%Y-%m-%d}")
+    os.makedirs(part, exist_ok=True)
+    path = os.path.join(part, f"{ts:%H%M%S%f}-{source}{storage.ext}")
+    df = pd.DataFrame(rows).reindex(columns=UNIFIED_COLUMNS)
+    df.insert(0, "source", source)
+    df.insert(0, "collected_at", ts.isoformat(timespec="seconds"))
+    storage.write_table(df, path)
+    storage.close()
+    return path
+
+def read_history(root: str, platform: str, since: Optional[str] = None,
+                 until: Optional[str] = None) -> pd.DataFrame:
+    """
+    Every partition of a platform's history (date=… directories outside
+    since..until, YYYY-MM-DD inclusive, are skipped), oldest first.
+    """
+    frames = []
+    for part in sorted(glob.glob(os.path.join(root, platform, "date=*"))):
+        day = os.path.basename(part)[len("date="):]
+        if (since and day < since) or (until and day > until):
+            continue
+        for path in sorted(glob.glob(os.path.join(part, "*.csv")) + glob.glob(os.path.join(part, "*.parquet"))):
+            frames.append(storage_for(path).read_table(path))
+    if not frames:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import os
+import json
+import sqlite3
+from typing import Dict, Iterable, Optional
+from utils.lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+from utils.io import UNIFIED_COLUMNS
+
+NUMERIC_COLUMNS = ["rank", "views", "likes", "comments"]
+SCHEMA_VERSION = 2  # 2: items carry their rollup bucket (day, platform)
+
+def content_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Stable int64 hash of each row's collected fields (text + stats).
+    Numbers are hashed as float64 and text as strings, so dtype drift between
+    runs (e.g. an int column gaining NaNs) does not mark every row as changed.
+    """
+    cols = {}
+    for c in UNIFIED_COLUMNS:
+        s = df[c] if c in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if c in NUMERIC_COLUMNS:
+            cols[c] = pd.to_numeric(s, errors="coerce").astype("float64")
+        else:
+            cols[c] = s.astype("string").fillna("")
+    hashed = pd.util.hash_pandas_object(pd.DataFrame(cols), index=False)
+    return hashed.to_numpy().view(np.int64)
+
+class StateStore:
+    """
+    Per-URL analysis state for incremental runs (SQLite).
+    - items: content hash, mentions vector, sentiment, engagement, wsov_item,
+      and the rollup bucket (publish day, platform) the row was counted in.
+    - meta: the signature the state was built with, running brand totals and
+      the token of the rollup store moved along with it.
+    A signature change (brands, matcher mode, model, schema) resets the store.
+    """
+
+    def __init__(self, path: str, signature: dict):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        sig = json.dumps({**signature, "schema": SCHEMA_VERSION}, sort_keys=True)
+        if self._meta("signature") != sig:
+            self.conn.execute("DROP TABLE IF EXISTS items")
+            self.conn.execute("DELETE FROM meta")
+            self.conn.execute("INSERT INTO meta VALUES ('signature', ?)", (sig,))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "url TEXT PRIMARY KEY, content_hash INTEGER NOT NULL, mentions BLOB NOT NULL, "
+            "sentiment REAL, engagement REAL, wsov_item REAL, day TEXT, platform TEXT)"
+        )
+        self.conn.commit()
+        self.n_brands = len(signature["brands"])
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def load(self):
+        """Return (items frame indexed by url, rows × brands mentions matrix in the same order)."""
+        items = pd.read_sql(
+            "SELECT url, content_hash, mentions, sentiment, engagement, wsov_item, day, platform FROM items",
+            self.conn, index_col="url"
+        )
+        M = np.frombuffer(b"".join(items.pop("mentions")), dtype=np.int32)
+        items = items.astype({"content_hash": np.int64, "sentiment": float,
+                              "engagement": float, "wsov_item": float})
+        return items, M.reshape(len(items), self.n_brands)
+
+    def totals(self) -> Optional[Dict[str, np.ndarray]]:
+        raw = self._meta("totals")
+        return {k: np.asarray(v) for k, v in json.loads(raw).items()} if raw else None
+
+    def rollup_token(self) -> Optional[str]:
+        return self._meta("rollup_token")
+
+    def save(self, items: pd.DataFrame, M: np.ndarray, removed: Iterable[str],
+             totals: Dict[str, np.ndarray], rollup_token: Optional[str] = None) -> None:
+        """Upsert scored rows (indexed by url), drop removed URLs, store new totals."""
+        self.conn.executemany("DELETE FROM items WHERE url=?", [(u,) for u in removed])
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(url, int(h), m.tobytes(), float(s), float(e), float(w), d, p)
+             for url, h, m, s, e, w, d, p in zip(items.index, items["content_hash"],
+                                                 np.ascontiguousarray(M, dtype=np.int32),
+                                                 items["sentiment"], items["engagement"],
+                                                 items["wsov_item"], items["day"], items["platform"])]
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('totals', ?)",
+            (json.dumps({k: v.tolist() for k, v in totals.items()}),)
+        )
+        self.conn.execute("DELETE FROM meta WHERE key='rollup_token'")
+        if rollup_token:
+            self.conn.execute("INSERT INTO meta VALUES ('rollup_token', ?)", (rollup_token,))
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
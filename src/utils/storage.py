@@ -0,0 +1,285 @@
+from __future__ import annotations
+import os
+import glob
+import shutil
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from utils.lazy import lazy_import
+pd = lazy_import("pandas")
+
+from utils.io import UNIFIED_COLUMNS, iter_csv_chunks, read_csvs, write_csv
+
+# (column, op, value) triples, ANDed together — the pyarrow/pandas filter format.
+Filters = Optional[Sequence[Tuple[str, str, Any]]]
+
+# month = published_at as YYYY-MM ("unknown" when missing); day-level partitions
+# would leave one tiny file per day for a few hundred rows.
+PARTITION_COLS = ["platform", "month"]
+
+def _pa():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError as e:  # pragma: no cover - optional dependency
+        raise ImportError("Parquet storage needs pyarrow: pip install pyarrow") from e
+    return pa, ds, pq
+
+def unified_schema():
+    pa, _, _ = _pa()
+    return pa.schema([
+        ("platform", pa.string()), ("query", pa.string()), ("rank", pa.int32()),
+        ("url", pa.string()), ("title", pa.string()), ("snippet", pa.string()),
+        ("publisher", pa.string()), ("views", pa.float64()), ("likes", pa.float64()),
+        ("comments", pa.float64()), ("published_at", pa.timestamp("s")),
+        ("raw_text", pa.string()),
+    ])
+
+def scored_schema():
+    pa, _, _ = _pa()
+    extra = [("duplicate_of", pa.string()), ("scan_text", pa.string()),
+             ("brand_mentions_json", pa.string()), ("dominant_brand", pa.string()), ("sentiment", pa.float64()),
+             ("sentiment_label", pa.string()), ("engagement", pa.float64()),
+             ("wsov_item", pa.float64())]
+    return pa.schema(list(unified_schema()) + [pa.field(n, t) for n, t in extra])
+
+def _coerce(df: pd.DataFrame, schema) -> pd.DataFrame:
+    """Shape a frame to a typed schema: add missing columns, parse numbers and timestamps."""
+    pa, _, _ = _pa()
+    out = pd.DataFrame(index=df.index)
+    for field in schema:
+        s = df[field.name] if field.name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if pa.types.is_timestamp(field.type):
+            s = pd.to_datetime(s, errors="coerce", utc=True, format="mixed").dt.tz_localize(None)
+        elif pa.types.is_integer(field.type):
+            s = pd.to_numeric(s, errors="coerce").astype("Int64")
+        elif pa.types.is_floating(field.type):
+            s = pd.to_numeric(s, errors="coerce").astype("float64")
+        else:
+            s = s.astype(object).where(s.notna(), None)
+        out[field.name] = s
+    return out
+
+_OPS = {"==": "__eq__", "=": "__eq__", "!=": "__ne__", "<": "__lt__", "<=": "__le__",
+        ">": "__gt__", ">=": "__ge__"}
+
+def _apply_filters(df: pd.DataFrame, filters: Filters) -> pd.DataFrame:
+    for col, op, val in filters or []:
+        s = df[col]
+        if op == "in":
+            mask = s.isin(val)
+        elif op == "not in":
+            mask = ~s.isin(val)
+        else:
+            if pd.api.types.is_datetime64_any_dtype(s) or col == "published_at":
+                s, val = pd.to_datetime(s, errors="coerce", format="mixed"), pd.Timestamp(val)
+            mask = getattr(s, _OPS[op])(val)
+        df = df[mask.fillna(False)]
+    return df
+
+def _arrow_filter(filters: Filters):
+    if not filters:
+        return None
+    _, ds, _ = _pa()
+    expr = None
+    for col, op, val in filters:
+        f = ds.field(col)
+        if op == "in":
+            e = f.isin(val)
+        elif op == "not in":
+            e = ~f.isin(val)
+        else:
+            e = getattr(f, _OPS[op])(val)
+        expr = e if expr is None else expr & e
+    return expr
+
+def _needed(columns: Optional[List[str]], filters: Filters) -> Optional[List[str]]:
+    """Columns a CSV read must parse: the requested ones plus those the filters test (None: all)."""
+    return list(dict.fromkeys(list(columns) + [f[0] for f in filters or []])) if columns else None
+
+class CsvStorage:
+    """CSV files (the original format); filters are applied after loading."""
+    ext = ".csv"
+
+    def write_items(self, rows, path: str) -> None:
+        write_csv(rows, path)
+
+    def read(self, paths: List[str], columns: Optional[List[str]] = None,
+             filters: Filters = None) -> pd.DataFrame:
+        df = read_csvs(paths, _needed(columns, filters))
+        df = _apply_filters(df, filters)
+        return df[[c for c in columns if c in df.columns]] if columns else df
+
+    def iter_chunks(self, paths: List[str], chunksize: int) -> Iterator[pd.DataFrame]:
+        return iter_csv_chunks(paths, chunksize)
+
+    def write_table(self, df: pd.DataFrame, path: str, append: bool = False) -> None:
+        df.to_csv(path, index=False, encoding="utf-8", mode="a" if append else "w", header=not append)
+
+    def read_table(self, path: str, columns: Optional[List[str]] = None,
+                   filters: Filters = None) -> pd.DataFrame:
+        needed = _needed(columns, filters)
+        df = _apply_filters(pd.read_csv(path, usecols=(lambda c: c in needed) if needed else None), filters)
+        return df[[c for c in columns if c in df.columns]] if columns else df
+
+    def close(self) -> None:
+        pass
+
+class ParquetStorage:
+    """
+    Typed, columnar storage (pyarrow).
+    - Collector outputs are hive-partitioned datasets (platform=…/month=…/).
+    - Reads project only the requested columns and push filters down to
+      partition pruning and row-group statistics.
+    """
+    ext = ".parquet"
+
+    def __init__(self):
+        self._writers: Dict[str, Any] = {}
+
+    def write_items(self, rows, path: str) -> None:
+        pa, ds, _ = _pa()
+        df = _coerce(pd.DataFrame(rows), unified_schema())
+        df["month"] = df["published_at"].dt.strftime("%Y-%m").fillna("unknown")
+        table = pa.Table.from_pandas(df, schema=unified_schema().append(pa.field("month", pa.string())),
+                                     preserve_index=False)
+        if os.path.isdir(path):
+            shutil.rmtree(path)  # a collector run replaces its own dataset
+        ds.write_dataset(table, path, format="parquet", partitioning=PARTITION_COLS,
+                         partitioning_flavor="hive", basename_template="part-{i}.parquet")
+
+    def _dataset(self, path: str):
+        _, ds, _ = _pa()
+        return ds.dataset(path, format="parquet", partitioning="hive")
+
+    def _to_pandas(self, table, schema) -> pd.DataFrame:
+        pa, _, _ = _pa()
+        # Partition keys come back dictionary-encoded; cast to the declared types.
+        fields = [schema.field(n) if n in schema.names else table.schema.field(n)
+                  for n in table.column_names]
+        table = table.cast(pa.schema(fields))
+        return table.to_pandas()
+
+    def read(self, paths: List[str], columns: Optional[List[str]] = None,
+             filters: Filters = None) -> pd.DataFrame:
+        cols = columns or UNIFIED_COLUMNS
+        frames = []
+        for p in paths:
+            if not os.path.exists(p):
+                continue
+            dataset = self._dataset(p)
+            table = dataset.to_table(columns=[c for c in cols if c in dataset.schema.names],
+                                     filter=_arrow_filter(filters))
+            frames.append(self._to_pandas(table, unified_schema()))
+        if not frames:
+            return pd.DataFrame(columns=cols)
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_chunks(self, paths: List[str], chunksize: int) -> Iterator[pd.DataFrame]:
+        pa, _, _ = _pa()
+        for p in paths:
+            if not os.path.exists(p):
+                continue
+            dataset = self._dataset(p)
+            for batch in dataset.to_batches(columns=UNIFIED_COLUMNS, batch_size=chunksize):
+                if batch.num_rows:
+                    yield self._to_pandas(pa.Table.from_batches([batch]), unified_schema())
+
+    def write_table(self, df: pd.DataFrame, path: str, append: bool = False) -> None:
+        """
+        Write an analysis table as a single file; append=True adds a row group.
+        Columns named in the scored schema get its types, others are inferred.
+        """
+        pa, _, pq = _pa()
+        known = scored_schema()
+        typed = _coerce(df, pa.schema([f for f in known if f.name in df.columns]))
+        fields, arrays = [], []
+        for name in df.columns:
+            if name in known.names:
+                fields.append(known.field(name))
+                arrays.append(pa.array(typed[name], type=known.field(name).type, from_pandas=True))
+            else:
+                arr = pa.array(df[name].reset_index(drop=True), from_pandas=True)
+                fields.append(pa.field(name, arr.type))
+                arrays.append(arr)
+        table = pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+        if not append or path not in self._writers:
+            if path in self._writers:
+                self._writers.pop(path).close()
+            self._writers[path] = pq.ParquetWriter(path, table.schema)
+        self._writers[path].write_table(table)
+
+    def close(self) -> None:
+        """Finish files opened by write_table."""
+        for w in self._writers.values():
+            w.close()
+        self._writers = {}
+
+    def read_table(self, path: str, columns: Optional[List[str]] = None,
+                   filters: Filters = None) -> pd.DataFrame:
+        _, _, pq = _pa()
+        table = pq.read_table(path, columns=columns, filters=list(filters) if filters else None)
+        return table.to_pandas()
+
+STORAGES = {"csv": CsvStorage, "parquet": ParquetStorage}
+
+def get_storage(fmt: str = "csv"):
+    try:
+        return STORAGES[fmt]()
+    except KeyError:
+        raise ValueError(f"Unknown storage format '{fmt}' (expected one of {sorted(STORAGES)})")
+
+def storage_for(path: str):
+    return get_storage("parquet" if path.endswith(".parquet") else "csv")
+
+def discover_inputs(data_dir: str) -> List[str]:
+    """Collector outputs in data_dir: *.csv files and *.parquet datasets."""
+    return sorted(glob.glob(os.path.join(data_dir, "*.csv")) + glob.glob(os.path.join(data_dir, "*.parquet")))
+
+def read_items(paths: List[str], columns: Optional[List[str]] = None,
+               filters: Filters = None) -> pd.DataFrame:
+    """Read collector outputs of any format, in path order."""
+    frames = [storage_for(p).read([p], columns=columns, filters=filters)
+              for p in paths if os.path.exists(p)]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns or UNIFIED_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def iter_items(paths: List[str], chunksize: int = 50_000) -> Iterator[pd.DataFrame]:
+    for p in paths:
+        yield from storage_for(p).iter_chunks([p], chunksize)
+
+def table_path(out_dir: str, name: str, fmt: str) -> str:
+    return os.path.join(out_dir, name + get_storage(fmt).ext)
+
+def table_file(out_dir: str, name: str, fmt: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """
+    (format, path) of an analysis table: the configured format's file when it
+    exists, else the most recently written of <name>.parquet / <name>.csv
+    (a table left over from before a format switch is never preferred).
+    """
+    found = [(f, table_path(out_dir, name, f)) for f in ("parquet", "csv")]
+    found = [(f, p) for f, p in found if os.path.exists(p)]
+    for f, p in found:
+        if f == fmt:
+            return f, p
+    return max(found, key=lambda fp: os.path.getmtime(fp[1])) if found else None
+
+def load_table(out_dir: str, name: str, columns: Optional[List[str]] = None,
+               filters: Filters = None, fmt: Optional[str] = None) -> pd.DataFrame:
+    """Load an analysis table (see table_file for which file); empty frame if there is none."""
+    found = table_file(out_dir, name, fmt)
+    if found is None:
+        return pd.DataFrame()
+    return get_storage(found[0]).read_table(found[1], columns=columns, filters=filters)
+
+def head_table(out_dir: str, name: str, n: int = 20, fmt: Optional[str] = None) -> pd.DataFrame:
+    """First n rows of an analysis table without reading the rest of it."""
+    found = table_file(out_dir, name, fmt)
+    if found is None:
+        return pd.DataFrame()
+    if found[0] == "parquet":
+        _, _, pq = _pa()
+        batch = next(pq.ParquetFile(found[1]).iter_batches(batch_size=n), None)
+        return batch.to_pandas() if batch is not None else pd.DataFrame()
+    return pd.read_csv(found[1], nrows=n)
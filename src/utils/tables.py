@@ -0,0 +1,37 @@
+from __future__ import annotations
+from typing import Dict
+from utils.lazy import lazy_import
+pd = lazy_import("pandas")
+
+# Small precomputed tables written next to summary.json so the dashboard
+# never has to group the full scored table.
+DASHBOARD_TABLES = {
+    "agg_timeline": ["month", "dominant_brand"],
+    "agg_brand_platform": ["platform", "dominant_brand"],
+    "agg_engagement": ["brand"],
+}
+
+def dashboard_tables(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Per-item aggregates behind the dashboard charts, from a scored frame.
+    Items without a dominant brand are left out, as in the original charts.
+    """
+    # Categorical keys (compacted frames) are grouped as plain values, so tables stay string-typed.
+    dom = df["dominant_brand"].astype(object).replace("", None)
+    month = pd.to_datetime(df["published_at"], errors="coerce").dt.to_period("M").dt.to_timestamp()
+    base = pd.DataFrame({"month": month, "platform": df["platform"].astype(object),
+                         "dominant_brand": dom, "engagement": df["engagement"]})
+    return {
+        "agg_timeline": (base.dropna(subset=["month", "dominant_brand"])
+                             .groupby(["month", "dominant_brand"]).size().reset_index(name="count")),
+        "agg_brand_platform": (base.dropna(subset=["dominant_brand"])
+                                   .groupby(["platform", "dominant_brand"]).size().reset_index(name="count")),
+        "agg_engagement": (base.dropna(subset=["dominant_brand"])
+                               .groupby("dominant_brand")["engagement"].sum().reset_index()
+                               .rename(columns={"dominant_brand": "brand", "engagement": "total_engagement"})),
+    }
+
+def merge_tables(a: Dict[str, pd.DataFrame], b: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """Combine tables from disjoint row sets (e.g. streaming chunks) by summing their counts."""
+    return {name: (pd.concat([a[name], b[name]]).groupby(keys, as_index=False).sum())
+            for name, keys in DASHBOARD_TABLES.items()}
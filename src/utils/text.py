@@ -1,27 +1,241 @@
 from __future__ import annotations
-from typing import Optional
-from transformers import pipeline
+import os
+import logging
+from typing import Iterable, List, Optional
+
+MODEL_NAME = "distilbert-base-uncased-finetuned-sst-2-english"
+MAX_CHARS = 512
+
+# torch: the full-precision pipeline model; torch-int8: the same model with its
+# Linear layers dynamically quantized; onnx: an ONNX export run by onnxruntime.
+BACKENDS = ("torch", "torch-int8", "onnx")
 
 _SENTIMENT_PIPE = None
+_CACHE = None
+_DAEMON_DOWN = set()  # daemon addresses that failed; not retried in this process
+_BACKEND = "torch"
+_MODEL_DIR = os.path.join("out", ".models")
+_RUNNER = None  # (tokenizer, forward, id2label) for _BACKEND
+
+def set_cache(cache) -> None:
+    """Route sentiment_score/sentiment_scores through a SentimentCache (None disables)."""
+    global _CACHE
+    _CACHE = cache
+
+def set_backend(backend: str = "torch", model_dir: Optional[str] = None) -> None:
+    """Select the inference backend (one of BACKENDS); model_dir caches the ONNX export."""
+    global _BACKEND, _MODEL_DIR, _RUNNER
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend '{backend}' (expected one of {BACKENDS})")
+    if backend != _BACKEND:
+        _RUNNER = None
+    _BACKEND, _MODEL_DIR = backend, model_dir or _MODEL_DIR
+
+def model_key() -> str:
+    """Identifies the scores' producer in caches and state: the model, plus any non-default backend."""
+    return MODEL_NAME if _BACKEND == "torch" else f"{MODEL_NAME}@{_BACKEND}"
 
 def _get_pipeline():
     global _SENTIMENT_PIPE
     if _SENTIMENT_PIPE is None:
+        # Imported lazily so fully cached runs never load transformers/torch.
+        from transformers import pipeline
         _SENTIMENT_PIPE = pipeline(
             task="sentiment-analysis",
-            model="distilbert-base-uncased-finetuned-sst-2-english"
+            model=MODEL_NAME
         )
     return _SENTIMENT_PIPE
 
-def sentiment_score(text: Optional[str]) -> float:
-    if not text or not text.strip():
-        return 0.0
+def _torch_forward(model, num_threads: Optional[int]):
+    import torch
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    model.eval()
+
+    def forward(input_ids, attention_mask):
+        with torch.inference_mode():
+            logits = model(input_ids=torch.from_numpy(input_ids),
+                           attention_mask=torch.from_numpy(attention_mask)).logits
+            return logits.softmax(dim=-1).numpy()
+    return forward
+
+def onnx_path(model_dir: Optional[str] = None) -> str:
+    return os.path.join(model_dir or _MODEL_DIR, MODEL_NAME.replace("/", "--") + ".onnx")
+
+def export_onnx(path: str) -> str:
+    """Export the pipeline model to ONNX (dynamic batch/sequence axes) at path."""
+    import torch
+
     pipe = _get_pipeline()
-    res = pipe(text[:512])[0]
-    label = res["label"].upper()
-    prob = float(res["score"])
+    model = pipe.model.eval()
+    sample = pipe.tokenizer(["a short sample"], return_tensors="pt")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    torch.onnx.export(
+        model, (sample["input_ids"], sample["attention_mask"]), tmp,
+        input_names=["input_ids", "attention_mask"], output_names=["logits"],
+        dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                      "attention_mask": {0: "batch", 1: "sequence"},
+                      "logits": {0: "batch"}},
+        opset_version=14,
+    )
+    os.replace(tmp, path)  # never leave a half-written export behind
+    return path
+
+def _onnx_forward(path: str, num_threads: Optional[int]):
+    try:
+        import onnxruntime as ort
+    except ImportError as e:  # pragma: no cover - optional dependency
+        raise ImportError("sentiment.backend 'onnx' needs onnxruntime: pip install onnxruntime") from e
+    import numpy as np
+
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = num_threads or 0
+    session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+
+    def forward(input_ids, attention_mask):
+        logits = session.run(["logits"], {"input_ids": input_ids.astype(np.int64),
+                                          "attention_mask": attention_mask.astype(np.int64)})[0]
+        e = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        return e / e.sum(axis=-1, keepdims=True)
+    return forward
+
+def _get_runner(num_threads: Optional[int] = None):
+    """
+    Load the selected backend once per process.
+    - onnx reuses a cached export from model_dir; with one present only the
+      tokenizer and onnxruntime are loaded, never torch.
+    """
+    global _RUNNER
+    if _RUNNER is None:
+        if _BACKEND == "onnx":
+            from transformers import AutoConfig, AutoTokenizer
+            path = onnx_path()
+            if not os.path.exists(path):
+                logging.info(f"Exporting {MODEL_NAME} to ONNX → {path}")
+                export_onnx(path)
+            tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+            id2label = AutoConfig.from_pretrained(MODEL_NAME).id2label
+            forward = _onnx_forward(path, num_threads)
+        else:
+            pipe = _get_pipeline()
+            tokenizer, model, id2label = pipe.tokenizer, pipe.model, pipe.model.config.id2label
+            if _BACKEND == "torch-int8":
+                import copy
+                import torch
+                model = torch.ao.quantization.quantize_dynamic(
+                    copy.deepcopy(model), {torch.nn.Linear}, dtype=torch.qint8)
+            forward = _torch_forward(model, num_threads)
+        _RUNNER = (tokenizer, forward, id2label)
+    return _RUNNER
+
+def warm_up() -> None:
+    """Load the sentiment model now instead of on first use."""
+    if _BACKEND == "torch":
+        _get_pipeline()
+    else:
+        _get_runner()
+
+def _label_to_score(label: str, prob: float) -> float:
+    label = label.upper()
     if label == "POSITIVE":
         return prob
     elif label == "NEGATIVE":
         return -prob
     return 0.0
+
+def sentiment_score(text: Optional[str]) -> float:
+    if not text or not text.strip():
+        return 0.0
+    text = text[:MAX_CHARS]
+    if _CACHE is not None:
+        cached = _CACHE.get(model_key(), text)
+        if cached is not None:
+            return cached
+    if _BACKEND == "torch":
+        pipe = _get_pipeline()
+        res = pipe(text)[0]
+        score = _label_to_score(res["label"], float(res["score"]))
+    else:
+        score = _batched_inference([text], 1, None)[0]
+    if _CACHE is not None:
+        _CACHE.put(model_key(), text, score)
+    return score
+
+def sentiment_scores(texts: Iterable[Optional[str]], batch_size: int = 32,
+                     num_threads: Optional[int] = None, daemon: Optional[str] = None) -> List[float]:
+    """
+    Score a whole column of texts with the same semantics as sentiment_score.
+    - Identical (truncated) texts are collapsed and scored once.
+    - Unique texts are tokenized once, then run through the selected backend
+      in length-sorted batches of batch_size on CPU.
+    - Texts already in the configured cache skip inference entirely.
+    - With daemon (a sentiment_daemon socket path) the rest are scored by that
+      resident model; if it cannot be reached they are scored in-process.
+    - Scores are mapped back to the input order.
+    """
+    keys = [t[:MAX_CHARS] if t and t.strip() else None for t in texts]
+    unique = list(dict.fromkeys(k for k in keys if k is not None))
+    scores = _CACHE.get_many(model_key(), unique) if _CACHE is not None else {}
+    missing = [k for k in unique if k not in scores]
+    fresh = dict(zip(missing, _infer(missing, batch_size, num_threads, daemon)))
+    if _CACHE is not None:
+        _CACHE.put_many(model_key(), fresh)
+    scores.update(fresh)
+    return [scores[k] if k is not None else 0.0 for k in keys]
+
+def infer_batch(texts: List[str], batch_size: int = 32, num_threads: Optional[int] = None) -> List[float]:
+    """
+    Run the selected backend on texts in this process, in length-sorted
+    batches: no cache, no daemon, no collapsing of duplicates (the sentiment
+    daemon's entry point; use sentiment_scores everywhere else).
+    """
+    return _batched_inference(texts, batch_size, num_threads)
+
+def _infer(texts: List[str], batch_size: int, num_threads: Optional[int],
+           daemon: Optional[str]) -> List[float]:
+    if texts and daemon and daemon not in _DAEMON_DOWN:
+        scores = _daemon_inference(daemon, texts, batch_size)
+        if scores is not None:
+            return scores
+    return _batched_inference(texts, batch_size, num_threads)
+
+def _daemon_inference(address: str, texts: List[str], batch_size: int) -> Optional[List[float]]:
+    """Score texts in a running sentiment_daemon; None (after a warning) if that fails."""
+    from multiprocessing.connection import Client
+    try:
+        with Client(address, family="AF_UNIX") as conn:
+            conn.send(("score", model_key(), texts, batch_size))
+            status, payload = conn.recv()
+    except (OSError, EOFError) as e:
+        status, payload = "error", f"unreachable ({e})"
+    if status == "ok":
+        return payload
+    logging.warning(f"Sentiment daemon at {address}: {payload}; scoring in-process")
+    _DAEMON_DOWN.add(address)
+    return None
+
+def _batched_inference(texts: List[str], batch_size: int,
+                       num_threads: Optional[int]) -> List[float]:
+    if not texts:
+        return []
+    tokenizer, forward, id2label = _get_runner(num_threads)
+
+    enc = tokenizer(texts, truncation=True, max_length=512, padding=False)
+    # Sorting by token length keeps padding (and wasted FLOPs) per batch minimal.
+    order = sorted(range(len(texts)), key=lambda i: len(enc["input_ids"][i]))
+    out = [0.0] * len(texts)
+
+    for start in range(0, len(order), max(1, batch_size)):
+        idx = order[start:start + batch_size]
+        batch = tokenizer.pad(
+            {"input_ids": [enc["input_ids"][i] for i in idx],
+             "attention_mask": [enc["attention_mask"][i] for i in idx]},
+            return_tensors="np"
+        )
+        probs = forward(batch["input_ids"], batch["attention_mask"])
+        best, labels = probs.max(axis=-1), probs.argmax(axis=-1)
+        for i, p, lab in zip(idx, best.tolist(), labels.tolist()):
+            out[i] = _label_to_score(id2label[lab], float(p))
+    return out
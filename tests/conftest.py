@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import copy
+import json
+import math
+import zlib
+
+import pandas as pd
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _fake_scores(texts, *args, **kwargs):
+    """Deterministic stand-in for the model: a score in [-1, 1] per text."""
+    return [zlib.crc32(str(t).encode("utf-8")) % 2001 / 1000 - 1 for t in texts]
+
+
+@pytest.fixture
+def fake_sentiment(monkeypatch):
+    """Replace model inference (no torch/transformers needed); the calls made are recorded."""
+    import utils.text
+    calls = []
+
+    def infer(texts, *args, **kwargs):
+        calls.append(list(texts))
+        return _fake_scores(texts)
+    monkeypatch.setattr(utils.text, "_batched_inference", infer)
+    return calls
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    """The repo's config.yaml with data/out under tmp_path and no score cache."""
+    with open(os.path.join(ROOT, "config.yaml"), "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg = copy.deepcopy(cfg)
+    cfg["output"].update({"data_dir": str(tmp_path / "data"), "out_dir": str(tmp_path / "out")})
+    cfg["sentiment"]["cache_path"] = ""
+    return cfg
+
+
+def assert_close(a, b, path=""):
+    """Equal summaries: same structure and values, floats up to summation order."""
+    if isinstance(a, dict):
+        assert a.keys() == b.keys(), path
+        for k in a:
+            assert_close(a[k], b[k], f"{path}/{k}")
+    elif isinstance(a, list):
+        assert len(a) == len(b), path
+        for i, (x, y) in enumerate(zip(a, b)):
+            assert_close(x, y, f"{path}[{i}]")
+    elif isinstance(a, float) or isinstance(b, float):
+        assert math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-12), (path, a, b)
+    else:
+        assert a == b, (path, a, b)
+
+
+def read_out(out_dir):
+    """(summary.json, scored.csv) of an analysis run."""
+    with open(os.path.join(out_dir, "summary.json"), encoding="utf-8") as f:
+        summary = json.load(f)
+    return summary, pd.read_csv(os.path.join(out_dir, "scored.csv"))
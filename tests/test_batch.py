@@ -0,0 +1,45 @@
+import copy
+import os
+
+import pandas as pd
+import pytest
+
+from analyze import analyze
+from batch import analyze_batch
+from conftest import ROOT, assert_close, read_out
+
+INPUTS = [os.path.join(ROOT, "data", p + ".csv") for p in ("google", "youtube")]
+
+
+def collected(tmp_path, name, top_n):
+    """The inputs fetch_google.py / fetch_youtube.py would have written for default_top_n=top_n."""
+    data_dir = tmp_path / name / "data"
+    data_dir.mkdir(parents=True)
+    paths = []
+    for path, cap in zip(INPUTS, (100, 200)):
+        df = pd.read_csv(path)
+        out = str(data_dir / os.path.basename(path))
+        df[df["rank"] <= min(top_n, cap)].to_csv(out, index=False)
+        paths.append(out)
+    return paths
+
+
+@pytest.mark.parametrize("top_n", [(200, 50), (150, 30)])
+def test_each_config_matches_its_own_analyze(cfg, tmp_path, fake_sentiment, top_n):
+    cfgs = {}
+    for name, n in zip(("wide", "narrow"), top_n):
+        cfgs[name] = copy.deepcopy(cfg)
+        cfgs[name]["default_top_n"] = n
+        cfgs[name]["output"]["out_dir"] = str(tmp_path / "batch" / name)
+    analyze_batch(INPUTS, cfgs)     # the corpus holds the largest top_n of both platforms
+
+    totals = {}
+    for name, c in cfgs.items():
+        ref_out = str(tmp_path / name / "out")
+        analyze(collected(tmp_path, name, c["default_top_n"]), c, ref_out)
+        summary, scored = read_out(c["output"]["out_dir"])
+        ref_summary, ref_scored = read_out(ref_out)
+        assert_close(summary, ref_summary)
+        pd.testing.assert_frame_equal(scored, ref_scored)
+        totals[name] = summary["total_items"]
+    assert totals["narrow"] < totals["wide"]
@@ -0,0 +1,73 @@
+import glob
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from analyze import scan_text
+from conftest import ROOT
+from utils.brands import compile_brand_matcher, compile_brand_regexes, count_mentions
+
+PRIMARY = ["Atomberg", "Atomberg Renesa", "Atomberg Efficio", "Atomberg Studio"]
+COMPETITORS = ["Orient", "Havells", "Usha", "Crompton", "Luminous", "Bajaj", "Polycab", "V-Guard",
+               "Anchor", "Panasonic", "Crompton Greaves", "Anchor by Panasonic"]
+
+
+def reference(texts, primary=PRIMARY, competitors=COMPETITORS):
+    patterns = compile_brand_regexes(primary, competitors)
+    return [list(count_mentions(t, patterns).values()) for t in texts]
+
+
+def matcher_counts(texts, primary=PRIMARY, competitors=COMPETITORS, longest_only=False):
+    matcher = compile_brand_matcher(primary, competitors, longest_only=longest_only)
+    return [matcher.count_vector(t) for t in texts]
+
+
+def random_texts(n, seed=7):
+    """Brand forms (nested, hyphenated, spaced, glued to words) mixed with filler and punctuation."""
+    rng = random.Random(seed)
+    forms = ["Atomberg", "atomberg renesa", "ATOMBERG-Efficio", "Atomberg\tStudio", "AtombergRenesa",
+             "Atomberg  Renesa", "Atomberg-", "Renesa", "V-Guard", "v guard", "VGuard", "V--Guard",
+             "Crompton Greaves", "Crompton-Greaves", "Anchor by Panasonic", "anchor-by-panasonic",
+             "Usha", "Ushas", "xUsha", "Usha2", "Bajaj's", "(Havells)", "Polycab.", "luminous"]
+    filler = ["fan", "the", "best", "review", "vs", "2024", "BLDC", "-", ",", "...", "with", "by"]
+    texts = []
+    for _ in range(n):
+        words = [rng.choice(forms) if rng.random() < 0.4 else rng.choice(filler)
+                 for _ in range(rng.randint(0, 25))]
+        texts.append("".join(w + rng.choice([" ", " ", "", "-", "\n", "/"]) for w in words))
+    return texts
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(ROOT, "data", "*.csv"))))
+def test_matches_regexes_on_collected_data(path):
+    texts = scan_text(pd.read_csv(path)).tolist()
+    assert matcher_counts(texts) == reference(texts)
+
+
+def test_matches_regexes_on_random_text():
+    texts = random_texts(2000)
+    assert matcher_counts(texts) == reference(texts)
+
+
+def test_edge_cases():
+    texts = ["", None, "atomberg", "Atomberg-Renesa Atomberg Renesa AtombergRenesa", "Atombergs", "V-Guard-V-Guard"]
+    assert matcher_counts(texts) == reference(texts)
+    assert compile_brand_matcher([], []).count_vector("Atomberg") == []
+
+
+def test_longest_only():
+    [counts] = matcher_counts(["Atomberg Renesa review: Atomberg wins"], longest_only=True)
+    named = dict(zip(PRIMARY + COMPETITORS, counts))
+    assert named["Atomberg Renesa"] == 1
+    assert named["Atomberg"] == 1                    # only the standalone mention
+    [default] = matcher_counts(["Atomberg Renesa review: Atomberg wins"])
+    assert dict(zip(PRIMARY + COMPETITORS, default))["Atomberg"] == 2
+
+
+def test_longest_only_nested_competitors():
+    [counts] = matcher_counts(["Anchor by Panasonic or Panasonic, Crompton-Greaves or Crompton"],
+                              longest_only=True)
+    named = {b: c for b, c in zip(PRIMARY + COMPETITORS, counts) if c}
+    assert named == {"Anchor by Panasonic": 1, "Panasonic": 1, "Crompton Greaves": 1, "Crompton": 1}
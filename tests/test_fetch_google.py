@@ -0,0 +1,101 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import fetch_google
+from fetch_google import collect_google
+
+
+class StubCSE(BaseHTTPRequestHandler):
+    """CSE stand-in: `script` maps (query, start) to the statuses to return before a 200 page."""
+    total = 35
+    script = {}
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        q = parse_qs(urlparse(self.path).query)
+        query, start = q["q"][0], int(q["start"][0])
+        key = (query, start)
+        n = self.hits[key] = self.hits.get(key, 0) + 1
+        statuses = self.script.get(key, [])
+        if n <= len(statuses):
+            status, headers, body = statuses[n - 1]
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        items = [{"link": f"https://e.com/{query}/{i}", "title": f"{query} {i}",
+                  "snippet": "Atomberg fan", "displayLink": "e.com"}
+                 for i in range(start, min(start + 10, self.total + 1))]
+        body = json.dumps({"searchInformation": {"totalResults": str(self.total)}, "items": items}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def cse(monkeypatch):
+    StubCSE.script, StubCSE.hits = {}, {}
+    sleeps = []
+    monkeypatch.setattr(fetch_google.time, "sleep", sleeps.append)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCSE)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/customsearch/v1", sleeps
+    server.shutdown()
+    server.server_close()
+
+
+def collect(base_url, queries, max_workers=2, **kwargs):
+    return collect_google("key", "cx", queries, max_results=100, max_workers=max_workers, qps=1000.0,
+                          base_url=base_url, **kwargs)
+
+
+def test_paginates_up_to_total_results(cse):
+    base_url, _ = cse
+    rows = collect(base_url, ["fans"])
+    assert [r["rank"] for r in rows] == list(range(1, 36))
+    assert rows[-1]["url"] == "https://e.com/fans/35"
+    assert sorted(s for _, s in StubCSE.hits) == [1, 11, 21, 31]
+
+
+def test_429_honours_retry_after(cse):
+    base_url, sleeps = cse
+    StubCSE.script = {("fans", 11): [(429, {"Retry-After": "7"}, b"")]}
+    rows = collect(base_url, ["fans"])
+    assert len(rows) == 35
+    assert StubCSE.hits[("fans", 11)] == 2
+    assert sleeps == [7.0]
+
+
+def test_503_then_success(cse):
+    base_url, sleeps = cse
+    StubCSE.script = {("fans", 21): [(503, {}, b"<html>busy</html>")] * 2}
+    rows = collect(base_url, ["fans"])
+    assert [r["rank"] for r in rows] == list(range(1, 36))
+    assert StubCSE.hits[("fans", 21)] == 3
+    assert len(sleeps) == 2
+
+
+def test_error_pages_are_not_read_as_empty_results(cse):
+    base_url, _ = cse
+    StubCSE.script = {("fans", 1): [(403, {}, json.dumps({"error": {"code": 403}}).encode())],
+                      ("bulbs", 1): [(503, {}, b"<html>down</html>")] * 5}
+    assert collect(base_url, ["fans", "bulbs"]) == []
+    assert StubCSE.hits[("fans", 1)] == 1       # 4xx: no retry
+    assert StubCSE.hits[("bulbs", 1)] == 5      # first try + 4 retries, then give up
+
+
+def test_quota_exhaustion_stops_paging(cse):
+    base_url, _ = cse
+    rows = collect(base_url, ["fans"], max_workers=1, daily_quota=2)  # one worker: pages in order
+    assert [r["rank"] for r in rows] == list(range(1, 21))
+    assert sum(StubCSE.hits.values()) == 2
@@ -0,0 +1,48 @@
+import os
+
+import pandas as pd
+
+from analyze import analyze
+from conftest import ROOT, assert_close, read_out
+
+
+def near_copy(row, url, word):
+    """Another URL carrying row's text plus one word: a near-duplicate of row."""
+    return {**row, "url": url, "snippet": f"{row['snippet']} {word}", "raw_text": f"{row['raw_text']} {word}"}
+
+
+def write_inputs(data_dir, rows):
+    os.makedirs(data_dir, exist_ok=True)
+    pd.DataFrame(rows).to_csv(os.path.join(data_dir, "google.csv"), index=False)
+    return [os.path.join(data_dir, "google.csv")]
+
+
+def test_incremental_matches_full_run_with_near_duplicates(cfg, tmp_path, fake_sentiment):
+    cfg["dedupe"]["near_duplicates"] = True
+    base = pd.read_csv(os.path.join(ROOT, "data", "google.csv")).to_dict("records")
+    h = max(range(1, len(base)), key=lambda i: len(base[i]["raw_text"]))  # long texts stay near-duplicates
+    head, other = base[h], base[0]
+    first = base + [near_copy(head, "https://example.com/copy-of-head", "today")]
+    # Second run: the head of the existing cluster is edited, and a new near-duplicate
+    # of an unchanged row arrives.
+    edited = {**head, "snippet": head["snippet"] + " sale", "raw_text": head["raw_text"] + " sale"}
+    second = base[:h] + [edited] + base[h + 1:] + [first[-1],
+                                                   near_copy(other, "https://example.com/copy-of-other", "again")]
+
+    data_dir, inc_dir = str(tmp_path / "data"), str(tmp_path / "inc")
+    analyze(write_inputs(data_dir, first), cfg, inc_dir, incremental=True)
+    n_calls = len(fake_sentiment)
+    analyze(write_inputs(data_dir, second), cfg, inc_dir, incremental=True)
+    scored_texts = [t for call in fake_sentiment[n_calls:] for t in call]
+    assert len(scored_texts) == 1 and scored_texts[0].startswith(head["title"])   # only the edited head
+    analyze(write_inputs(data_dir, second), cfg, str(tmp_path / "full"))
+
+    summary, scored = read_out(inc_dir)
+    ref_summary, ref_scored = read_out(str(tmp_path / "full"))
+    dups = ref_scored[ref_scored["duplicate_of"].notna()]
+    assert set(dups["url"]) == {"https://example.com/copy-of-head",
+                                "https://example.com/copy-of-other"}
+    assert (dups["sentiment"].to_numpy() == ref_scored.set_index("url").loc[dups["duplicate_of"], "sentiment"]
+            .to_numpy()).all()
+    pd.testing.assert_frame_equal(scored, ref_scored)
+    assert_close(summary, ref_summary)
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+import pipeline
+from analyze import analyze
+from conftest import ROOT, read_out
+from pipeline import run_pipeline
+from utils.storage import discover_inputs
+
+CHUNK = 10  # rows per stub job
+
+
+def platform_rows(platform):
+    df = pd.read_csv(os.path.join(ROOT, "data", platform + ".csv"))
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+class StubSources:
+    """Each platform's rows from data/*.csv, served as jobs of CHUNK rows (locale {"chunk": k})."""
+
+    def __init__(self, fail=(), delay=0.0):
+        self.fail, self.delay = set(fail), delay
+        self.fetched, self.lock = [], threading.Lock()
+        self.rows = {p: platform_rows(p) for p in ("google", "youtube")}
+
+    def sources(self):
+        return {p: self.jobs(p) for p in self.rows}
+
+    def jobs(self, platform):
+        rows = self.rows[platform]
+        jobs = [(rows[0]["query"], {"chunk": k}) for k in range(0, len(rows), CHUNK)]
+
+        def fetch(query, locale):
+            time.sleep(self.delay)
+            with self.lock:
+                self.fetched.append((platform, locale["chunk"]))
+            if (platform, locale["chunk"]) in self.fail:
+                raise RuntimeError("stub HTTP 500")
+            return rows[locale["chunk"]:locale["chunk"] + CHUNK]
+        return jobs, fetch
+
+
+def test_small_queue_pauses_fetching(cfg, tmp_path, fake_sentiment, monkeypatch):
+    cfg["pipeline"].update({"queue_size": 1, "fetch_jobs": 2, "score_batch": 16})
+    stub = StubSources()
+    matched, ahead = [0], []
+    mention_matrix = pipeline.mention_matrix
+
+    def slow_matrix(texts, matcher):
+        matched[0] += 1
+        time.sleep(0.01)
+        return mention_matrix(texts, matcher)
+
+    def fetch_watch(fetch):
+        def wrapped(query, locale):
+            ahead.append(len(stub.fetched) - matched[0])
+            return fetch(query, locale)
+        return wrapped
+    monkeypatch.setattr(pipeline, "mention_matrix", slow_matrix)
+    sources = {p: (jobs, fetch_watch(fetch)) for p, (jobs, fetch) in stub.sources().items()}
+
+    assert run_pipeline(cfg, str(tmp_path / "out"), sources)
+    assert len(stub.fetched) == 30
+    # Fetched but not yet matched: the queue, a blocked fetch slot per platform each, one being matched.
+    assert max(ahead) <= 1 + 2 * 2 + 1
+
+
+def test_failed_job_resumes_alone(cfg, tmp_path, fake_sentiment):
+    out_dir = str(tmp_path / "out")
+    os.makedirs(out_dir)
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        f.write("previous")
+
+    stub = StubSources(fail={("google", 40)})
+    assert not run_pipeline(cfg, out_dir, stub.sources())
+    assert len(stub.fetched) == 30
+    with open(os.path.join(out_dir, "summary.json"), encoding="utf-8") as f:
+        assert f.read() == "previous"                  # partial runs leave the outputs alone
+    assert not os.path.exists(cfg["output"]["data_dir"])
+    scored = sum(len(c) for c in fake_sentiment)
+
+    retry = StubSources()
+    assert run_pipeline(cfg, out_dir, retry.sources())
+    assert retry.fetched == [("google", 40)]
+    assert sum(len(c) for c in fake_sentiment) - scored <= CHUNK   # only the refetched job's texts
+
+    again = StubSources()
+    assert run_pipeline(cfg, out_dir, again.sources())
+    assert len(again.fetched) == 30                    # a finished run clears its jobs
+
+
+def test_matches_analyze(cfg, tmp_path, fake_sentiment):
+    cfg["pipeline"].update({"queue_size": 2, "score_batch": 64})
+    out_dir = str(tmp_path / "out")
+    assert run_pipeline(cfg, out_dir, StubSources(delay=0.001).sources())
+    inputs = discover_inputs(cfg["output"]["data_dir"])
+    assert [os.path.basename(p) for p in inputs] == ["google.csv", "youtube.csv"]
+
+    analyze(inputs, cfg, str(tmp_path / "ref"))
+    summary, scored = read_out(out_dir)
+    ref_summary, ref_scored = read_out(str(tmp_path / "ref"))
+    assert summary == ref_summary
+    pd.testing.assert_frame_equal(scored, ref_scored)
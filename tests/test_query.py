@@ -0,0 +1,48 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+from utils.query import SliceEngine
+
+BRANDS = ["Atomberg", "Havells"]
+
+
+def scored(n, platform):
+    return pd.DataFrame({
+        "platform": [platform] * n, "query": ["smart fan"] * n, "publisher": ["e.com"] * n,
+        "sentiment_label": ["positive"] * n, "dominant_brand": ["Atomberg"] * n,
+        "published_at": ["2024-05-01"] * n, "engagement": [1.0] * n, "wsov_item": [1.0] * n,
+        "brand_mentions_json": [json.dumps({"Atomberg": 1})] * n,
+    })
+
+
+@pytest.fixture
+def out_dir(tmp_path):
+    """A parquet table left over from before a switch to csv, and the newer csv table."""
+    out = tmp_path / "out"
+    out.mkdir()
+    scored(3, "youtube").to_parquet(out / "scored.parquet")
+    scored(5, "google").to_csv(out / "scored.csv", index=False)
+    os.utime(out / "scored.parquet", (1_000_000, 1_000_000))
+    return str(out)
+
+
+@pytest.mark.parametrize("fmt, items, platform", [
+    ("csv", 5, "google"),
+    ("parquet", 3, "youtube"),
+    (None, 5, "google"),           # no configured format: the most recently written table
+])
+def test_reads_the_table_load_table_reads(out_dir, fmt, items, platform):
+    engine = SliceEngine(out_dir, BRANDS, fmt)
+    assert engine.summary()["total_items"] == items
+    assert engine.summary({"platform": [platform]})["rms"]["totals"]["Atomberg"] == items
+    assert engine.distinct("platform") == [platform]
+
+
+def test_missing_table(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SliceEngine(str(tmp_path), BRANDS)